@@ -17,7 +17,8 @@ demo_envs = DemoEnvironmentStack(
     app,
     "WestTekDemoEnvironmentStack",
     description="West Tek Vault Control - Demo Lab Environments",
-    api_lambda_role=backend.lambda_role
+    api_lambda_role=backend.lambda_role,
+    raw_output_bucket=backend.raw_output_bucket
 )
 
 app.synth()
@@ -0,0 +1,45 @@
+"""pytest setup for the Lambda code.
+
+Tests live next to the module they cover. The common layer is put on the path
+the way Lambda mounts it, table names get placeholder values, and boto3 is
+given a region and dummy credentials so modules that build clients at import
+time load without AWS access. Tests replace every client they exercise.
+"""
+import importlib.util
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+LAYER = os.path.join(ROOT, 'lambda', 'common', 'python')
+
+sys.path.insert(0, LAYER)
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+for name in (
+    'ENVIRONMENTS_TABLE', 'SNAPSHOTS_TABLE', 'DRIFT_EVENTS_TABLE', 'DRIFT_ROLLUPS_TABLE',
+    'AUDIT_LOG_TABLE', 'COUNTERS_TABLE', 'CAPTURE_LEASES_TABLE', 'REMEDIATION_JOBS_TABLE'
+):
+    os.environ.setdefault(name, f"test-{name.lower().replace('_', '-')}")
+
+@pytest.fixture
+def load_lambda():
+    """Import lambda/<function>/<module>.py with its directory on the path, under a unique name"""
+    added = []
+
+    def load(function, module='index'):
+        directory = os.path.join(ROOT, 'lambda', function)
+        if directory not in sys.path:
+            sys.path.insert(0, directory)
+            added.append(directory)
+        spec = importlib.util.spec_from_file_location(f"{function}_{module}", os.path.join(directory, f"{module}.py"))
+        loaded = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(loaded)
+        return loaded
+
+    yield load
+    for directory in added:
+        sys.path.remove(directory)
@@ -0,0 +1,86 @@
+import json
+import os
+import uuid
+import boto3
+from datetime import datetime, timedelta
+
+import audit_archive
+from index_status import active_indexes
+from query_planner import SEVERITIES
+
+dynamodb = boto3.resource('dynamodb')
+audit_log_table = dynamodb.Table(os.environ['AUDIT_LOG_TABLE'])
+
+archive = audit_archive.AuditArchive(audit_archive.store_from_env())
+
+# Events older than this many days move to the archive
+HOT_DAYS = int(os.environ.get('AUDIT_HOT_DAYS', '90'))
+# Bounds memory and run time; the next scheduled run continues from there
+MAX_ITEMS_PER_RUN = int(os.environ.get('AUDIT_ARCHIVE_MAX_ITEMS', '50000'))
+
+def handler(event, context):
+    """Move audit events older than the hot horizon to the archive"""
+    try:
+        event = event or {}
+        hot_days = int(event.get('hotDays', HOT_DAYS))
+        # Whole days only, so a day is normally archived into a single file
+        cutoff = (datetime.now() - timedelta(days=hot_days)).strftime('%Y.%m.%d 00:00:00')
+
+        # Expired events are found through SeverityIndex; until it is ready nothing moves
+        if 'SeverityIndex' not in active_indexes(audit_log_table):
+            result = {'cutoff': cutoff, 'archived': 0, 'files': [], 'complete': False, 'waitingFor': 'SeverityIndex'}
+            print(json.dumps(result))
+            return {
+                'statusCode': 200,
+                'body': json.dumps(result)
+            }
+
+        items = expired_items(cutoff, MAX_ITEMS_PER_RUN)
+        entries = []
+        if items:
+            run_id = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+            # Files and catalogs are written before any delete, so an event is never in neither tier
+            entries = archive.write(run_id, items)
+            with audit_log_table.batch_writer() as writer:
+                for item in items:
+                    writer.delete_item(Key={'id': item['id'], 'timestamp': item['timestamp']})
+
+        # Queries return the same events either way, so AUDIT_LOG is not bumped
+        result = {
+            'cutoff': cutoff,
+            'archived': len(items),
+            'files': [entry['key'] for entry in entries],
+            'complete': len(items) < MAX_ITEMS_PER_RUN
+        }
+        print(json.dumps(result))
+        return {
+            'statusCode': 200,
+            'body': json.dumps(result)
+        }
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'error': str(e)})
+        }
+
+def expired_items(cutoff, max_items):
+    """Events older than cutoff, oldest first, read through SeverityIndex instead of a scan"""
+    items = []
+    for severity in SEVERITIES:
+        kwargs = {
+            'IndexName': 'SeverityIndex',
+            'KeyConditionExpression': '#s = :s AND #t < :cutoff',
+            'ExpressionAttributeNames': {'#s': 'severity', '#t': 'timestamp'},
+            'ExpressionAttributeValues': {':s': severity, ':cutoff': cutoff},
+            'ScanIndexForward': True
+        }
+        while len(items) < max_items:
+            kwargs['Limit'] = min(1000, max_items - len(items))
+            response = audit_log_table.query(**kwargs)
+            items.extend(response.get('Items', []))
+            if 'LastEvaluatedKey' not in response:
+                break
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    return items
@@ -1,57 +1,237 @@
 import json
 import os
 import boto3
+import threading
 import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from decimal import Decimal
 
+import federation
+import raw_output
+import work_queue
+from rate_limiter import NO_RETRY_CONFIG, limiter_for
+from versioning import AUDIT_LOG, ENVIRONMENTS, bump_version, drift_counter
+
+import lease
+
 dynamodb = boto3.resource('dynamodb')
-ssm = boto3.client('ssm')
-ec2 = boto3.client('ec2')
+lambda_client = boto3.client('lambda')
 
 snapshots_table = dynamodb.Table(os.environ['SNAPSHOTS_TABLE'])
 environments_table = dynamodb.Table(os.environ['ENVIRONMENTS_TABLE'])
 audit_log_table = dynamodb.Table(os.environ['AUDIT_LOG_TABLE'])
 
+INSTANCE_MAP_FUNCTION = os.environ.get('INSTANCE_MAP_FUNCTION')
+
+# SSM writes full (untruncated) command output here for local targets
+RAW_OUTPUT_BUCKET = os.environ.get('RAW_OUTPUT_BUCKET')
+raw_output_store = raw_output.store_from_env()
+
+# SSM SendCommand accepts at most 50 instance IDs per call
+MAX_COMMAND_TARGETS = 50
+
+# Invocation polling interval grows from the first to the max delay
+POLL_INITIAL_DELAY = 1.0
+POLL_MAX_DELAY = 8.0
+# All instances are polled together; stays well inside the 300s function timeout
+COMMAND_WAIT_SECONDS = 150
+TERMINAL_STATUSES = {'Success', 'Failed', 'TimedOut', 'Cancelled', 'Undeliverable', 'Terminated', 'DeliveryTimedOut', 'ExecutionTimedOut', 'AccessDenied'}
+
+# Clients retry captures of environments whose instance map is still being built
+MAP_PENDING_RETRY_SECONDS = 30
+
+# Callers that lose the lease wait this long for the leader (API Gateway times out at 29s)
+ATTACH_WAIT_SECONDS = 25
+
+# API captures run on CaptureWorkerFunction through the priority lanes
+capture_queue = work_queue.queue_from_env()
+CAPTURE_WORKER_FUNCTION = os.environ.get('CAPTURE_WORKER_FUNCTION')
+# Queued captures hold the environment's lease from enqueue until a worker finishes them
+QUEUED_LEASE_SECONDS = int(os.environ.get('CAPTURE_QUEUED_LEASE_SECONDS', '1800'))
+
 def handler(event, context):
-    """Capture environment snapshot using SSM"""
+    """Queue an environment snapshot capture, coalescing concurrent requests per environment"""
     try:
         # Get environment ID from path
         environment_id = event['pathParameters']['id']
+        idempotency = get_idempotency_key(event)
         
+        # A retried request gets the response of its first attempt
+        if idempotency:
+            stored = lease.recall(idempotency)
+            if stored:
+                return mark_coalesced(stored)
+        
+        # Direct invocations (remediation verification) capture inline;
+        # API requests go through the queue
+        queued = 'requestContext' in event
+        environment = None
+        if queued:
+            environment, _ = find_environment(environment_id)
+            if not environment:
+                return {
+                    'statusCode': 404,
+                    'headers': {'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Environment not found'})
+                }
+            # Nothing to queue until the sweep has looked for the environment's instances
+            _, resolved = resolve_instance_ids(environment)
+            if not resolved:
+                return map_pending_response(environment_id)
+        
+        owner = context.aws_request_id if context else str(uuid.uuid4())
+        if not lease.acquire(environment_id, owner, QUEUED_LEASE_SECONDS if queued else lease.LEASE_SECONDS):
+            # Another capture holds the lease: attach to its result instead of sending SSM again
+            result = lease.wait_for_result(environment_id, ATTACH_WAIT_SECONDS)
+            if result is None:
+                return {
+                    'statusCode': 202,
+                    'headers': {'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({
+                        'message': 'Snapshot capture already in progress',
+                        'environmentId': environment_id,
+                        'coalesced': True
+                    })
+                }
+            if idempotency and result['statusCode'] < 500:
+                lease.remember(idempotency, environment_id, owner, json.dumps(result))
+            return mark_coalesced(result)
+        
+        if not queued:
+            response = capture(environment_id)
+            lease.release(environment_id, owner, response, idempotency)
+            return response
+        
+        lane = capture_lane(environment, event)
+        capture_queue.send(lane, {
+            'environmentId': environment_id,
+            'owner': owner,
+            'idempotencyKey': idempotency
+        })
+        start_worker()
+        
+        # Fast captures still answer in this request; slow ones are followed up by polling
+        result = lease.wait_for_result(environment_id, ATTACH_WAIT_SECONDS)
+        if result is None:
+            return {
+                'statusCode': 202,
+                'headers': {'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({
+                    'message': 'Snapshot capture queued',
+                    'environmentId': environment_id,
+                    'lane': lane,
+                    'queued': True
+                })
+            }
+        return result
+    
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return {
+            'statusCode': 500,
+            'headers': {'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({
+                'error': 'VAULT-TEC SYSTEMS ERROR: Snapshot capture failed',
+                'details': str(e)
+            })
+        }
+
+def capture_lane(environment, event):
+    """FROZEN labs and compliance-critical captures go ahead of routine ones"""
+    try:
+        body = json.loads(event.get('body') or '{}')
+    except ValueError:
+        body = {}
+    if environment.get('status') == 'FROZEN' or (isinstance(body, dict) and body.get('reason') == 'compliance'):
+        return work_queue.PRIORITY
+    return work_queue.STANDARD
+
+def start_worker():
+    """Wake the capture worker; a running worker or the schedule picks the job up otherwise"""
+    if not CAPTURE_WORKER_FUNCTION:
+        # Local stand-in: drain the in-process queue on a background thread
+        import worker
+        threading.Thread(target=worker.drain, args=(capture_queue,), daemon=True).start()
+        return
+    try:
+        lambda_client.invoke(
+            FunctionName=CAPTURE_WORKER_FUNCTION,
+            InvocationType='Event',
+            Payload=b'{}'
+        )
+    except Exception as e:
+        print(f"Error starting capture worker: {e}")
+
+def capture(environment_id):
+    """Run one snapshot capture; called only by the lease holder"""
+    try:
         # Get environment details
-        env_response = environments_table.get_item(Key={'id': environment_id})
-        if 'Item' not in env_response:
+        environment, table = find_environment(environment_id)
+        if not environment:
             return {
                 'statusCode': 404,
                 'headers': {'Access-Control-Allow-Origin': '*'},
                 'body': json.dumps({'error': 'Environment not found'})
             }
         
-        environment = env_response['Item']
+        # Get instance IDs (pinned on the environment or from the discovery map)
+        instance_ids, resolved = resolve_instance_ids(environment)
+        if not resolved:
+            return map_pending_response(environment_id)
+        if not instance_ids:
+            # Only seeded synthetic labs may be given made-up state; a real lab's
+            # snapshot becomes the baseline later diffs and remediations trust
+            if environment.get('synthetic'):
+                return simulate_snapshot(environment_id, environment, table)
+            return {
+                'statusCode': 409,
+                'headers': {'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'No running instances are tagged with this EnvironmentId'})
+            }
+        
+        # SSM runs in the account and region the environment lives in
+        target = federation.target_for(environment)
+        ssm = federation.client('ssm', target, NO_RETRY_CONFIG)
+        scope = federation.limiter_scope(target)
         
-        # Get instance ID (from environment or discover via tags)
-        instance_id = environment.get('instanceId')
-        if not instance_id:
-            instance_id = discover_instance_id(environment_id)
-            if not instance_id:
-                return simulate_snapshot(environment_id, environment)
+        # Remote targets' instances cannot write to this account's bucket
+        output_prefix = f"ssm/{environment_id}" if RAW_OUTPUT_BUCKET and target['name'] == federation.LOCAL else None
         
         # Send SSM command to capture environment state
-        command_id = send_snapshot_command(instance_id)
+        command_id = send_snapshot_command(ssm, scope, instance_ids, output_prefix)
         
-        # Poll for command completion (with timeout)
-        snapshot_data = wait_for_command_completion(command_id, instance_id)
+        # Poll every instance at once, then read the output of those that succeeded
+        statuses = wait_for_invocations(ssm, scope, command_id, instance_ids)
+        for instance_id, status in statuses.items():
+            if status != 'Success':
+                print(f"Error capturing {instance_id}: command {status}")
+        succeeded = [i for i in instance_ids if statuses.get(i) == 'Success']
+        if not succeeded:
+            raise Exception(f"Command failed on all instances: {', '.join(f'{i} {statuses[i]}' for i in instance_ids)}")
+        with ThreadPoolExecutor(max_workers=min(len(succeeded), 10)) as executor:
+            invocations = dict(zip(succeeded, executor.map(
+                lambda instance_id: get_invocation(ssm, scope, command_id, instance_id), succeeded
+            )))
         
-        # Parse and store snapshot
-        snapshot = parse_snapshot_data(snapshot_data, environment_id, environment)
+        # Parse every instance and store one snapshot for the environment
+        snapshot = merge_instance_snapshots([
+            (instance_id, parse_snapshot_data(invocations[instance_id]['StandardOutputContent'], environment_id, environment))
+            for instance_id in succeeded
+        ])
+        snapshot['instanceIds'] = succeeded
+        if len(succeeded) < len(instance_ids):
+            snapshot['failedInstances'] = {i: statuses[i] for i in instance_ids if i not in invocations}
+        snapshot['fleetTarget'] = target['name']
+        snapshot['rawOutputs'] = store_raw_outputs(snapshot['id'], command_id, invocations, output_prefix)
         
         # Save to DynamoDB
         snapshots_table.put_item(Item=snapshot)
         
         # Update environment last snapshot time
         timestamp = datetime.now().strftime('%Y.%m.%d %H:%M:%S')
-        environments_table.update_item(
+        table.update_item(
             Key={'id': environment_id},
             UpdateExpression='SET lastSnapshotAt = :timestamp',
             ExpressionAttributeValues={':timestamp': timestamp}
@@ -59,6 +239,7 @@ def handler(event, context):
         
         # Log to audit trail
         log_audit_event(environment_id, environment, 'SNAPSHOT_CAPTURED', snapshot)
+        bump_version(ENVIRONMENTS, AUDIT_LOG, drift_counter(environment_id))
         
         return {
             'statusCode': 200,
@@ -80,22 +261,87 @@ def handler(event, context):
             })
         }
 
-def discover_instance_id(environment_id):
-    """Discover EC2 instance by environment ID tag"""
+def get_idempotency_key(event):
+    """Idempotency-Key request header, if the client sent one"""
+    for name, value in (event.get('headers') or {}).items():
+        if name.lower() == 'idempotency-key' and value:
+            return value[:128]
+    return None
+
+def mark_coalesced(response):
+    """Copy of a stored response flagged as shared with an earlier request"""
+    body = json.loads(response['body'])
+    if isinstance(body, dict):
+        body['coalesced'] = True
+    return {**response, 'body': json.dumps(body)}
+
+def find_environment(environment_id):
+    """Environment item and the table holding it: this registry, then remote fleet registries"""
+    item = environments_table.get_item(Key={'id': environment_id}).get('Item')
+    if item:
+        return item, environments_table
+    
+    def lookup(target):
+        table = federation.resource('dynamodb', target).Table(target['environmentsTable'])
+        found = table.get_item(Key={'id': environment_id}).get('Item')
+        if found:
+            found['fleetTarget'] = target['name']
+        return found, table
+    
+    targets = [target for target in federation.remote_targets() if target.get('environmentsTable')]
+    results, failures = federation.fan_out(lookup, targets)
+    for found, table in results.values():
+        if found:
+            return found, table
+    if failures:
+        raise Exception(f"Environment lookup failed in fleet targets: {', '.join(f['target'] for f in failures)}")
+    return None, None
+
+def resolve_instance_ids(environment):
+    """(instance IDs, whether the map has been resolved) without a discovery round trip"""
+    if environment.get('instanceId'):
+        return [environment['instanceId']], True
+    
+    instance_ids = list(environment.get('discoveredInstanceIds', []))
+    # Set by every sweep that looked for the environment, even when it found nothing
+    expires_at = environment.get('instanceMapExpiresAt')
+    
+    # Serve the cached map even when stale; refresh it out of band. An empty but
+    # unexpired map is a fresh answer that the environment has no running instances
+    if expires_at is None or int(expires_at) < time.time():
+        request_instance_map_refresh()
+    
+    return instance_ids[:MAX_COMMAND_TARGETS], expires_at is not None
+
+def map_pending_response(environment_id):
+    """503 for an environment whose instances have not been looked up yet"""
+    return {
+        'statusCode': 503,
+        'headers': {
+            'Access-Control-Allow-Origin': '*',
+            'Retry-After': str(MAP_PENDING_RETRY_SECONDS)
+        },
+        'body': json.dumps({
+            'error': 'Instance map not yet resolved for this environment; retry shortly',
+            'environmentId': environment_id,
+            'retryAfter': MAP_PENDING_RETRY_SECONDS
+        })
+    }
+
+def request_instance_map_refresh():
+    """Trigger an asynchronous instance map sweep"""
+    if not INSTANCE_MAP_FUNCTION:
+        return
     try:
-        response = ec2.describe_instances(
-            Filters=[
-                {'Name': 'tag:EnvironmentId', 'Values': [environment_id]},
-                {'Name': 'instance-state-name', 'Values': ['running']}
-            ]
+        lambda_client.invoke(
+            FunctionName=INSTANCE_MAP_FUNCTION,
+            InvocationType='Event',
+            Payload=b'{}'
         )
-        if response['Reservations']:
-            return response['Reservations'][0]['Instances'][0]['InstanceId']
     except Exception as e:
-        print(f"Error discovering instance: {e}")
-    return None
+        print(f"Error requesting instance map refresh: {e}")
 
-def send_snapshot_command(instance_id):
+def send_snapshot_command(ssm, scope, instance_ids, output_prefix=None):
     """Send SSM command to capture environment state"""
     commands = """
 #!/bin/bash
@@ -107,10 +353,10 @@ echo "=== PYTHON PACKAGES ==="
 pip3 list 2>/dev/null || echo "pip3 not available"
 
 echo "=== SYSTEM PACKAGES ==="
-rpm -qa | head -20
+rpm -qa
 
 echo "=== SERVICES ==="
-systemctl list-units --type=service --state=running | head -10
+systemctl list-units --type=service --state=running
 
 echo "=== ENVIRONMENT VARIABLES ==="
 env | grep -E '(FEV|CUDA|PATH)' || echo "No custom env vars"
@@ -120,38 +366,73 @@ ls -la /opt/wtek/ 2>/dev/null || echo "No West Tek packages"
 cat /opt/wtek/*-version.txt 2>/dev/null || echo "No version files"
 """
     
-    response = ssm.send_command(
-        InstanceIds=[instance_id],
+    kwargs = {}
+    if output_prefix:
+        # Invocation responses truncate stdout at 24,000 characters; S3 output is complete
+        kwargs = {'OutputS3BucketName': RAW_OUTPUT_BUCKET, 'OutputS3KeyPrefix': output_prefix}
+    
+    response = limiter_for('ssm:SendCommand', scope).call(
+        ssm.send_command,
+        InstanceIds=instance_ids,
         DocumentName='AWS-RunShellScript',
         Parameters={'commands': [commands]},
-        TimeoutSeconds=120
+        TimeoutSeconds=120,
+        **kwargs
     )
     
     return response['Command']['CommandId']
 
-def wait_for_command_completion(command_id, instance_id, max_wait=60):
-    """Wait for SSM command to complete"""
-    start_time = time.time()
+def wait_for_invocations(ssm, scope, command_id, instance_ids):
+    """Poll ListCommandInvocations until every instance finishes; returns status by instance"""
+    statuses = {}
+    deadline = time.time() + COMMAND_WAIT_SECONDS
+    delay = POLL_INITIAL_DELAY
     
-    while time.time() - start_time < max_wait:
-        try:
-            response = ssm.get_command_invocation(
-                CommandId=command_id,
-                InstanceId=instance_id
-            )
-            
-            status = response['Status']
-            if status in ['Success', 'Failed', 'TimedOut', 'Cancelled']:
-                if status == 'Success':
-                    return response['StandardOutputContent']
-                else:
-                    raise Exception(f"Command failed with status: {status}")
-            
-            time.sleep(2)
-        except ssm.exceptions.InvocationDoesNotExist:
-            time.sleep(2)
+    while True:
+        kwargs = {'CommandId': command_id}
+        while True:
+            response = limiter_for('ssm:ListCommandInvocations', scope).call(ssm.list_command_invocations, **kwargs)
+            for invocation in response.get('CommandInvocations', []):
+                statuses[invocation['InstanceId']] = invocation['Status']
+            if not response.get('NextToken'):
+                break
+            kwargs['NextToken'] = response['NextToken']
+        
+        if all(statuses.get(i) in TERMINAL_STATUSES for i in instance_ids) or time.time() + delay > deadline:
+            break
+        time.sleep(delay)
+        delay = min(POLL_MAX_DELAY, delay * 1.5)
+    
+    return {i: statuses[i] if statuses.get(i) in TERMINAL_STATUSES else 'TimedOut' for i in instance_ids}
+
+def get_invocation(ssm, scope, command_id, instance_id):
+    """Finished invocation with its stdout (ListCommandInvocations truncates output harder)"""
+    return limiter_for('ssm:GetCommandInvocation', scope).call(
+        ssm.get_command_invocation,
+        CommandId=command_id,
+        InstanceId=instance_id
+    )
+
+def store_raw_outputs(snapshot_id, command_id, invocations, output_prefix):
+    """Block-compress each instance's full stdout for ranged reads"""
+    def store(item):
+        instance_id, invocation = item
+        key = raw_output.output_key(snapshot_id, instance_id)
+        index = None
+        if output_prefix:
+            source = f"{output_prefix}/{command_id}/{instance_id}/awsrunShellScript/0.awsrunShellScript/stdout"
+            try:
+                index = raw_output.write_output(raw_output_store, key, raw_output_store.stream(source))
+                raw_output_store.delete(source)
+            except Exception as e:
+                # No stdout object (e.g. empty output); keep the truncated copy instead
+                print(f"Full output unavailable for {instance_id}: {e}")
+        if index is None:
+            index = raw_output.write_output(raw_output_store, key, [invocation['StandardOutputContent'].encode('utf-8')])
+        return instance_id, {'key': key, 'bytes': index['totalBytes'], 'lines': index['totalLines']}
     
-    raise Exception("Command timed out")
+    with ThreadPoolExecutor(max_workers=min(len(invocations), 10)) as executor:
+        return dict(executor.map(store, invocations.items()))
 
 def parse_snapshot_data(output, environment_id, environment):
     """Parse SSM command output into structured snapshot"""
@@ -192,7 +473,45 @@ def parse_snapshot_data(output, environment_id, environment):
     
     return snapshot
 
-def simulate_snapshot(environment_id, environment):
+def merge_instance_snapshots(parsed):
+    """One environment snapshot from each instance's parsed snapshot.
+
+    The first instance's values stand for the environment. Components only
+    some instances have are added, and values that differ between instances
+    are listed in `instanceDivergences` so drift checks can see them.
+    """
+    (first_id, snapshot), others = parsed[0], parsed[1:]
+    divergences = []
+    for section in ('packages', 'services', 'drivers'):
+        merged = {component['name']: component for component in snapshot.get(section, [])}
+        for instance_id, other in others:
+            for component in other.get(section, []):
+                base = merged.get(component['name'])
+                if base is None:
+                    merged[component['name']] = {**component, 'instances': [instance_id]}
+                elif base.get('version') != component.get('version'):
+                    divergences.append({
+                        'section': section,
+                        'name': component['name'],
+                        'values': {first_id: base.get('version'), instance_id: component.get('version')}
+                    })
+        snapshot[section] = list(merged.values())
+    variables = snapshot.get('environmentVariables', {})
+    for instance_id, other in others:
+        for name, value in other.get('environmentVariables', {}).items():
+            if name not in variables:
+                variables[name] = value
+            elif variables[name] != value:
+                divergences.append({
+                    'section': 'environmentVariables',
+                    'name': name,
+                    'values': {first_id: variables[name], instance_id: value}
+                })
+    if divergences:
+        snapshot['instanceDivergences'] = divergences
+    return snapshot
+
+def simulate_snapshot(environment_id, environment, table):
     """Simulate snapshot when no real instance available"""
     timestamp = datetime.now().strftime('%Y.%m.%d %H:%M:%S')
     
@@ -229,13 +548,14 @@ def simulate_snapshot(environment_id, environment):
     
     snapshots_table.put_item(Item=snapshot)
     
-    environments_table.update_item(
+    table.update_item(
         Key={'id': environment_id},
         UpdateExpression='SET lastSnapshotAt = :timestamp',
         ExpressionAttributeValues={':timestamp': timestamp}
     )
     
     log_audit_event(environment_id, environment, 'SNAPSHOT_CAPTURED', snapshot)
+    bump_version(ENVIRONMENTS, AUDIT_LOG, drift_counter(environment_id))
     
     return {
         'statusCode': 200,
@@ -0,0 +1,147 @@
+"""Per-environment capture leases and idempotency records.
+
+One conditional put decides which caller runs a capture; every other caller
+for the same environment (or the same Idempotency-Key) waits on the lease
+item and returns the leader's stored response instead of sending its own
+SSM command. Captures requested through the API hold the lease from the
+moment they are queued until the worker that runs them releases it.
+
+Items in the capture leases table:
+    lease#<environmentId>  state IN_PROGRESS | COMPLETED | FAILED, owner,
+                           expiresAt, completedAt, response
+    idem#<key>             environmentId, owner, response
+"""
+import json
+import os
+import time
+import boto3
+from botocore.exceptions import ClientError
+
+dynamodb = boto3.resource('dynamodb')
+leases_table = dynamodb.Table(os.environ['CAPTURE_LEASES_TABLE'])
+
+# A lease outlives the capture Lambda's own timeout so it cannot lapse mid-run
+LEASE_SECONDS = int(os.environ.get('CAPTURE_LEASE_SECONDS', '330'))
+# Completed captures are shared with callers arriving this soon afterwards
+COALESCE_SECONDS = int(os.environ.get('CAPTURE_COALESCE_SECONDS', '15'))
+IDEMPOTENCY_TTL_SECONDS = 24 * 3600
+WAIT_POLL_SECONDS = 0.5
+
+IN_PROGRESS = 'IN_PROGRESS'
+COMPLETED = 'COMPLETED'
+FAILED = 'FAILED'
+
+def lease_key(environment_id):
+    return f"lease#{environment_id}"
+
+def idempotency_key(key):
+    return f"idem#{key}"
+
+def acquire(environment_id, owner, seconds=LEASE_SECONDS):
+    """Take the capture lease; False if another capture holds or just finished it"""
+    now = time.time()
+    try:
+        leases_table.put_item(
+            Item={
+                'key': lease_key(environment_id),
+                'state': IN_PROGRESS,
+                'owner': owner,
+                'acquiredAt': int(now),
+                'expiresAt': int(now + seconds),
+                'ttl': int(now + seconds + IDEMPOTENCY_TTL_SECONDS)
+            },
+            ConditionExpression=(
+                'attribute_not_exists(#k) '
+                'OR (#s = :in_progress AND expiresAt < :now) '
+                'OR (#s = :completed AND completedAt < :coalesce_before) '
+                'OR #s = :failed'
+            ),
+            ExpressionAttributeNames={'#k': 'key', '#s': 'state'},
+            ExpressionAttributeValues={
+                ':in_progress': IN_PROGRESS,
+                ':completed': COMPLETED,
+                ':failed': FAILED,
+                ':now': int(now),
+                ':coalesce_before': int(now - COALESCE_SECONDS)
+            }
+        )
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return False
+        raise
+
+def renew(environment_id, owner):
+    """Restart a held lease's clock when its queued capture starts; False if it was taken over"""
+    now = time.time()
+    try:
+        leases_table.update_item(
+            Key={'key': lease_key(environment_id)},
+            UpdateExpression='SET expiresAt = :expires',
+            ConditionExpression='#o = :owner AND #s = :in_progress',
+            ExpressionAttributeNames={'#o': 'owner', '#s': 'state'},
+            ExpressionAttributeValues={
+                ':owner': owner,
+                ':in_progress': IN_PROGRESS,
+                ':expires': int(now + LEASE_SECONDS)
+            }
+        )
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return False
+        raise
+
+def release(environment_id, owner, response, idempotency=None):
+    """Publish the leader's response on the lease (and idempotency record)"""
+    now = time.time()
+    state = COMPLETED if response['statusCode'] < 500 else FAILED
+    stored = json.dumps(response)
+    try:
+        leases_table.update_item(
+            Key={'key': lease_key(environment_id)},
+            UpdateExpression='SET #s = :state, completedAt = :now, #r = :response',
+            ConditionExpression='#o = :owner',
+            ExpressionAttributeNames={'#s': 'state', '#r': 'response', '#o': 'owner'},
+            ExpressionAttributeValues={
+                ':state': state,
+                ':now': int(now),
+                ':response': stored,
+                ':owner': owner
+            }
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        print(f"Lease for {environment_id} was taken over before {owner} finished")
+
+    if idempotency and state == COMPLETED:
+        remember(idempotency, environment_id, owner, stored)
+
+def remember(key, environment_id, owner, stored_response):
+    """Record the response returned for an Idempotency-Key"""
+    leases_table.put_item(Item={
+        'key': idempotency_key(key),
+        'environmentId': environment_id,
+        'owner': owner,
+        'response': stored_response,
+        'ttl': int(time.time() + IDEMPOTENCY_TTL_SECONDS)
+    })
+
+def recall(key):
+    """Stored response for an Idempotency-Key, if the request already completed"""
+    item = leases_table.get_item(Key={'key': idempotency_key(key)}, ConsistentRead=True).get('Item')
+    return json.loads(item['response']) if item and item.get('response') else None
+
+def wait_for_result(environment_id, max_wait):
+    """Follow the in-flight capture; returns its response, or None if still running"""
+    deadline = time.time() + max_wait
+    while True:
+        item = leases_table.get_item(Key={'key': lease_key(environment_id)}, ConsistentRead=True).get('Item')
+        if item and item.get('state') in (COMPLETED, FAILED) and item.get('response'):
+            return json.loads(item['response'])
+        if not item or int(item.get('expiresAt', 0)) < time.time():
+            return None
+        if time.time() + WAIT_POLL_SECONDS > deadline:
+            return None
+        time.sleep(WAIT_POLL_SECONDS)
@@ -0,0 +1,217 @@
+"""50 simultaneous captures of one environment must send exactly one SSM command.
+
+DynamoDB is replaced by an in-memory table that evaluates the condition
+expressions lease.py sends, atomically, so lease.acquire, wait_for_result,
+release, remember and recall run unchanged. SSM is a stub that counts
+send_command calls and holds the leader in flight long enough for every other
+request to arrive while the capture is running.
+"""
+import json
+import re
+import threading
+import time
+
+import pytest
+from botocore.exceptions import ClientError
+
+REQUESTS = 50
+ENVIRONMENT_ID = 'env-test-01'
+TOKEN = re.compile(r"\s*(\(|\)|<>|<=|>=|=|<|>|,|[#:]?\w+)")
+
+class ConditionalTable:
+    """Enough of a DynamoDB Table for lease.py: get/put/update with condition expressions"""
+
+    def __init__(self, key='key'):
+        self.key = key
+        self.items = {}
+        self.lock = threading.Lock()
+
+    def get_item(self, Key, **kwargs):
+        with self.lock:
+            item = self.items.get(Key[self.key])
+            return {'Item': dict(item)} if item else {}
+
+    def put_item(self, Item, ConditionExpression=None, ExpressionAttributeNames=None, ExpressionAttributeValues=None):
+        with self.lock:
+            self._check(Item[self.key], ConditionExpression, ExpressionAttributeNames, ExpressionAttributeValues)
+            self.items[Item[self.key]] = dict(Item)
+
+    def update_item(self, Key, UpdateExpression, ConditionExpression=None, ExpressionAttributeNames=None, ExpressionAttributeValues=None):
+        names, values = ExpressionAttributeNames or {}, ExpressionAttributeValues or {}
+        with self.lock:
+            self._check(Key[self.key], ConditionExpression, names, values)
+            item = self.items.setdefault(Key[self.key], dict(Key))
+            assert UpdateExpression.startswith('SET ')
+            for assignment in UpdateExpression[4:].split(','):
+                name, value = (part.strip() for part in assignment.split('='))
+                item[names.get(name, name)] = values[value]
+
+    def _check(self, key, condition, names, values):
+        if condition and not evaluate(condition, self.items.get(key) or {}, names or {}, values or {}):
+            raise ClientError({'Error': {'Code': 'ConditionalCheckFailedException'}}, 'PutItem')
+
+def evaluate(condition, item, names, values):
+    """Evaluate the OR/AND/comparison/attribute_not_exists subset of condition expressions"""
+    tokens = TOKEN.findall(condition)
+    position = 0
+
+    def take():
+        nonlocal position
+        position += 1
+        return tokens[position - 1]
+
+    def operand(token):
+        if token.startswith(':'):
+            return values[token]
+        return item.get(names.get(token, token))
+
+    def disjunction():
+        result = conjunction()
+        while position < len(tokens) and tokens[position] == 'OR':
+            take()
+            result = conjunction() or result
+        return result
+
+    def conjunction():
+        result = factor()
+        while position < len(tokens) and tokens[position] == 'AND':
+            take()
+            result = factor() and result
+        return result
+
+    def factor():
+        token = take()
+        if token == '(':
+            result = disjunction()
+            assert take() == ')'
+            return result
+        if token == 'attribute_not_exists':
+            assert take() == '('
+            name = take()
+            assert take() == ')'
+            return operand(name) is None
+        left, op, right = operand(token), take(), operand(take())
+        if left is None or right is None:
+            return False
+        return {
+            '=': left == right, '<>': left != right, '<': left < right,
+            '<=': left <= right, '>': left > right, '>=': left >= right
+        }[op]
+
+    return disjunction()
+
+class RecordingTable:
+    def __init__(self, item=None):
+        self.item = item
+        self.puts = []
+
+    def get_item(self, Key, **kwargs):
+        return {'Item': dict(self.item)} if self.item else {}
+
+    def put_item(self, Item, **kwargs):
+        self.puts.append(Item)
+
+    def update_item(self, **kwargs):
+        pass
+
+class StubSsm:
+    """Counts commands; the first one stays in flight for `hold` seconds"""
+
+    def __init__(self, hold):
+        self.hold = hold
+        self.sent = []
+        self.lock = threading.Lock()
+
+    def send_command(self, InstanceIds, **kwargs):
+        with self.lock:
+            self.sent.append(InstanceIds)
+            command_id = f"cmd-{len(self.sent)}"
+        time.sleep(self.hold)
+        return {'Command': {'CommandId': command_id}}
+
+    def list_command_invocations(self, CommandId, **kwargs):
+        return {'CommandInvocations': [{'InstanceId': 'i-0abc', 'Status': 'Success'}]}
+
+    def get_command_invocation(self, CommandId, InstanceId):
+        return {'Status': 'Success', 'StandardOutputContent': '=== OS INFO ===\nLinux lab-01\n'}
+
+@pytest.fixture
+def capture(load_lambda, monkeypatch, tmp_path):
+    import raw_output
+    import rate_limiter
+
+    # In-process rate limiter buckets instead of the counters table
+    monkeypatch.setattr(rate_limiter, 'COUNTERS_TABLE', None)
+    monkeypatch.setattr(rate_limiter, '_limiters', {})
+
+    index = load_lambda('capture_snapshot')
+    leases = ConditionalTable()
+    ssm = StubSsm(hold=1.0)
+    monkeypatch.setattr(index.lease, 'leases_table', leases)
+    monkeypatch.setattr(index.lease, 'WAIT_POLL_SECONDS', 0.05)
+    monkeypatch.setattr(index, 'environments_table', RecordingTable({
+        'id': ENVIRONMENT_ID, 'labName': 'Test Lab', 'instanceId': 'i-0abc',
+        'researcher': {'name': 'Dr. Test'}
+    }))
+    monkeypatch.setattr(index, 'snapshots_table', RecordingTable())
+    monkeypatch.setattr(index, 'audit_log_table', RecordingTable())
+    monkeypatch.setattr(index, 'bump_version', lambda *names: None)
+    monkeypatch.setattr(index, 'raw_output_store', raw_output.LocalStore(str(tmp_path)))
+    monkeypatch.setattr(index.federation, 'client', lambda service, target, config=None: ssm)
+    monkeypatch.setattr(index, 'POLL_INITIAL_DELAY', 0.01)
+    return index, ssm, leases
+
+def request(key):
+    return {'pathParameters': {'id': ENVIRONMENT_ID}, 'headers': {'Idempotency-Key': key}}
+
+def test_simultaneous_captures_send_one_command(capture):
+    index, ssm, leases = capture
+    barrier = threading.Barrier(REQUESTS)
+    responses = [None] * REQUESTS
+
+    def fire(n):
+        barrier.wait()
+        responses[n] = index.handler(request(f"key-{n}"), None)
+
+    threads = [threading.Thread(target=fire, args=(n,)) for n in range(REQUESTS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=60)
+
+    assert len(ssm.sent) == 1
+    assert [response['statusCode'] for response in responses] == [200] * REQUESTS
+    bodies = [json.loads(response['body']) for response in responses]
+    assert len({body['snapshot']['id'] for body in bodies}) == 1
+    # Everyone but the leader was answered with the leader's stored response
+    assert sum(1 for body in bodies if not body.get('coalesced')) == 1
+    assert leases.items[f"lease#{ENVIRONMENT_ID}"]['state'] == 'COMPLETED'
+
+def test_retried_key_recalls_the_stored_response(capture):
+    index, ssm, leases = capture
+    first = index.handler(request('retry-key'), None)
+    # Past the coalescing window a new key would capture again; the same key must not
+    leases.items[f"lease#{ENVIRONMENT_ID}"]['completedAt'] -= 3600
+    again = index.handler(request('retry-key'), None)
+
+    assert len(ssm.sent) == 1
+    assert json.loads(again['body'])['snapshot']['id'] == json.loads(first['body'])['snapshot']['id']
+    assert json.loads(again['body'])['coalesced'] is True
+
+    index.handler(request('another-key'), None)
+    assert len(ssm.sent) == 2
+
+def test_condition_evaluation_matches_lease_semantics():
+    condition = (
+        'attribute_not_exists(#k) OR (#s = :in_progress AND expiresAt < :now) '
+        'OR (#s = :completed AND completedAt < :coalesce_before) OR #s = :failed'
+    )
+    names = {'#k': 'key', '#s': 'state'}
+    values = {':in_progress': 'IN_PROGRESS', ':completed': 'COMPLETED', ':failed': 'FAILED', ':now': 100, ':coalesce_before': 85}
+
+    assert evaluate(condition, {}, names, values)
+    assert not evaluate(condition, {'key': 'k', 'state': 'IN_PROGRESS', 'expiresAt': 200}, names, values)
+    assert evaluate(condition, {'key': 'k', 'state': 'IN_PROGRESS', 'expiresAt': 50}, names, values)
+    assert not evaluate(condition, {'key': 'k', 'state': 'COMPLETED', 'completedAt': 90}, names, values)
+    assert evaluate(condition, {'key': 'k', 'state': 'COMPLETED', 'completedAt': 80}, names, values)
+    assert evaluate(condition, {'key': 'k', 'state': 'FAILED'}, names, values)
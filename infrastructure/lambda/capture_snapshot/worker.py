@@ -0,0 +1,91 @@
+"""Capture queue worker: runs queued captures, priority lane first.
+
+Deployed as CaptureWorkerFunction with reserved concurrency 1, so at most
+CAPTURE_MAX_WORKERS captures (SSM commands and snapshot writes) run at once
+however many are requested. API requests wake it; a schedule picks up
+anything left over, including captures released for retry.
+"""
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import work_queue
+
+import index
+import lease
+
+MAX_WORKERS = int(os.environ.get('CAPTURE_MAX_WORKERS', '8'))
+# New messages are only taken while one more capture fits in the invocation
+CAPTURE_BUDGET_MS = (lease.LEASE_SECONDS + 30) * 1000
+POLL_SECONDS = 2
+METRICS_NAMESPACE = 'WestTek/CaptureQueue'
+
+# One drain per process; the function's reserved concurrency makes it one overall
+_draining = threading.Lock()
+
+def handler(event, context):
+    """Run queued captures until the lanes are empty or the invocation runs out of time"""
+    stats = drain(index.capture_queue, context.get_remaining_time_in_millis)
+    print(json.dumps(stats))
+    return stats
+
+def drain(queue, remaining_ms=lambda: float('inf')):
+    """Keep up to MAX_WORKERS captures in flight; returns counts by outcome"""
+    if not _draining.acquire(blocking=False):
+        return {'skipped': 'worker already draining'}
+    try:
+        stats = {'completed': 0, 'failed': 0, 'retried': 0, 'superseded': 0}
+        in_flight = {}
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            while True:
+                if len(in_flight) < MAX_WORKERS and remaining_ms() > CAPTURE_BUDGET_MS:
+                    for message in work_queue.receive_next(queue, MAX_WORKERS - len(in_flight)):
+                        waited_ms = int((time.time() - message['enqueuedAt']) * 1000)
+                        work_queue.emit_metrics(METRICS_NAMESPACE, {'Lane': message['lane']}, QueueWaitTime=waited_ms)
+                        in_flight[executor.submit(run, queue, message)] = message
+                if not in_flight:
+                    break
+                done, _ = wait(in_flight, timeout=POLL_SECONDS, return_when=FIRST_COMPLETED)
+                for future in done:
+                    message = in_flight.pop(future)
+                    try:
+                        stats[future.result()] += 1
+                    except Exception as e:
+                        print(f"Error running capture for {message['body'].get('environmentId')}: {e}")
+                        queue.release(message)
+                        stats['retried'] += 1
+        report_depth(queue)
+        return stats
+    finally:
+        _draining.release()
+
+def run(queue, message):
+    """Capture one queued environment and publish the result on its lease"""
+    job = message['body']
+    environment_id, owner = job['environmentId'], job['owner']
+
+    if not lease.renew(environment_id, owner):
+        # The lease lapsed while queued and a newer request took it; its own job runs instead
+        queue.delete(message)
+        return 'superseded'
+
+    response = index.capture(environment_id)
+    if response['statusCode'] >= 500 and message['receiveCount'] < work_queue.MAX_RECEIVES:
+        # Waiters keep following the lease while the capture is retried
+        queue.release(message)
+        return 'retried'
+
+    lease.release(environment_id, owner, response, job.get('idempotencyKey'))
+    if response['statusCode'] >= 500:
+        # Last attempt: the redrive policy moves it to the dead-letter queue
+        queue.release(message)
+        return 'failed'
+    queue.delete(message)
+    return 'completed'
+
+def report_depth(queue):
+    for lane in work_queue.LANES:
+        waiting, running = queue.depth(lane)
+        work_queue.emit_metrics(METRICS_NAMESPACE, {'Lane': lane}, QueueDepth=waiting, InFlight=running)
@@ -0,0 +1,244 @@
+import hashlib
+import json
+import operator
+import re
+import time
+from functools import lru_cache
+from itertools import chain, compress
+
+# Comparators understood by the engine, each mapped to the test an observed
+# version fails it by. 'pinned' rules carry no version in the constraint text
+# and are resolved against the environment's baseline snapshot.
+COMPARATORS = {
+    '==': operator.ne,
+    '<=': operator.gt,
+    '<': operator.ge,
+    '>=': operator.lt,
+    '>': operator.le,
+}
+
+# Free-text constraint patterns, tried in order. Each yields (component, comparator, version).
+RULE_PATTERNS = [
+    (re.compile(r"(?:do not|don't|never) (?:update|upgrade) (?P<component>.+?) (?:beyond|past|above|after) v?(?P<version>\d[\w.\-+]*)", re.I), '<='),
+    (re.compile(r"(?:do not|don't|never) (?:downgrade) (?P<component>.+?) (?:below|before|under) v?(?P<version>\d[\w.\-+]*)", re.I), '>='),
+    (re.compile(r"(?P<component>.+?) (?:must|should|shall) (?:remain|stay|be) (?:at|on|pinned to|locked to|locked at) v?(?P<version>\d[\w.\-+]*)", re.I), '=='),
+    (re.compile(r"(?P<component>.+?) (?:must|should|shall) (?:be )?(?:at least|no older than) v?(?P<version>\d[\w.\-+]*)", re.I), '>='),
+    (re.compile(r"(?P<component>.+?) (?:must|should|shall) (?:be )?(?:below|older than) v?(?P<version>\d[\w.\-+]*)", re.I), '<'),
+    (re.compile(r"(?P<component>.+?) v?(?P<version>\d[\w.\-+]*) required\b.*?(?:do not|don't|no) (?:upgrade|update)", re.I), '=='),
+    (re.compile(r"(?P<component>[\w.\-]+(?: [\w.\-]+)?) ?(?P<op>==|<=|>=|<|>) ?v?(?P<version>\d[\w.\-+]*)", re.I), None),
+]
+
+PINNED_PATTERN = re.compile(
+    r"(?P<component>.+?) (?:(?:version|versions|drivers?|package) )?(?:is |are )?"
+    r"(?:version[- ]locked|locked|pinned|frozen|proprietary - no modifications|no modifications)",
+    re.I
+)
+
+# Words stripped from component phrases before matching snapshot names.
+NOISE_WORDS = {'the', 'version', 'versions', 'driver', 'drivers', 'package', 'packages', 'library'}
+
+# Common spellings in constraints mapped onto snapshot component names.
+ALIASES = {
+    'python': 'python3',
+    'cuda toolkit': 'cuda',
+}
+
+
+def normalize_component(phrase):
+    """Reduce a constraint phrase to a comparable component key"""
+    words = [w for w in re.split(r'[\s_]+', phrase.strip().lower()) if w and w not in NOISE_WORDS]
+    key = ' '.join(words)
+    return ALIASES.get(key, key)
+
+
+@lru_cache(maxsize=65536)
+def version_key(version):
+    """Encode a version string as a tuple of ints that compares correctly"""
+    if version is None:
+        return None
+    parts = [int(part) for part in re.findall(r'\d+', str(version))]
+    # 11.4 and 11.4.0 are the same version
+    while len(parts) > 1 and parts[-1] == 0:
+        parts.pop()
+    return tuple(parts) or (0,)
+
+
+def constraints_hash(constraints):
+    """Stable hash of an environment's constraint list"""
+    return hashlib.sha1(json.dumps(list(constraints or []), sort_keys=True).encode()).hexdigest()
+
+
+def compile_constraint(text, baseline_components=None):
+    """Compile one free-text constraint into a structured rule"""
+    for pattern, comparator in RULE_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            return {
+                'constraint': text,
+                'component': normalize_component(match.group('component')),
+                'comparator': comparator or match.group('op'),
+                'version': match.group('version').rstrip('.-'),
+            }
+
+    match = PINNED_PATTERN.search(text)
+    if match:
+        component = normalize_component(match.group('component'))
+        # A pin holds the component at its baseline version, if there is a baseline
+        observed = resolve_component(component, baseline_components or {})
+        return {
+            'constraint': text,
+            'component': component,
+            'comparator': '==' if observed else 'pinned',
+            'version': observed[1] if observed else None,
+        }
+
+    return {'constraint': text, 'component': None, 'comparator': 'unparsed', 'version': None}
+
+
+def compile_constraints(constraints, baseline=None):
+    """Compile an environment's constraint list into its cacheable form.
+
+    `baselineSnapshotId` records the baseline pins were resolved against, so
+    they are recompiled when the environment is re-baselined, or once it has a
+    first snapshot.
+    """
+    components = component_index(baseline) if baseline else {}
+    return {
+        'hash': constraints_hash(constraints),
+        'baselineSnapshotId': baseline.get('id') if baseline else None,
+        'rules': [compile_constraint(text, components) for text in constraints or []],
+    }
+
+
+def component_index(snapshot):
+    """Map normalized component name -> (name, version) for a snapshot"""
+    index = {}
+    for group in ('packages', 'drivers', 'services'):
+        for component in snapshot.get(group, []) or []:
+            name = component.get('name')
+            if name and component.get('version') is not None:
+                index.setdefault(normalize_component(name), (name, str(component['version'])))
+    return index
+
+
+def canonical_name(name):
+    """Component name with spaces, underscores, dots and hyphens treated alike"""
+    return re.sub(r'[\s_.\-]+', '-', name)
+
+
+def resolve_component(component, index):
+    """Find a rule's component in a snapshot index (exact, then separator-insensitive match).
+
+    No prefix matching: numpy must not resolve to numpy-financial.
+    """
+    if not component:
+        return None
+    if component in index:
+        return index[component]
+    wanted = canonical_name(component)
+    for key, value in index.items():
+        if canonical_name(key) == wanted:
+            return value
+    return None
+
+
+def evaluate_fleet(fleet):
+    """Evaluate compiled rules for many environments in one pass.
+
+    `fleet` is a list of (environment_id, compiled, snapshot) tuples. Rules are
+    grouped by comparator into columns of observed and expected version
+    strings. The distinct strings of every column are parsed once, then each
+    column is checked in a single map of its comparator's failure test.
+    Returns (violations, skipped) where skipped lists rules that could not be
+    checked (unparsed text, unresolved pins, component absent from snapshot).
+    """
+    columns = {op: ([], [], []) for op in COMPARATORS}
+    unevaluated = []
+
+    for environment_id, compiled, snapshot in fleet:
+        index = component_index(snapshot) if snapshot else {}
+        for rule in compiled.get('rules', []):
+            if rule['comparator'] not in COMPARATORS:
+                unevaluated.append((environment_id, rule, 'UNPARSED' if rule['comparator'] == 'unparsed' else 'UNRESOLVED'))
+                continue
+            found = resolve_component(rule['component'], index)
+            if not found:
+                unevaluated.append((environment_id, rule, 'MISSING_COMPONENT' if snapshot else 'NO_SNAPSHOT'))
+                continue
+            observed, expected, meta = columns[rule['comparator']]
+            observed.append(found[1])
+            expected.append(rule['version'])
+            meta.append((environment_id, rule, found))
+
+    versions = set(chain.from_iterable(observed + expected for observed, expected, _ in columns.values()))
+    keys = {version: version_key(version) for version in versions}
+
+    violations = []
+    for op, (observed, expected, meta) in columns.items():
+        failed = map(COMPARATORS[op], map(keys.__getitem__, observed), map(keys.__getitem__, expected))
+        for environment_id, rule, found in compress(meta, failed):
+            violations.append({
+                'environmentId': environment_id,
+                'constraint': rule['constraint'],
+                'component': found[0],
+                'comparator': op,
+                'expectedVersion': rule['version'],
+                'observedVersion': found[1],
+                'severity': 'CRITICAL',
+            })
+
+    skipped = [{
+        'environmentId': environment_id,
+        'constraint': rule['constraint'],
+        'component': rule['component'],
+        'reason': reason,
+    } for environment_id, rule, reason in unevaluated]
+
+    return violations, skipped
+
+
+def benchmark(environments=1000, rules_per_environment=50):
+    """Time compile + bulk evaluation over a synthetic fleet"""
+    import random
+    rng = random.Random(2077)
+    names = [f"pkg-{i}" for i in range(200)]
+    templates = [
+        'DO NOT update {name} beyond {version}',
+        '{name} must remain at {version}',
+        '{name} must be at least {version}',
+        '{name} >= {version}',
+    ]
+
+    fleet_input = []
+    for e in range(environments):
+        snapshot = {'packages': [
+            {'name': name, 'version': f"{rng.randint(0, 3)}.{rng.randint(0, 20)}.{rng.randint(0, 9)}"}
+            for name in names
+        ]}
+        constraints = [
+            rng.choice(templates).format(
+                name=rng.choice(names),
+                version=f"{rng.randint(0, 3)}.{rng.randint(0, 20)}.{rng.randint(0, 9)}"
+            )
+            for _ in range(rules_per_environment)
+        ]
+        fleet_input.append((f"env-{e:05d}", constraints, snapshot))
+
+    start = time.perf_counter()
+    compiled = [(env_id, compile_constraints(constraints), snapshot) for env_id, constraints, snapshot in fleet_input]
+    compiled_at = time.perf_counter()
+    violations, skipped = evaluate_fleet(compiled)
+    evaluated_at = time.perf_counter()
+
+    return {
+        'environments': environments,
+        'rules': environments * rules_per_environment,
+        'violations': len(violations),
+        'skipped': len(skipped),
+        'compileSeconds': round(compiled_at - start, 3),
+        'evaluateSeconds': round(evaluated_at - compiled_at, 3),
+    }
+
+
+if __name__ == '__main__':
+    print(json.dumps(benchmark(), indent=2))
@@ -0,0 +1,151 @@
+import json
+import os
+import boto3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from constraints import compile_constraints, constraints_hash, evaluate_fleet
+from versioning import ENVIRONMENTS, bump_version
+
+dynamodb = boto3.resource('dynamodb')
+environments_table = dynamodb.Table(os.environ['ENVIRONMENTS_TABLE'])
+snapshots_table = dynamodb.Table(os.environ['SNAPSHOTS_TABLE'])
+
+MAX_WORKERS = 16
+
+def handler(event, context):
+    """Evaluate environment constraints against latest snapshots across the fleet"""
+    try:
+        params = event.get('queryStringParameters', {}) or {}
+        environment_id = params.get('environmentId')
+
+        if environment_id:
+            env_response = environments_table.get_item(Key={'id': environment_id})
+            if 'Item' not in env_response:
+                return {
+                    'statusCode': 404,
+                    'headers': {'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Environment not found'})
+                }
+            environments = [env_response['Item']]
+        else:
+            environments = scan_environments()
+
+        environments = [env for env in environments if env.get('constraints')]
+
+        # Latest snapshot and compiled rules per environment, fetched concurrently
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            fleet = list(executor.map(evaluation_input, environments))
+
+        if any(compiled is not env.get('compiledConstraints') for env, (_, compiled, _) in zip(environments, fleet)):
+            bump_version(ENVIRONMENTS)
+
+        violations, skipped = evaluate_fleet(fleet)
+
+        return {
+            'statusCode': 200,
+            'headers': {'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({
+                'evaluatedAt': datetime.now().strftime('%Y.%m.%d %H:%M:%S'),
+                'environmentsEvaluated': len(fleet),
+                'rulesEvaluated': sum(len(compiled['rules']) for _, compiled, _ in fleet),
+                'violations': violations,
+                'skipped': skipped
+            }, default=str)
+        }
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return {
+            'statusCode': 500,
+            'headers': {'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({
+                'error': 'VAULT-TEC SYSTEMS ERROR: Compliance check failed',
+                'details': str(e)
+            })
+        }
+
+def scan_environments():
+    """Read every environment item, following pagination"""
+    items = []
+    kwargs = {}
+    while True:
+        response = environments_table.scan(**kwargs)
+        items.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            return items
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def evaluation_input(environment):
+    """(environment id, compiled rules, latest snapshot) for evaluate_fleet"""
+    snapshot = get_latest_snapshot(environment['id'])
+    return environment['id'], get_compiled_constraints(environment, snapshot), snapshot
+
+def get_latest_snapshot(environment_id):
+    """Fetch the most recent snapshot for an environment"""
+    response = snapshots_table.query(
+        KeyConditionExpression='environmentId = :env_id',
+        ExpressionAttributeValues={':env_id': environment_id},
+        ScanIndexForward=False,
+        Limit=1
+    )
+    items = response.get('Items', [])
+    return items[0] if items else None
+
+def get_baseline_snapshot(environment):
+    """Snapshot named by baselineSnapshotId, else the environment's first snapshot"""
+    if environment.get('baselineSnapshotId'):
+        response = snapshots_table.query(
+            IndexName='SnapshotIdIndex',
+            KeyConditionExpression='id = :id',
+            ExpressionAttributeValues={':id': environment['baselineSnapshotId']},
+            Limit=1
+        )
+        if not response['Items']:
+            return None
+        keys = response['Items'][0]
+        return snapshots_table.get_item(
+            Key={'environmentId': keys['environmentId'], 'capturedAt': keys['capturedAt']}
+        ).get('Item')
+    response = snapshots_table.query(
+        KeyConditionExpression='environmentId = :env_id',
+        ExpressionAttributeValues={':env_id': environment['id']},
+        ScanIndexForward=True,
+        Limit=1
+    )
+    return response['Items'][0] if response['Items'] else None
+
+def get_compiled_constraints(environment, snapshot):
+    """Return cached compiled rules, recompiling when constraints or the baseline have changed"""
+    cached = environment.get('compiledConstraints')
+    constraints = environment.get('constraints', [])
+
+    stale = (
+        not cached or cached.get('hash') != constraints_hash(constraints)
+        # Compiled before pins were resolved against the baseline
+        or 'baselineSnapshotId' not in cached
+    )
+    # Pins follow the baseline: recompile when it is replaced, or when they
+    # could not resolve because the environment had no snapshots yet
+    rebaselined = cached and environment.get('baselineSnapshotId') not in (None, cached.get('baselineSnapshotId'))
+    unresolved = (
+        cached and snapshot
+        and not cached.get('baselineSnapshotId')
+        and any(rule.get('comparator') == 'pinned' for rule in cached.get('rules', []))
+    )
+
+    if not stale and not rebaselined and not unresolved:
+        return cached
+
+    compiled = compile_constraints(constraints, get_baseline_snapshot(environment))
+    if compiled == cached:
+        return cached
+    try:
+        environments_table.update_item(
+            Key={'id': environment['id']},
+            UpdateExpression='SET compiledConstraints = :compiled',
+            ExpressionAttributeValues={':compiled': compiled}
+        )
+    except Exception as e:
+        print(f"Error caching compiled constraints: {e}")
+    return compiled
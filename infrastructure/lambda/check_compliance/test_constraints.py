@@ -0,0 +1,86 @@
+"""Constraint compilation, baseline pins and bulk evaluation."""
+import pytest
+
+BASELINE = {'id': 'snap-base', 'packages': [{'name': 'numpy', 'version': '1.24.0'}], 'drivers': [{'name': 'nvidia-driver', 'version': '535.104'}]}
+LATEST = {'id': 'snap-latest', 'packages': [{'name': 'numpy', 'version': '1.26.0'}], 'drivers': [{'name': 'nvidia-driver', 'version': '535.104'}]}
+
+@pytest.fixture
+def constraints(load_lambda):
+    return load_lambda('check_compliance', 'constraints')
+
+@pytest.mark.parametrize('text, comparator, version', [
+    ('DO NOT update numpy beyond 1.24', '<=', '1.24'),
+    ("Don't downgrade numpy below v1.20", '>=', '1.20'),
+    ('NumPy must remain at 1.24.0', '==', '1.24.0'),
+    ('numpy must be at least 1.22', '>=', '1.22'),
+    ('numpy >= 1.22', '>=', '1.22'),
+])
+def test_free_text_rules(constraints, text, comparator, version):
+    rule = constraints.compile_constraint(text)
+    assert (rule['component'], rule['comparator'], rule['version']) == ('numpy', comparator, version)
+
+def test_pins_take_the_baseline_version(constraints):
+    compiled = constraints.compile_constraints(['NumPy version locked'], BASELINE)
+    assert compiled['baselineSnapshotId'] == 'snap-base'
+    assert compiled['rules'][0]['comparator'] == '=='
+    assert compiled['rules'][0]['version'] == '1.24.0'
+
+    violations, skipped = constraints.evaluate_fleet([('env-1', compiled, LATEST)])
+    assert [(v['expectedVersion'], v['observedVersion']) for v in violations] == [('1.24.0', '1.26.0')]
+    assert skipped == []
+
+def test_pins_without_a_baseline_are_skipped(constraints):
+    compiled = constraints.compile_constraints(['NumPy version locked'])
+    violations, skipped = constraints.evaluate_fleet([('env-1', compiled, LATEST)])
+    assert violations == []
+    assert [s['reason'] for s in skipped] == ['UNRESOLVED']
+
+def test_fleet_evaluation_reports_each_violation(constraints):
+    rules = ['DO NOT update numpy beyond 1.25', 'numpy must be at least 1.24', 'nvidia-driver < 535', 'scipy must remain at 1.11', 'keep it tidy']
+    compiled = constraints.compile_constraints(rules)
+    violations, skipped = constraints.evaluate_fleet([('env-1', compiled, LATEST), ('env-2', compiled, BASELINE), ('env-3', compiled, None)])
+
+    assert [(v['environmentId'], v['constraint']) for v in violations] == [
+        ('env-1', 'DO NOT update numpy beyond 1.25'),
+        ('env-1', 'nvidia-driver < 535'),
+        ('env-2', 'nvidia-driver < 535'),
+    ]
+    assert [(s['environmentId'], s['reason']) for s in skipped] == [
+        ('env-1', 'MISSING_COMPONENT'), ('env-1', 'UNPARSED'),
+        ('env-2', 'MISSING_COMPONENT'), ('env-2', 'UNPARSED'),
+        ('env-3', 'NO_SNAPSHOT'), ('env-3', 'NO_SNAPSHOT'), ('env-3', 'NO_SNAPSHOT'), ('env-3', 'NO_SNAPSHOT'), ('env-3', 'UNPARSED'),
+    ]
+
+def test_trailing_zeros_compare_equal(constraints):
+    compiled = constraints.compile_constraints(['cuda must remain at 11.4'])
+    snapshot = {'drivers': [{'name': 'cuda', 'version': '11.4.0'}]}
+    assert constraints.evaluate_fleet([('env-1', compiled, snapshot)]) == ([], [])
+
+def test_components_match_exactly(constraints):
+    compiled = constraints.compile_constraints(['numpy must remain at 1.24'])
+    snapshot = {'packages': [{'name': 'numpy-financial', 'version': '1.0.0'}]}
+    _, skipped = constraints.evaluate_fleet([('env-1', compiled, snapshot)])
+    assert [s['reason'] for s in skipped] == ['MISSING_COMPONENT']
+
+def test_cache_is_recompiled_when_the_baseline_changes(load_lambda, monkeypatch):
+    index = load_lambda('check_compliance')
+    writes = []
+
+    class Environments:
+        def update_item(self, Key, ExpressionAttributeValues, **kwargs):
+            writes.append(ExpressionAttributeValues[':compiled'])
+
+    monkeypatch.setattr(index, 'environments_table', Environments())
+    monkeypatch.setattr(index, 'get_baseline_snapshot', lambda environment: BASELINE)
+    environment = {'id': 'env-1', 'constraints': ['NumPy version locked'], 'baselineSnapshotId': 'snap-base'}
+
+    compiled = index.get_compiled_constraints(environment, LATEST)
+    assert compiled['rules'][0]['version'] == '1.24.0'
+    environment['compiledConstraints'] = compiled
+    assert index.get_compiled_constraints(environment, LATEST) is compiled
+
+    rebaselined = {'id': 'snap-new', 'packages': [{'name': 'numpy', 'version': '1.26.0'}]}
+    monkeypatch.setattr(index, 'get_baseline_snapshot', lambda environment: rebaselined)
+    environment['baselineSnapshotId'] = 'snap-new'
+    assert index.get_compiled_constraints(environment, LATEST)['rules'][0]['version'] == '1.26.0'
+    assert len(writes) == 2
@@ -3,6 +3,11 @@ import os
 import boto3
 from datetime import datetime
 
+from versioning import (
+    compute_etag, drift_counter, etag_headers, get_versions,
+    is_not_modified, not_modified_response
+)
+
 dynamodb = boto3.resource('dynamodb')
 drift_events_table = dynamodb.Table(os.environ['DRIFT_EVENTS_TABLE'])
 snapshots_table = dynamodb.Table(os.environ['SNAPSHOTS_TABLE'])
@@ -13,6 +18,12 @@ def handler(event, context):
     try:
         environment_id = event['pathParameters']['id']
         
+        # Snapshots and drift events for this environment bump one counter
+        version, = get_versions(drift_counter(environment_id))
+        etag = compute_etag(drift_counter(environment_id), version)
+        if is_not_modified(event, etag):
+            return not_modified_response(etag)
+        
         # Get latest snapshot
         response = snapshots_table.query(
             KeyConditionExpression='environmentId = :env_id',
@@ -38,7 +49,7 @@ def handler(event, context):
         
         return {
             'statusCode': 200,
-            'headers': {'Access-Control-Allow-Origin': '*'},
+            'headers': etag_headers(etag),
             'body': json.dumps({
                 'driftEvents': drift_events,
                 'driftScore': calculate_drift_score(drift_events)
@@ -59,6 +70,9 @@ def calculate_drift_score(drift_events):
     
     score = 0
     for event in drift_events:
+        # Resolved events (fixed by remediation or back in sync) no longer count
+        if event.get('resolved'):
+            continue
         if event.get('severity') == 'CRITICAL':
             score += 30
         elif event.get('severity') == 'WARNING':
@@ -0,0 +1,187 @@
+"""Cold tier of the audit log: compressed, day-partitioned archive files.
+
+Events older than the hot horizon are moved out of AuditLogTable into one
+gzipped NDJSON file per day per archive run, newest first:
+
+    audit/<YYYY.MM.DD>/<run>.ndjson.gz
+
+Every file has an entry in its month's catalog, audit/catalog/<YYYY.MM>.json,
+with its min/max timestamp, item count and the environment ids it holds;
+audit/catalog/months.json lists the months. Queries read the catalogs (cached
+briefly) and only open files whose time range and environments can match.
+
+Objects live in AUDIT_ARCHIVE_BUCKET, or under AUDIT_ARCHIVE_DIR as a local
+stand-in when no bucket is configured.
+"""
+import gzip
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal
+
+from raw_output import LocalStore, S3Store
+
+PREFIX = 'audit'
+MONTHS_KEY = f"{PREFIX}/catalog/months.json"
+# The archiver rewrites catalogs at most daily; readers refresh them this often
+CATALOG_TTL_SECONDS = 300
+FILE_CACHE_SIZE = 16
+
+def store_from_env():
+    """Bucket store when AUDIT_ARCHIVE_BUCKET is set, else the local directory stand-in"""
+    if os.environ.get('AUDIT_ARCHIVE_BUCKET'):
+        return S3Store(os.environ['AUDIT_ARCHIVE_BUCKET'])
+    return LocalStore(os.environ.get('AUDIT_ARCHIVE_DIR', '/tmp/audit-archive'))
+
+def catalog_key(month):
+    return f"{PREFIX}/catalog/{month}.json"
+
+def order_key(item):
+    return item.get('timestamp', ''), item.get('id', '')
+
+class AuditArchive:
+    def __init__(self, store):
+        self.store = store
+        self.lock = threading.Lock()
+        self.catalogs = {}
+        self.files = OrderedDict()
+
+    def read_json(self, key, default):
+        try:
+            return json.loads(self.store.get(key))
+        except Exception as e:
+            if is_missing(e):
+                return default
+            raise
+
+    def cached_json(self, key, default):
+        """A catalog object, cached for CATALOG_TTL_SECONDS"""
+        with self.lock:
+            cached = self.catalogs.get(key)
+            if cached and cached[0] > time.time():
+                return cached[1]
+        value = self.read_json(key, default)
+        with self.lock:
+            self.catalogs[key] = (time.time() + CATALOG_TTL_SECONDS, value)
+        return value
+
+    def months(self):
+        return self.cached_json(MONTHS_KEY, [])
+
+    def catalog(self, month):
+        """File entries archived for one month"""
+        return self.cached_json(catalog_key(month), [])
+
+    def write(self, run_id, items):
+        """Archive items (one day-partition file each) and record them in the catalogs; returns the entries"""
+        days = {}
+        for item in items:
+            days.setdefault(item['timestamp'][:10], []).append(item)
+
+        entries = []
+        for day, day_items in sorted(days.items()):
+            day_items.sort(key=order_key, reverse=True)
+            key = f"{PREFIX}/{day}/{run_id}.ndjson.gz"
+            body = ''.join(json.dumps(item, default=plain_number) + '\n' for item in day_items)
+            self.store.put(key, gzip.compress(body.encode('utf-8')), 'application/gzip')
+            entries.append({
+                'key': key,
+                'minTimestamp': day_items[-1]['timestamp'],
+                'maxTimestamp': day_items[0]['timestamp'],
+                'count': len(day_items),
+                'environmentIds': sorted({item['environmentId'] for item in day_items if item.get('environmentId')})
+            })
+
+        # Single writer (the scheduled archiver), so read-modify-write is safe
+        by_month = {}
+        for entry in entries:
+            by_month.setdefault(entry['key'][len(PREFIX) + 1:][:7], []).append(entry)
+        for month, month_entries in by_month.items():
+            catalog = self.read_json(catalog_key(month), [])
+            self.store.put(catalog_key(month), json.dumps(catalog + month_entries).encode('utf-8'), 'application/json')
+        months = self.read_json(MONTHS_KEY, [])
+        if set(by_month) - set(months):
+            self.store.put(MONTHS_KEY, json.dumps(sorted(set(months) | set(by_month))).encode('utf-8'), 'application/json')
+        with self.lock:
+            self.catalogs.clear()
+        return entries
+
+    def candidates(self, filters, since=None, until=None):
+        """Catalog entries whose time range and environments can match, newest first"""
+        environment_id = filters.get('environmentId')
+        entries = []
+        for month in self.months():
+            if (since and month < since[:7]) or (until and month > until[:7]):
+                continue
+            for entry in self.catalog(month):
+                if since and entry['maxTimestamp'] < since:
+                    continue
+                if until and entry['minTimestamp'] > until:
+                    continue
+                if environment_id and environment_id not in entry['environmentIds']:
+                    continue
+                entries.append(entry)
+        return sorted(entries, key=lambda entry: entry['maxTimestamp'], reverse=True)
+
+    def read_file(self, key):
+        """Items of one archive file (immutable, so cached by key)"""
+        with self.lock:
+            if key in self.files:
+                self.files.move_to_end(key)
+                return self.files[key]
+        lines = gzip.decompress(self.store.get(key)).decode('utf-8').splitlines()
+        items = [json.loads(line) for line in lines if line]
+        with self.lock:
+            self.files[key] = items
+            while len(self.files) > FILE_CACHE_SIZE:
+                self.files.popitem(last=False)
+        return items
+
+    def stream(self, candidates, filters, since=None, until=None):
+        """Matching items of candidate files, newest first, opening files only as the merge reaches them"""
+        pending = list(candidates)
+        active = []
+
+        def open_file(entry):
+            matches = (
+                item for item in self.read_file(entry['key'])
+                if matches_filters(item, filters, since, until)
+            )
+            head = next(matches, None)
+            if head is not None:
+                active.append([head, matches])
+
+        while True:
+            # Any file that could still hold something newer than the best head is opened first
+            while pending and (not active or pending[0]['maxTimestamp'] >= max(a[0]['timestamp'] for a in active)):
+                open_file(pending.pop(0))
+            if not active:
+                return
+            best = max(active, key=lambda a: order_key(a[0]))
+            yield best[0]
+            following = next(best[1], None)
+            if following is None:
+                active.remove(best)
+            else:
+                best[0] = following
+
+def plain_number(value):
+    """DynamoDB numbers as JSON numbers"""
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    return str(value)
+
+def matches_filters(item, filters, since, until):
+    timestamp = item.get('timestamp', '')
+    if (since and timestamp < since) or (until and timestamp > until):
+        return False
+    return all(item.get(name) == value for name, value in filters.items())
+
+def is_missing(error):
+    """Missing object in either store"""
+    if isinstance(error, FileNotFoundError):
+        return True
+    code = getattr(error, 'response', {}).get('Error', {}).get('Code')
+    return code in ('NoSuchKey', '404')
@@ -0,0 +1,149 @@
+"""Server-side environment filtering through the environments table GSIs.
+
+    StatusFacilityIndex  status         / facilityLab ("<facility>#<labName>")
+    ResearcherIndex      researcherName / labName
+
+facilityLab and researcherName are derived by search_keys() when an
+environment is written. The indexes are sparse, so items written before they
+existed need a backfill (scripts/seed_fleet.py --backfill-search-keys).
+
+plan() picks the index expected to read the fewest items; a facility without
+a status reads that facility's range in every status partition. Filters the
+chosen index does not cover become a FilterExpression. With no usable index
+the table is scanned page by page with every filter as a FilterExpression;
+an index still being added or backfilled (see index_status.py) counts as
+unusable, so the scan also covers the staged rollout of the indexes.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from index_status import active_indexes
+
+FILTERS = ('status', 'facility', 'researcher', 'experimentId', 'labNamePrefix')
+STATUSES = ('ACTIVE', 'FROZEN', 'STAGING', 'ARCHIVED')
+KEY_SEPARATOR = '#'
+
+# Rough fraction of the fleet each access path reads
+SELECTIVITY = {
+    'researcher': 0.02,
+    'status+facility': 0.05,
+    'facility': 0.1,
+    'status': 0.3,
+}
+
+# Residual conditions over the item's own attributes (researcher is a map)
+CONDITIONS = {
+    'status': '#status = :status',
+    'facility': 'facility = :facility',
+    'researcher': 'researcher.#name = :researcher',
+    'experimentId': 'experimentId = :experimentId',
+    'labNamePrefix': 'begins_with(labName, :labNamePrefix)',
+}
+CONDITION_NAMES = {'status': {'#status': 'status'}, 'researcher': {'#name': 'name'}}
+
+def search_keys(environment):
+    """Derived GSI key attributes for an environment item"""
+    keys = {}
+    if environment.get('facility') and environment.get('labName'):
+        keys['facilityLab'] = f"{environment['facility']}{KEY_SEPARATOR}{environment['labName']}"
+    researcher = (environment.get('researcher') or {}).get('name')
+    if researcher:
+        keys['researcherName'] = researcher
+    return keys
+
+def plan(filters, available=None):
+    """Pick the index, partitions and sort key prefix to read, plus residual filters.
+
+    `available` limits the plan to those index names (default: both indexes).
+    """
+    if filters.get('status') and filters['status'] not in STATUSES:
+        raise ValueError(f"status must be one of {', '.join(STATUSES)}")
+
+    prefix = filters.get('labNamePrefix') or ''
+    candidates = []
+    if filters.get('researcher'):
+        candidates.append((SELECTIVITY['researcher'], {
+            'index': 'ResearcherIndex',
+            'partitionKey': 'researcherName',
+            'partitions': [filters['researcher']],
+            'sortKey': 'labName',
+            'sortPrefix': prefix or None,
+            'covered': {'researcher', 'labNamePrefix'}
+        }))
+    if filters.get('facility'):
+        status = filters.get('status')
+        candidates.append((SELECTIVITY['status+facility' if status else 'facility'], {
+            'index': 'StatusFacilityIndex',
+            'partitionKey': 'status',
+            'partitions': [status] if status else list(STATUSES),
+            'sortKey': 'facilityLab',
+            'sortPrefix': f"{filters['facility']}{KEY_SEPARATOR}{prefix}",
+            'covered': {'status', 'facility', 'labNamePrefix'}
+        }))
+    elif filters.get('status'):
+        candidates.append((SELECTIVITY['status'], {
+            'index': 'StatusFacilityIndex',
+            'partitionKey': 'status',
+            'partitions': [filters['status']],
+            'sortKey': 'facilityLab',
+            'sortPrefix': None,
+            'covered': {'status'}
+        }))
+
+    if available is not None:
+        candidates = [candidate for candidate in candidates if candidate[1]['index'] in available]
+    if not candidates:
+        return {'index': None, 'residual': dict(filters)}
+    _, query_plan = min(candidates, key=lambda candidate: candidate[0])
+    covered = query_plan.pop('covered')
+    query_plan['residual'] = {name: value for name, value in filters.items() if name not in covered}
+    return query_plan
+
+def filter_expression(residual, kwargs):
+    """Add residual filters to Query/Scan kwargs"""
+    if not residual:
+        return
+    kwargs['FilterExpression'] = ' AND '.join(CONDITIONS[name] for name in residual)
+    for name, value in residual.items():
+        if name in CONDITION_NAMES:
+            kwargs.setdefault('ExpressionAttributeNames', {}).update(CONDITION_NAMES[name])
+        kwargs.setdefault('ExpressionAttributeValues', {})[f":{name}"] = value
+
+def query_partition(table, query_plan, value):
+    kwargs = {
+        'IndexName': query_plan['index'],
+        'KeyConditionExpression': '#pk = :pk',
+        'ExpressionAttributeNames': {'#pk': query_plan['partitionKey']},
+        'ExpressionAttributeValues': {':pk': value}
+    }
+    if query_plan['sortPrefix']:
+        kwargs['KeyConditionExpression'] += ' AND begins_with(#sk, :sk)'
+        kwargs['ExpressionAttributeNames']['#sk'] = query_plan['sortKey']
+        kwargs['ExpressionAttributeValues'][':sk'] = query_plan['sortPrefix']
+    filter_expression(query_plan['residual'], kwargs)
+    return paginate(table.query, kwargs)
+
+def scan(table, filters):
+    """Filtered scan; also the path for registries without the indexes"""
+    kwargs = {}
+    filter_expression(filters, kwargs)
+    return paginate(table.scan, kwargs)
+
+def paginate(operation, kwargs):
+    items = []
+    while True:
+        response = operation(**kwargs)
+        items.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            return items
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def execute(table, filters):
+    """Environments matching every filter; returns (items, plan)"""
+    query_plan = plan(filters, active_indexes(table))
+    if not query_plan['index']:
+        return scan(table, query_plan['residual']), query_plan
+
+    with ThreadPoolExecutor(max_workers=len(query_plan['partitions'])) as executor:
+        pages = executor.map(lambda value: query_partition(table, query_plan, value), query_plan['partitions'])
+        items = [item for page in pages for item in page]
+    return items, query_plan
@@ -0,0 +1,189 @@
+"""Fleet targets (account + region pairs) and concurrent fan-out across them.
+
+FLEET_TARGETS is a JSON list configured on the stack:
+
+    [{"name": "research-eu", "accountId": "210987654321", "region": "eu-west-1",
+      "roleArn": "arn:aws:iam::210987654321:role/WestTekFleetAccess",
+      "externalId": "...", "environmentsTable": "WestTekEnvironments",
+      "timeoutSeconds": 5}]
+
+Targets without a roleArn use the function's own credentials; the implicit
+"local" target is this account and region. Environments name their target in
+`fleetTarget` (default "local"). Assumed-role sessions and their clients are
+cached per target until shortly before the credentials expire. Clients for a
+target time out their connections and reads after its timeoutSeconds, so a
+hung call gives its thread back instead of holding it.
+"""
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import boto3
+from botocore.config import Config
+
+LOCAL = 'local'
+
+# Per-target deadline for one fan-out unless the target sets timeoutSeconds
+DEFAULT_TIMEOUT = float(os.environ.get('FLEET_TARGET_TIMEOUT', '8'))
+ROLE_SESSION_SECONDS = 3600
+# Assumed-role sessions are renewed this long before their credentials expire
+CREDENTIAL_REFRESH_MARGIN = 300
+MAX_WORKERS = 32
+
+def load_targets():
+    """Configured targets by name, with the local target always present"""
+    region = os.environ.get('AWS_REGION') or boto3.session.Session().region_name
+    targets = {LOCAL: {'name': LOCAL, 'region': region}}
+    for target in json.loads(os.environ.get('FLEET_TARGETS') or '[]'):
+        target = dict(target)
+        target.setdefault('name', f"{target.get('accountId', 'self')}-{target['region']}")
+        targets[target['name']] = target
+    return targets
+
+TARGETS = load_targets()
+
+_sessions = {}
+_clients = {}
+_locks = {}
+_locks_guard = threading.Lock()
+
+def remote_targets():
+    """Targets other than the local account and region"""
+    return [target for name, target in TARGETS.items() if name != LOCAL]
+
+def target_for(environment):
+    """Fleet target an environment item belongs to"""
+    name = environment.get('fleetTarget') or LOCAL
+    if name not in TARGETS:
+        raise ValueError(f"Environment {environment.get('id')} names unknown fleet target '{name}'")
+    return TARGETS[name]
+
+def limiter_scope(target):
+    """Rate limiter scope for a target (None shares the local buckets)"""
+    return None if target['name'] == LOCAL else target['name']
+
+def timeout_config(target):
+    """Connect and read timeouts for calls into a target, matching its fan-out deadline"""
+    seconds = float(target.get('timeoutSeconds', DEFAULT_TIMEOUT))
+    return Config(connect_timeout=seconds, read_timeout=seconds)
+
+def _lock_for(name):
+    with _locks_guard:
+        return _locks.setdefault(name, threading.Lock())
+
+def session_for(target):
+    """boto3 session for a target, assuming its role when one is configured"""
+    name = target['name']
+    with _lock_for(name):
+        cached = _sessions.get(name)
+        if cached and cached[1] - CREDENTIAL_REFRESH_MARGIN > time.time():
+            return cached[0]
+
+        if not target.get('roleArn'):
+            session, expires = boto3.session.Session(region_name=target['region']), float('inf')
+        else:
+            kwargs = {
+                'RoleArn': target['roleArn'],
+                'RoleSessionName': 'west-tek-fleet',
+                'DurationSeconds': ROLE_SESSION_SECONDS
+            }
+            if target.get('externalId'):
+                kwargs['ExternalId'] = target['externalId']
+            sts = boto3.client('sts', config=timeout_config(target))
+            credentials = sts.assume_role(**kwargs)['Credentials']
+            session = boto3.session.Session(
+                aws_access_key_id=credentials['AccessKeyId'],
+                aws_secret_access_key=credentials['SecretAccessKey'],
+                aws_session_token=credentials['SessionToken'],
+                region_name=target['region']
+            )
+            expires = credentials['Expiration'].timestamp()
+
+        _sessions[name] = (session, expires)
+        return session
+
+def client(service, target, config=None):
+    """Cached client for a target; rebuilt whenever its session is renewed"""
+    session = session_for(target)
+    key = (target['name'], service, id(config))
+    with _lock_for(target['name']):
+        cached = _clients.get(key)
+        if cached and cached[0] is session:
+            return cached[1]
+        # Caller settings (e.g. retries) win; the target's timeouts fill in the rest
+        built = session.client(service, config=timeout_config(target).merge(config) if config else timeout_config(target))
+        _clients[key] = (session, built)
+        return built
+
+def resource(service, target):
+    """Cached resource (e.g. dynamodb) for a target"""
+    session = session_for(target)
+    key = (target['name'], service, 'resource')
+    with _lock_for(target['name']):
+        cached = _clients.get(key)
+        if cached and cached[0] is session:
+            return cached[1]
+        built = session.resource(service, config=timeout_config(target))
+        _clients[key] = (session, built)
+        return built
+
+def failure(target, error):
+    return {
+        'target': target['name'],
+        'accountId': target.get('accountId'),
+        'region': target['region'],
+        'error': error
+    }
+
+def fan_out(fn, targets, timeout=None):
+    """Run fn(target) for every target concurrently under per-target deadlines.
+
+    Each target gets `timeout` seconds if given, else its own timeoutSeconds.
+    Returns (results by target name, failures). Latency is bounded by the
+    longest deadline; targets that fail or miss their deadline are reported
+    in failures rather than raised.
+
+    The pool is per call and shut down without waiting, so a target that
+    misses its deadline never delays the caller or takes a later call's
+    threads; its client timeouts end the abandoned call soon after.
+    """
+    if not targets:
+        return {}, []
+    started = time.monotonic()
+    executor = ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(targets)))
+    try:
+        return _collect(executor, fn, targets, timeout, started)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def _collect(executor, fn, targets, timeout, started):
+    futures = {executor.submit(fn, target): target for target in targets}
+    deadlines = {
+        future: started + float(timeout or target.get('timeoutSeconds', DEFAULT_TIMEOUT))
+        for future, target in futures.items()
+    }
+    results, failures = {}, []
+    pending = set(futures)
+
+    while pending:
+        now = time.monotonic()
+        for future in [f for f in pending if deadlines[f] <= now]:
+            pending.discard(future)
+            future.cancel()
+            target = futures[future]
+            failures.append(failure(target, f"Timed out after {deadlines[future] - started:.1f}s"))
+        if not pending:
+            break
+
+        done, pending = wait(pending, timeout=min(deadlines[f] for f in pending) - now, return_when=FIRST_COMPLETED)
+        for future in done:
+            target = futures[future]
+            try:
+                results[target['name']] = future.result()
+            except Exception as e:
+                print(f"Error in fleet target {target['name']}: {e}")
+                failures.append(failure(target, str(e)))
+
+    return results, failures
@@ -0,0 +1,31 @@
+"""Which global secondary indexes of a table can serve queries yet.
+
+CloudFormation adds at most one GSI per table per stack update, and a new
+index is queryable only after DynamoDB has backfilled it, so readers ask here
+before planning a query and fall back to a filtered scan while the index they
+want is missing. DescribeTable results are cached per container for a minute.
+"""
+import time
+
+CACHE_SECONDS = 60
+
+_cache = {}
+
+def active_indexes(table):
+    """Names of the table's GSIs that are ACTIVE and done backfilling"""
+    cached = _cache.get(table.name)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+    try:
+        description = table.meta.client.describe_table(TableName=table.name)['Table']
+    except Exception as e:
+        # Unknown is treated as unavailable; the scan fallback is slower, not wrong
+        print(f"Error describing table {table.name}: {e}")
+        return frozenset()
+    active = frozenset(
+        index['IndexName']
+        for index in description.get('GlobalSecondaryIndexes', [])
+        if index.get('IndexStatus') == 'ACTIVE' and not index.get('Backfilling')
+    )
+    _cache[table.name] = (time.monotonic() + CACHE_SECONDS, active)
+    return active
@@ -0,0 +1,114 @@
+"""Environments across the fleet, enriched with live EC2 instance state.
+
+Environments registered in this account come from the local table; targets
+with an `environmentsTable` contribute their own registries. Each target is
+loaded in one fan-out task (registry scan plus batched DescribeInstances), so
+total latency is bounded by the slowest target. Given environment ids, each
+registry is read with BatchGetItem instead of a full scan; given filters, the
+local table is searched through its indexes (environment_search) and remote
+registries, which may lack them, with a filtered scan.
+"""
+from collections import defaultdict
+
+import environment_search
+import federation
+from rate_limiter import NO_RETRY_CONFIG, limiter_for
+
+# EC2 accepts at most 200 values per filter
+INSTANCE_FILTER_CHUNK = 200
+# BatchGetItem reads at most 100 keys per request
+BATCH_GET_KEYS = 100
+
+def load_environments(table, environment_ids=None, filters=None):
+    """(environments, unavailable targets) for the whole fleet, only the given ids, or only matches"""
+    def read(registry, local=False):
+        if environment_ids is not None:
+            return batch_get_environments(registry, environment_ids)
+        if filters and local:
+            items, _ = environment_search.execute(registry, filters)
+            return items
+        if filters:
+            return environment_search.scan(registry, filters)
+        return scan_environments(registry)
+
+    environments = read(table, local=True)
+
+    # Instance ids per fleet target, for environments registered here
+    instance_ids = defaultdict(list)
+    for env in environments:
+        env['fleetTarget'] = env.get('fleetTarget') or federation.LOCAL
+        if 'instanceId' in env:
+            instance_ids[env['fleetTarget']].append(env['instanceId'])
+
+    def load_target(target):
+        remote = []
+        if target.get('environmentsTable'):
+            remote_table = federation.resource('dynamodb', target).Table(target['environmentsTable'])
+            remote = read(remote_table)
+            for env in remote:
+                env['fleetTarget'] = target['name']
+        ids = instance_ids.get(target['name'], []) + [env['instanceId'] for env in remote if 'instanceId' in env]
+        return remote, get_instance_states(target, ids)
+
+    targets = [
+        target for target in federation.TARGETS.values()
+        if target.get('environmentsTable') or instance_ids.get(target['name'])
+    ]
+    results, failures = federation.fan_out(load_target, targets)
+
+    known = {env['id'] for env in environments}
+    for remote, _ in results.values():
+        environments.extend(env for env in remote if env['id'] not in known)
+
+    # Enrich with real-time EC2 instance status
+    for env in environments:
+        if 'instanceId' in env:
+            _, states = results.get(env['fleetTarget'], ([], {}))
+            env['instanceState'] = states.get(env['instanceId'], 'unknown')
+
+    return environments, failures
+
+def scan_environments(table):
+    """Every item of an environments table"""
+    items = []
+    kwargs = {}
+    while True:
+        response = table.scan(**kwargs)
+        items.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            return items
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def batch_get_environments(table, environment_ids):
+    """Items of an environments table by id; ids not found are skipped"""
+    # The resource's client converts to and from plain Python values, as Table methods do
+    items = []
+    unique_ids = sorted(set(environment_ids))
+    for i in range(0, len(unique_ids), BATCH_GET_KEYS):
+        request = {table.name: {'Keys': [{'id': env_id} for env_id in unique_ids[i:i + BATCH_GET_KEYS]]}}
+        while request:
+            response = table.meta.client.batch_get_item(RequestItems=request)
+            items.extend(response['Responses'].get(table.name, []))
+            request = response.get('UnprocessedKeys')
+    return items
+
+def get_instance_states(target, instance_ids):
+    """Look up instance states in one target with batched, rate-limited DescribeInstances calls"""
+    states = {}
+    unique_ids = sorted(set(instance_ids))
+    if not unique_ids:
+        return states
+    ec2 = federation.client('ec2', target, NO_RETRY_CONFIG)
+    limiter = limiter_for('ec2:DescribeInstances', federation.limiter_scope(target))
+    for i in range(0, len(unique_ids), INSTANCE_FILTER_CHUNK):
+        chunk = unique_ids[i:i + INSTANCE_FILTER_CHUNK]
+        kwargs = {'Filters': [{'Name': 'instance-id', 'Values': chunk}]}
+        while True:
+            response = limiter.call(ec2.describe_instances, **kwargs)
+            for reservation in response['Reservations']:
+                for instance in reservation['Instances']:
+                    states[instance['InstanceId']] = instance['State']['Name']
+            if not response.get('NextToken'):
+                break
+            kwargs['NextToken'] = response['NextToken']
+    return states
@@ -0,0 +1,233 @@
+"""Index selection and keyset pagination for audit log queries.
+
+Every equality filter the feed supports has a GSI keyed on that attribute with
+`timestamp` as the sort key. The planner queries the index whose partition is
+expected to hold the fewest rows for the requested values and applies the
+remaining filters as a FilterExpression, so the items read grow with the
+matching partition, not with the table.
+
+Without an equality filter the feed merges the severity partitions (every
+audit item has one) newest-first. Results are ordered by (timestamp, id)
+descending and the cursor is the last (timestamp, id) returned, which keeps
+pages stable whichever index served them.
+
+Given an audit_archive, events already moved to the cold tier are merged in
+the same order. Archive files are only opened once the hot results reach the
+newest archived timestamp that could match.
+
+Only indexes that are ACTIVE are planned against (see index_status.py). While
+the audit indexes are rolled out one deploy at a time, filters whose index is
+not ready become residual filters, and with no usable index at all the feed
+falls back to a filtered table scan sorted in memory.
+"""
+import base64
+import heapq
+import json
+from itertools import chain, groupby
+
+from index_status import active_indexes
+
+# filter parameter -> (GSI, indexed attribute)
+INDEXES = {
+    'environmentId': 'EnvironmentIndex',
+    'actor': 'ActorIndex',
+    'action': 'ActionIndex',
+    'severity': 'SeverityIndex',
+}
+
+# Expected share of the log under one value of each attribute (lower is more
+# selective). Per-value overrides cover the skewed high-volume values.
+SELECTIVITY = {
+    'environmentId': 0.002,
+    'actor': 0.02,
+    'action': 0.1,
+    'severity': 0.33,
+}
+VALUE_SELECTIVITY = {
+    ('action', 'SNAPSHOT_CAPTURED'): 0.6,
+    ('action', 'DRIFT_DETECTED'): 0.2,
+    ('actor', 'SYSTEM'): 0.3,
+    ('severity', 'info'): 0.8,
+    ('severity', 'warning'): 0.17,
+    ('severity', 'critical'): 0.03,
+}
+
+SEVERITIES = ('critical', 'warning', 'info')
+
+class InvalidCursor(Exception):
+    pass
+
+def plan(filters, available=None):
+    """Pick the index and partitions to read, plus residual equality filters.
+
+    `available` limits the plan to those index names (default: all of INDEXES).
+    """
+    if available is None:
+        available = set(INDEXES.values())
+    requested = [name for name in INDEXES if filters.get(name)]
+    candidates = [name for name in requested if INDEXES[name] in available]
+    if not candidates:
+        residual = {name: filters[name] for name in requested}
+        if INDEXES['severity'] not in available:
+            return {'index': None, 'attribute': None, 'partitions': [None], 'residual': residual}
+        return {
+            'index': INDEXES['severity'],
+            'attribute': 'severity',
+            'partitions': list(SEVERITIES),
+            'residual': residual
+        }
+
+    attribute = min(
+        candidates,
+        key=lambda name: VALUE_SELECTIVITY.get((name, filters[name]), SELECTIVITY[name])
+    )
+    return {
+        'index': INDEXES[attribute],
+        'attribute': attribute,
+        'partitions': [filters[attribute]],
+        'residual': {name: filters[name] for name in requested if name != attribute}
+    }
+
+def encode_cursor(item):
+    raw = json.dumps([item['timestamp'], item['id']]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+def decode_cursor(cursor):
+    try:
+        timestamp, item_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return str(timestamp), str(item_id)
+    except Exception:
+        raise InvalidCursor(f"Invalid cursor: {cursor}")
+
+def order_key(item):
+    return item.get('timestamp', ''), item.get('id', '')
+
+def time_range(since, until, names, values):
+    """Condition on #t for an inclusive since/until range (None if unbounded)"""
+    if since or until:
+        names['#t'] = 'timestamp'
+    if since and until:
+        values[':since'], values[':until'] = since, until
+        return '#t BETWEEN :since AND :until'
+    if since:
+        values[':since'] = since
+        return '#t >= :since'
+    if until:
+        values[':until'] = until
+        return '#t <= :until'
+    return None
+
+def equality_filters(residual, names, values):
+    conditions = []
+    for n, (name, expected) in enumerate(sorted(residual.items())):
+        names[f"#f{n}"] = name
+        values[f":f{n}"] = expected
+        conditions.append(f"#f{n} = :f{n}")
+    return conditions
+
+def scan_table(table, query_plan, since, until):
+    """Every matching item, newest first; only used while no audit index is ACTIVE"""
+    names, values = {}, {}
+    conditions = equality_filters(query_plan['residual'], names, values)
+    condition = time_range(since, until, names, values)
+    if condition:
+        conditions.append(condition)
+    kwargs = {}
+    if conditions:
+        kwargs['FilterExpression'] = ' AND '.join(conditions)
+        kwargs['ExpressionAttributeNames'] = names
+        kwargs['ExpressionAttributeValues'] = values
+
+    items = []
+    while True:
+        response = table.scan(**kwargs)
+        items.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            break
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    return iter(sorted(items, key=order_key, reverse=True))
+
+def query_partition(table, query_plan, value, since, until, page_size):
+    """Items of one index partition, newest first, ties ordered by id descending"""
+    if query_plan['index'] is None:
+        return scan_table(table, query_plan, since, until)
+    return query_index(table, query_plan, value, since, until, page_size)
+
+def query_index(table, query_plan, value, since, until, page_size):
+    attribute = query_plan['attribute']
+    names = {'#p': attribute}
+    values = {':p': value}
+    key_condition = '#p = :p'
+    condition = time_range(since, until, names, values)
+    if condition:
+        key_condition += f" AND {condition}"
+
+    kwargs = {
+        'IndexName': query_plan['index'],
+        'KeyConditionExpression': key_condition,
+        'ScanIndexForward': False,
+        'Limit': page_size
+    }
+    residual = equality_filters(query_plan['residual'], names, values)
+    if residual:
+        kwargs['FilterExpression'] = ' AND '.join(residual)
+    kwargs['ExpressionAttributeNames'] = names
+    kwargs['ExpressionAttributeValues'] = values
+
+    def pages():
+        while True:
+            response = table.query(**kwargs)
+            yield from response.get('Items', [])
+            if 'LastEvaluatedKey' not in response:
+                return
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    # Index order is only defined by timestamp; order same-second items by id
+    for _, same_second in groupby(pages(), key=lambda item: item.get('timestamp', '')):
+        yield from sorted(same_second, key=order_key, reverse=True)
+
+def merge_tiers(hot, cold, cold_newest):
+    """Hot items newer than anything archived need no archive reads"""
+    hot = iter(hot)
+    for item in hot:
+        if item.get('timestamp', '') <= cold_newest:
+            yield from heapq.merge(chain([item], hot), cold, key=order_key, reverse=True)
+            return
+        yield item
+    yield from cold
+
+def execute(table, filters, limit, cursor=None, archive=None):
+    """Run a filtered audit query over the table and, if given, the archive; returns (items, next_cursor, plan)"""
+    query_plan = plan(filters, active_indexes(table))
+    since, until = filters.get('since'), filters.get('until')
+    after = decode_cursor(cursor) if cursor else None
+    if after and (not until or after[0] < until):
+        until = after[0]
+
+    # One extra row tells whether another page exists
+    page_size = limit + 1
+    streams = [
+        query_partition(table, query_plan, value, since, until, page_size)
+        for value in query_plan['partitions']
+    ]
+    merged = heapq.merge(*streams, key=order_key, reverse=True)
+    if archive:
+        equality = {name: value for name, value in filters.items() if name in INDEXES}
+        candidates = archive.candidates(equality, since, until)
+        if candidates:
+            cold = archive.stream(candidates, equality, since, until)
+            merged = merge_tiers(merged, cold, candidates[0]['maxTimestamp'])
+
+    items = []
+    for item in merged:
+        if after and order_key(item) >= after:
+            continue
+        # An archive run interrupted before its deletes leaves events in both tiers
+        if items and order_key(items[-1]) == order_key(item):
+            continue
+        items.append(item)
+        if len(items) > limit:
+            break
+
+    next_cursor = encode_cursor(items[limit - 1]) if len(items) > limit else None
+    return items[:limit], next_cursor, query_plan
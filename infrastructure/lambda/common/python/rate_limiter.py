@@ -0,0 +1,208 @@
+"""Shared token-bucket rate limiting for AWS control-plane calls.
+
+Bucket state lives in the counters table (one `ratelimit#<api>` item per
+bucket) so every concurrent Lambda invocation draws from the same budget.
+Without COUNTERS_TABLE an in-process bucket stands in. The refill rate is
+adaptive (AIMD): it creeps back up towards the configured rate while calls
+succeed and halves whenever AWS reports throttling.
+"""
+import os
+import random
+import threading
+import time
+import uuid
+from decimal import Decimal
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+COUNTERS_TABLE = os.environ.get('COUNTERS_TABLE')
+
+# Error codes AWS services use for request-rate throttling
+THROTTLE_CODES = {
+    'Throttling',
+    'ThrottlingException',
+    'ThrottledException',
+    'RequestLimitExceeded',
+    'TooManyRequestsException',
+    'RequestThrottled',
+}
+
+# (sustained requests/sec, burst) per API, shared by every caller of that API
+API_LIMITS = {
+    'ec2:DescribeInstances': (20, 100),
+    'ssm:SendCommand': (5, 10),
+    'ssm:CancelCommand': (5, 10),
+    'ssm:GetCommandInvocation': (10, 20),
+    'ssm:ListCommandInvocations': (10, 20),
+    'ssm:ListCommands': (10, 20),
+    'workspaces:DescribeWorkspaces': (5, 10),
+    'workspaces:DescribeWorkspaceBundles': (5, 10),
+    'workspaces:DescribeWorkspaceDirectories': (2, 5),
+    'cloudformation:DetectStackDrift': (5, 10),
+    'cloudformation:DescribeStackDriftDetectionStatus': (10, 20),
+    'cloudformation:DescribeStackResourceDrifts': (5, 10),
+}
+
+# Clients wrapped by a limiter should surface throttles instead of retrying
+# them internally, so the limiter sees them and adapts
+NO_RETRY_CONFIG = Config(retries={'total_max_attempts': 1, 'mode': 'standard'})
+
+MAX_ATTEMPTS = 5
+BASE_BACKOFF = 0.2
+MAX_BACKOFF = 5.0
+
+# Backoff between lost compare-and-set races on the shared bucket item
+CAS_BASE_BACKOFF = 0.01
+CAS_MAX_BACKOFF = 0.5
+# A throttle that cannot be recorded after this many races is dropped; the
+# callers that won them have already moved the rate
+MAX_THROTTLE_RECORD_ATTEMPTS = 8
+
+class RateLimitTimeout(Exception):
+    pass
+
+class LocalBucketStore:
+    """In-process stand-in for the DynamoDB bucket item"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.state = None
+
+    def load(self):
+        with self.lock:
+            return self.state
+
+    def save(self, tokens, rate, updated_at, expected):
+        with self.lock:
+            current = self.state['rev'] if self.state else None
+            if current != expected:
+                return False
+            self.state = {'tokens': tokens, 'rate': rate, 'updatedAt': updated_at, 'rev': uuid.uuid4().hex}
+            return True
+
+class DynamoBucketStore:
+    """Bucket state in the counters table, updated with optimistic concurrency on `rev`"""
+
+    def __init__(self, name):
+        self.table = boto3.resource('dynamodb').Table(COUNTERS_TABLE)
+        self.key = f"ratelimit#{name}"
+
+    def load(self):
+        item = self.table.get_item(Key={'name': self.key}, ConsistentRead=True).get('Item')
+        if not item:
+            return None
+        return {
+            'tokens': float(item['tokens']),
+            'rate': float(item['rate']),
+            'updatedAt': item['updatedAt'],
+            'rev': item['rev']
+        }
+
+    def save(self, tokens, rate, updated_at, expected):
+        condition = {'ConditionExpression': 'attribute_not_exists(#n)', 'ExpressionAttributeNames': {'#n': 'name'}}
+        if expected is not None:
+            condition = {'ConditionExpression': 'rev = :expected', 'ExpressionAttributeValues': {':expected': expected}}
+        try:
+            self.table.put_item(
+                Item={
+                    'name': self.key,
+                    'tokens': Decimal(str(round(tokens, 4))),
+                    'rate': Decimal(str(round(rate, 4))),
+                    'updatedAt': updated_at,
+                    'rev': uuid.uuid4().hex
+                },
+                **condition
+            )
+            return True
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return False
+            raise
+
+class RateLimiter:
+    """Token bucket with additive-increase / multiplicative-decrease refill rate"""
+
+    def __init__(self, name, rate, burst, max_wait=30.0):
+        self.name = name
+        self.max_rate = float(rate)
+        self.burst = float(burst)
+        self.min_rate = self.max_rate / 20
+        # Rate regained per second of throttle-free operation
+        self.increase = self.max_rate / 20
+        self.max_wait = max_wait
+        self.store = DynamoBucketStore(name) if COUNTERS_TABLE else LocalBucketStore()
+
+    def _refill(self, state, now):
+        if state is None:
+            return self.burst, self.max_rate
+        elapsed = max(0.0, now - float(state['updatedAt']))
+        rate = min(self.max_rate, state['rate'] + self.increase * elapsed)
+        return min(self.burst, state['tokens'] + elapsed * rate), rate
+
+    def acquire(self, tokens=1):
+        """Block until `tokens` are available from the shared bucket"""
+        deadline = time.monotonic() + self.max_wait
+        races = 0
+        while True:
+            state = self.store.load()
+            now = Decimal(str(round(time.time(), 3)))
+            available, rate = self._refill(state, float(now))
+            expected = state['rev'] if state else None
+
+            if available >= tokens:
+                if self.store.save(available - tokens, rate, now, expected):
+                    return
+                # Another caller took tokens first; back off before re-reading
+                wait = cas_backoff(races)
+                races += 1
+            else:
+                wait = (tokens - available) / rate * random.uniform(1.0, 1.5)
+
+            if time.monotonic() + wait > deadline:
+                raise RateLimitTimeout(f"Rate limit wait for {self.name} exceeded {self.max_wait}s")
+            time.sleep(wait)
+
+    def record_throttle(self):
+        """Halve the shared refill rate and drain the bucket"""
+        for races in range(MAX_THROTTLE_RECORD_ATTEMPTS):
+            state = self.store.load()
+            now = Decimal(str(round(time.time(), 3)))
+            _, rate = self._refill(state, float(now))
+            expected = state['rev'] if state else None
+            if self.store.save(0.0, max(self.min_rate, rate / 2), now, expected):
+                return
+            time.sleep(cas_backoff(races))
+        print(f"Throttle on {self.name} not recorded after {MAX_THROTTLE_RECORD_ATTEMPTS} contended attempts")
+
+    def call(self, fn, *args, **kwargs):
+        """Invoke an AWS API under the limiter, backing off on throttling"""
+        for attempt in range(MAX_ATTEMPTS):
+            self.acquire()
+            try:
+                return fn(*args, **kwargs)
+            except ClientError as e:
+                if e.response['Error']['Code'] not in THROTTLE_CODES or attempt == MAX_ATTEMPTS - 1:
+                    raise
+                print(f"Throttled on {self.name} (attempt {attempt + 1}), slowing down")
+                self.record_throttle()
+                time.sleep(random.uniform(0, min(MAX_BACKOFF, BASE_BACKOFF * 2 ** attempt)))
+
+def cas_backoff(races):
+    """Full-jitter delay after `races` consecutive lost compare-and-set attempts"""
+    return random.uniform(0, min(CAS_MAX_BACKOFF, CAS_BASE_BACKOFF * 2 ** races))
+
+_limiters = {}
+
+def limiter_for(api, scope=None):
+    """Process-wide limiter for an API named in API_LIMITS.
+
+    AWS throttles per account and region, so calls into another fleet target
+    pass that target's name as `scope` and draw from their own bucket.
+    """
+    name = f"{api}@{scope}" if scope else api
+    if name not in _limiters:
+        rate, burst = API_LIMITS[api]
+        _limiters[name] = RateLimiter(name, rate, burst)
+    return _limiters[name]
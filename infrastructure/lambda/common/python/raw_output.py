@@ -0,0 +1,213 @@
+"""Block-compressed storage of full capture output with ranged reads.
+
+Output is cut into BLOCK_SIZE pieces, each compressed as its own gzip member
+and concatenated into one object (still a valid .gz file). A JSON sidecar
+records, per block, its uncompressed offset, compressed offset and length and
+the line number it starts on, so a read at any byte offset or line fetches
+only the blocks it covers with a single ranged GET.
+
+Objects live in RAW_OUTPUT_BUCKET, or under RAW_OUTPUT_DIR as a local
+stand-in when no bucket is configured.
+"""
+import gzip
+import json
+import os
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+
+BLOCK_SIZE = 64 * 1024
+# Largest chunk one read returns
+MAX_READ_BYTES = 256 * 1024
+INDEX_CACHE_SIZE = 64
+
+class S3Store:
+    def __init__(self, bucket, s3=None):
+        import boto3
+        self.bucket = bucket
+        self.s3 = s3 or boto3.client('s3')
+
+    def put(self, key, data, content_type):
+        self.s3.put_object(Bucket=self.bucket, Key=key, Body=data, ContentType=content_type)
+
+    def get(self, key, start=None, end=None):
+        kwargs = {'Bucket': self.bucket, 'Key': key}
+        if start is not None:
+            kwargs['Range'] = f"bytes={start}-{end}"
+        return self.s3.get_object(**kwargs)['Body'].read()
+
+    def stream(self, key):
+        """Chunks of an object (e.g. SSM's uncompressed stdout) without loading it whole"""
+        return self.s3.get_object(Bucket=self.bucket, Key=key)['Body'].iter_chunks(BLOCK_SIZE)
+
+    def delete(self, key):
+        self.s3.delete_object(Bucket=self.bucket, Key=key)
+
+class LocalStore:
+    """Directory stand-in for the raw output bucket"""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def put(self, key, data, content_type):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+
+    def get(self, key, start=None, end=None):
+        with open(self._path(key), 'rb') as f:
+            if start is None:
+                return f.read()
+            f.seek(start)
+            return f.read(end - start + 1)
+
+    def stream(self, key):
+        with open(self._path(key), 'rb') as f:
+            while True:
+                chunk = f.read(BLOCK_SIZE)
+                if not chunk:
+                    return
+                yield chunk
+
+    def delete(self, key):
+        os.remove(self._path(key))
+
+def store_from_env():
+    """Bucket store when RAW_OUTPUT_BUCKET is set, else the local directory stand-in"""
+    if os.environ.get('RAW_OUTPUT_BUCKET'):
+        return S3Store(os.environ['RAW_OUTPUT_BUCKET'])
+    return LocalStore(os.environ.get('RAW_OUTPUT_DIR', '/tmp/raw-output'))
+
+def output_key(snapshot_id, instance_id):
+    return f"outputs/{snapshot_id}/{instance_id}.gz"
+
+def index_key(key):
+    return f"{key}.index.json"
+
+def rechunk(chunks, size=BLOCK_SIZE):
+    """Regroup a byte stream into blocks of exactly `size` bytes (the last may be short)"""
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer.extend(chunk)
+        while len(buffer) >= size:
+            yield bytes(buffer[:size])
+            del buffer[:size]
+    if buffer:
+        yield bytes(buffer)
+
+def write_output(store, key, chunks):
+    """Compress a byte stream block by block into `key` plus its index; returns the index"""
+    compressed = bytearray()
+    blocks = []
+    total_bytes = total_lines = 0
+    last_byte = b''
+    for block in rechunk(chunks):
+        member = gzip.compress(block, mtime=0)
+        blocks.append([total_bytes, len(compressed), len(member), total_lines])
+        compressed.extend(member)
+        total_bytes += len(block)
+        total_lines += block.count(b'\n')
+        last_byte = block[-1:]
+
+    index = {
+        'blockSize': BLOCK_SIZE,
+        'totalBytes': total_bytes,
+        # A final line without a trailing newline still counts
+        'totalLines': total_lines + (1 if last_byte not in (b'', b'\n') else 0),
+        'blocks': blocks
+    }
+    store.put(key, bytes(compressed), 'application/gzip')
+    store.put(index_key(key), json.dumps(index).encode('utf-8'), 'application/json')
+    return index
+
+_index_cache = OrderedDict()
+
+def load_index(store, key):
+    """Index for an output object (immutable once written, so cached)"""
+    if key in _index_cache:
+        _index_cache.move_to_end(key)
+        return _index_cache[key]
+    index = json.loads(store.get(index_key(key)))
+    _index_cache[key] = index
+    if len(_index_cache) > INDEX_CACHE_SIZE:
+        _index_cache.popitem(last=False)
+    return index
+
+def _fetch(store, key, index, first, last):
+    """Decompressed bytes of blocks first..last with one ranged read"""
+    blocks = index['blocks']
+    start = blocks[first][1]
+    end = blocks[last][1] + blocks[last][2] - 1
+    return gzip.decompress(store.get(key, start, end))
+
+def read_range(store, key, offset=None, line=None, max_bytes=MAX_READ_BYTES, max_lines=None):
+    """Read a chunk of whole lines starting at a byte offset or a line number"""
+    index = load_index(store, key)
+    blocks = index['blocks']
+    total = index['totalBytes']
+    max_bytes = max(1, min(max_bytes, MAX_READ_BYTES))
+    offset = None if offset is None else max(0, offset)
+
+    if not blocks or (offset is not None and offset >= total) or (line is not None and line >= index['totalLines']):
+        start = total if offset is None else min(offset, total)
+        return {
+            'offset': start, 'nextOffset': start, 'line': index['totalLines'] if line is None else line,
+            'nextLine': index['totalLines'] if line is None else line,
+            'totalBytes': total, 'totalLines': index['totalLines'], 'eof': True, 'content': ''
+        }
+
+    if line is not None:
+        # The line starts after its line-th newline, which is in the last block
+        # that begins with fewer newlines before it
+        first = max(0, bisect_left([b[3] for b in blocks], line) - 1)
+        data = _fetch(store, key, index, first, first)
+        position, remaining = 0, line - blocks[first][3]
+        while remaining:
+            found = data.find(b'\n', position)
+            if found < 0:
+                first += 1
+                data = _fetch(store, key, index, first, first)
+                position = 0
+                continue
+            position = found + 1
+            remaining -= 1
+        offset = blocks[first][0] + position
+    else:
+        first = bisect_right([b[0] for b in blocks], offset) - 1
+
+    # Blocks needed to cover max_bytes from the offset
+    last = first
+    while last + 1 < len(blocks) and blocks[last + 1][0] < offset + max_bytes:
+        last += 1
+    data = _fetch(store, key, index, first, last)
+    relative = offset - blocks[first][0]
+    if line is None:
+        line = blocks[first][3] + data.count(b'\n', 0, relative)
+
+    chunk = data[relative:relative + max_bytes]
+    if max_lines:
+        cut = -1
+        for _ in range(max_lines):
+            cut = chunk.find(b'\n', cut + 1)
+            if cut < 0:
+                break
+        if cut >= 0:
+            chunk = chunk[:cut + 1]
+    if offset + len(chunk) < total and b'\n' in chunk and not chunk.endswith(b'\n'):
+        # Stop at a line boundary; a single over-long line is returned in pieces
+        chunk = chunk[:chunk.rfind(b'\n') + 1]
+
+    next_offset = offset + len(chunk)
+    return {
+        'offset': offset,
+        'nextOffset': next_offset,
+        'line': line,
+        'nextLine': line + chunk.count(b'\n'),
+        'totalBytes': total,
+        'totalLines': index['totalLines'],
+        'eof': next_offset >= total,
+        'content': chunk.decode('utf-8', errors='replace')
+    }
@@ -0,0 +1,98 @@
+"""Series and bucket keys for the drift rollups table.
+
+Rollup rows are keyed by series ("env#<id>#hour", "facility#<name>#day") and
+bucket ("2077.10.23 14" hourly, "2077.10.23" daily), so a trend window is one
+Query over a known number of sort keys. Bucket keys are prefixes of the
+'%Y.%m.%d %H:%M:%S' timestamps the tables already store.
+
+The drift score over time is the weight of the events open at each point.
+Rows store `openPoints`, the net change of that weight in the bucket (events
+opened minus events resolved), and one level row per scope ("env#<id>#open",
+bucket "-") holds the current weight. The level at the end of a bucket is the
+current level minus the changes of every later bucket.
+"""
+from datetime import datetime, timedelta
+
+HOURLY = 'hour'
+DAILY = 'day'
+
+BUCKET_FORMATS = {HOURLY: '%Y.%m.%d %H', DAILY: '%Y.%m.%d'}
+BUCKET_LENGTHS = {HOURLY: 13, DAILY: 10}
+BUCKET_STEPS = {HOURLY: timedelta(hours=1), DAILY: timedelta(days=1)}
+
+# Hourly rows expire after this; daily rows are kept for long trends
+HOURLY_RETENTION = timedelta(days=14)
+
+# Windows up to this many hours are served from hourly rows, longer ones from daily rows
+MAX_HOURLY_WINDOW = 72
+MAX_DAILY_WINDOW = 365
+
+# Same weights as the drift score in check_drift
+SEVERITY_WEIGHTS = {'CRITICAL': 30, 'WARNING': 10}
+DEFAULT_WEIGHT = 3
+MAX_SCORE = 100
+
+# Additive counters stored on every rollup row; openPoints may be negative
+COUNTERS = ('events', 'critical', 'warning', 'info', 'openPoints', 'snapshots')
+
+# Level rows: current open-event weight per scope
+LEVEL = 'open'
+LEVEL_BUCKET = '-'
+
+def series_key(scope, name, granularity):
+    return f"{scope}#{name}#{granularity}"
+
+def bucket_of(timestamp, granularity):
+    return str(timestamp)[:BUCKET_LENGTHS[granularity]]
+
+def weight(severity):
+    """Drift score points of one open event"""
+    return SEVERITY_WEIGHTS.get(str(severity or 'INFO').upper(), DEFAULT_WEIGHT)
+
+def open_points(event):
+    """Points an event adds to the level while it is unresolved"""
+    return 0 if not event or event.get('resolved') else weight(event.get('severity'))
+
+def drift_deltas(severity):
+    """Counter increments for one newly detected drift event"""
+    severity = str(severity or 'INFO').upper()
+    field = severity.lower() if severity in ('CRITICAL', 'WARNING') else 'info'
+    return {'events': 1, field: 1}
+
+def levels(buckets, rows, current):
+    """Open-event weight at the end of each bucket, walking back from the current level"""
+    result = {}
+    level = current
+    for bucket in reversed(buckets):
+        result[bucket] = level
+        level -= int(rows.get(bucket, {}).get('openPoints', 0))
+    return result
+
+def parse_window(window):
+    """'24h' / '7d' / '90d' -> (granularity, bucket count)"""
+    window = (window or '30d').strip().lower()
+    unit, amount = window[-1], window[:-1]
+    if unit not in ('h', 'd') or not amount.isdigit() or int(amount) < 1:
+        raise ValueError(f"Invalid window '{window}': use e.g. 24h, 7d or 90d")
+    hours = int(amount) * (24 if unit == 'd' else 1)
+    if hours <= MAX_HOURLY_WINDOW:
+        return HOURLY, hours
+    days = -(-hours // 24)
+    if days > MAX_DAILY_WINDOW:
+        raise ValueError(f"Window '{window}' is longer than {MAX_DAILY_WINDOW} days")
+    return DAILY, days
+
+def bucket_range(granularity, count, now=None):
+    """The last `count` bucket keys, oldest first, ending with the current bucket"""
+    now = now or datetime.now()
+    step = BUCKET_STEPS[granularity]
+    return [
+        (now - step * offset).strftime(BUCKET_FORMATS[granularity])
+        for offset in range(count - 1, -1, -1)
+    ]
+
+def expires_at(bucket, granularity):
+    """TTL for a rollup row (None for rows that are kept)"""
+    if granularity != HOURLY:
+        return None
+    return int((datetime.strptime(bucket, BUCKET_FORMATS[HOURLY]) + HOURLY_RETENTION).timestamp())
@@ -0,0 +1,79 @@
+"""Structured diff of two snapshot items: components, system fields and environment variables."""
+
+# Snapshot list fields diffed by component name, with the attributes compared
+COMPONENT_FIELDS = {
+    'packages': ('version',),
+    'services': ('status', 'version'),
+    'drivers': ('version',),
+}
+
+SYSTEM_FIELDS = ('osVersion', 'kernelVersion', 'diskImageHash')
+
+def diff_snapshots(a, b):
+    """Structured diff of two snapshot items"""
+    diff = {
+        'a': snapshot_ref(a),
+        'b': snapshot_ref(b),
+        'crossEnvironment': a['environmentId'] != b['environmentId'],
+        'system': {
+            field: {'from': a.get(field), 'to': b.get(field)}
+            for field in SYSTEM_FIELDS
+            if a.get(field) != b.get(field)
+        },
+        'environmentVariables': diff_mapping(a.get('environmentVariables') or {}, b.get('environmentVariables') or {})
+    }
+
+    for field, attributes in COMPONENT_FIELDS.items():
+        diff[field] = diff_components(a.get(field) or [], b.get(field) or [], attributes)
+
+    diff['summary'] = {
+        section: sum(len(diff[section][kind]) for kind in ('added', 'removed', 'changed'))
+        for section in list(COMPONENT_FIELDS) + ['environmentVariables']
+    }
+    diff['summary']['system'] = len(diff['system'])
+    diff['identical'] = not any(diff['summary'].values())
+    return diff
+
+def snapshot_ref(snapshot):
+    """Identifying fields of a snapshot"""
+    return {
+        'id': snapshot['id'],
+        'environmentId': snapshot['environmentId'],
+        'capturedAt': snapshot['capturedAt']
+    }
+
+def diff_components(a_components, b_components, attributes):
+    """Hash-join two component lists on name"""
+    a_index = {c.get('name'): c for c in a_components}
+    b_index = {c.get('name'): c for c in b_components}
+
+    added = [b_index[name] for name in b_index.keys() - a_index.keys()]
+    removed = [a_index[name] for name in a_index.keys() - b_index.keys()]
+    changed = []
+    for name in a_index.keys() & b_index.keys():
+        before, after = a_index[name], b_index[name]
+        changes = {
+            attr: {'from': before.get(attr), 'to': after.get(attr)}
+            for attr in attributes
+            if before.get(attr) != after.get(attr)
+        }
+        if changes:
+            changed.append({'name': name, 'changes': changes})
+
+    return {
+        'added': sorted(added, key=lambda c: str(c.get('name'))),
+        'removed': sorted(removed, key=lambda c: str(c.get('name'))),
+        'changed': sorted(changed, key=lambda c: str(c['name']))
+    }
+
+def diff_mapping(a, b):
+    """Diff two flat key/value mappings"""
+    return {
+        'added': [{'name': k, 'value': b[k]} for k in sorted(b.keys() - a.keys())],
+        'removed': [{'name': k, 'value': a[k]} for k in sorted(a.keys() - b.keys())],
+        'changed': [
+            {'name': k, 'changes': {'value': {'from': a[k], 'to': b[k]}}}
+            for k in sorted(a.keys() & b.keys())
+            if a[k] != b[k]
+        ]
+    }
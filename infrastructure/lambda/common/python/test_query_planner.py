@@ -0,0 +1,115 @@
+"""Audit feed pages: keyset cursors, index choice and the scan fallback."""
+import pytest
+
+import query_planner
+
+ALL_INDEXES = frozenset(query_planner.INDEXES.values())
+
+def audit_events():
+    events = []
+    for n in range(60):
+        # Runs of up to four events in the same second straddle page boundaries
+        second = n // 4 if n < 40 else n
+        events.append({
+            'id': f"log-{n * 37 % 101:03d}",
+            'timestamp': f"2077.10.23 14:{second // 60:02d}:{second % 60:02d}",
+            'environmentId': f"env-{n % 3}",
+            'actor': 'SYSTEM' if n % 2 else 'Dr. Test',
+            'action': 'SNAPSHOT_CAPTURED',
+            'severity': ('info', 'warning', 'critical')[n % 5 % 3],
+        })
+    return events
+
+class AuditTable:
+    """Evaluates the queries and scans query_planner issues against a list of items"""
+    name = 'test-audit-log-table'
+
+    def __init__(self, items):
+        self.items = items
+
+    def query(self, IndexName, ExpressionAttributeNames, ExpressionAttributeValues, Limit, ExclusiveStartKey=None, **kwargs):
+        assert IndexName in ALL_INDEXES and kwargs['ScanIndexForward'] is False
+        names, values = ExpressionAttributeNames, ExpressionAttributeValues
+        matches = [
+            item for item in self.items
+            if item.get(names['#p']) == values[':p'] and self.matches(item, names, values)
+        ]
+        # DynamoDB orders an index partition by its sort key only
+        matches.sort(key=lambda item: item['timestamp'], reverse=True)
+        start = ExclusiveStartKey or 0
+        page = matches[start:start + Limit]
+        response = {'Items': page}
+        if start + Limit < len(matches):
+            response['LastEvaluatedKey'] = start + Limit
+        return response
+
+    def scan(self, ExpressionAttributeNames=None, ExpressionAttributeValues=None, ExclusiveStartKey=None, **kwargs):
+        names, values = ExpressionAttributeNames or {}, ExpressionAttributeValues or {}
+        return {'Items': [item for item in self.items if self.matches(item, names, values)]}
+
+    @staticmethod
+    def matches(item, names, values):
+        if ':since' in values and item['timestamp'] < values[':since']:
+            return False
+        if ':until' in values and item['timestamp'] > values[':until']:
+            return False
+        return all(
+            item.get(names[name]) == values[f":{name[1:]}"]
+            for name in names if name.startswith('#f')
+        )
+
+def expected(events, **filters):
+    matching = [e for e in events if all(e.get(name) == value for name, value in filters.items())]
+    return sorted(matching, key=query_planner.order_key, reverse=True)
+
+def all_pages(table, filters, limit):
+    items, cursor, pages = [], None, 0
+    while True:
+        page, cursor, _ = query_planner.execute(table, filters, limit, cursor)
+        items.extend(page)
+        pages += 1
+        if cursor is None:
+            return items, pages
+
+@pytest.fixture
+def indexes(monkeypatch):
+    available = set(ALL_INDEXES)
+    monkeypatch.setattr(query_planner, 'active_indexes', lambda table: frozenset(available))
+    return available
+
+@pytest.mark.parametrize('filters', [{}, {'actor': 'SYSTEM'}, {'environmentId': 'env-1', 'severity': 'info'}])
+def test_cursors_walk_every_item_once_in_order(indexes, filters):
+    events = audit_events()
+    items, pages = all_pages(AuditTable(events), filters, 7)
+    assert items == expected(events, **filters)
+    assert pages == -(-len(items) // 7)
+
+def test_scan_fallback_serves_the_same_pages(indexes):
+    events = audit_events()
+    indexed, indexed_cursor, _ = query_planner.execute(AuditTable(events), {'actor': 'SYSTEM'}, 5)
+    indexes.clear()
+    scanned, scanned_cursor, scan_plan = query_planner.execute(AuditTable(events), {'actor': 'SYSTEM'}, 5)
+    assert scan_plan['index'] is None
+    assert (scanned, scanned_cursor) == (indexed, indexed_cursor)
+
+def test_cursor_stays_within_until(indexes):
+    events = audit_events()
+    until = '2077.10.23 14:00:05'
+    items, _ = all_pages(AuditTable(events), {'until': until}, 3)
+    assert items == [e for e in expected(events) if e['timestamp'] <= until]
+
+def test_cursor_is_the_last_key_returned(indexes):
+    page, cursor, _ = query_planner.execute(AuditTable(audit_events()), {}, 4)
+    assert query_planner.decode_cursor(cursor) == query_planner.order_key(page[-1])
+
+def test_invalid_cursor_is_rejected(indexes):
+    with pytest.raises(query_planner.InvalidCursor):
+        query_planner.execute(AuditTable(audit_events()), {}, 4, 'not-a-cursor')
+
+def test_filters_without_an_active_index_become_residual():
+    assert query_planner.plan({'environmentId': 'env-1', 'actor': 'SYSTEM'}, {'SeverityIndex', 'ActorIndex'}) == {
+        'index': 'ActorIndex', 'attribute': 'actor', 'partitions': ['SYSTEM'],
+        'residual': {'environmentId': 'env-1'}
+    }
+    assert query_planner.plan({'action': 'DRIFT_DETECTED'}, {'SeverityIndex'})['partitions'] == list(query_planner.SEVERITIES)
+    assert query_planner.plan({}, set())['index'] is None
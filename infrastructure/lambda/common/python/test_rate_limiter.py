@@ -0,0 +1,114 @@
+"""AIMD token bucket: throttles halve the refill rate, quiet time wins it back."""
+import pytest
+from botocore.exceptions import ClientError
+
+import rate_limiter
+
+class Clock:
+    """Stands in for the time module; sleep advances the clock"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = 0.0
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+        self.slept += seconds
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limiter, 'time', clock)
+    monkeypatch.setattr(rate_limiter, 'COUNTERS_TABLE', None)
+    return clock
+
+@pytest.fixture
+def limiter(clock):
+    return rate_limiter.RateLimiter('ssm:SendCommand', rate=10, burst=20)
+
+def state(limiter):
+    return limiter.store.load()
+
+def throttled(code='ThrottlingException'):
+    return ClientError({'Error': {'Code': code}}, 'SendCommand')
+
+def test_throttle_halves_the_rate_and_drains_the_bucket(limiter):
+    limiter.acquire()
+    limiter.record_throttle()
+    assert state(limiter)['rate'] == 5.0
+    assert state(limiter)['tokens'] == 0.0
+    limiter.record_throttle()
+    assert state(limiter)['rate'] == 2.5
+
+def test_rate_never_drops_below_the_floor(limiter):
+    for _ in range(10):
+        limiter.record_throttle()
+    assert state(limiter)['rate'] == limiter.min_rate == 0.5
+
+def test_rate_creeps_back_while_calls_succeed(limiter, clock):
+    limiter.record_throttle()
+    clock.now += 2
+    # Additive increase of max_rate / 20 per second since the throttle
+    assert limiter._refill(state(limiter), clock.now) == (12.0, 6.0)
+    clock.now += 60
+    assert limiter._refill(state(limiter), clock.now) == (20.0, 10.0)
+
+def test_acquire_spends_the_burst_then_waits_for_the_rate(limiter, clock, monkeypatch):
+    monkeypatch.setattr(rate_limiter.random, 'uniform', lambda low, high: low)
+    for _ in range(20):
+        limiter.acquire()
+    assert clock.slept == 0
+    limiter.acquire()
+    assert clock.slept == pytest.approx(0.1)
+
+def test_save_with_a_stale_revision_loses(limiter):
+    limiter.acquire()
+    stale = state(limiter)['rev']
+    limiter.acquire()
+    assert not limiter.store.save(1.0, 10.0, 0, stale)
+
+def test_call_slows_down_and_retries_throttled_requests(limiter, clock):
+    responses = [throttled(), throttled('RequestLimitExceeded'), {'Command': {'CommandId': 'cmd-1'}}]
+
+    def send_command():
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    assert limiter.call(send_command) == {'Command': {'CommandId': 'cmd-1'}}
+    assert state(limiter)['rate'] < limiter.max_rate
+
+def test_call_raises_other_errors_at_once(limiter):
+    calls = []
+
+    def send_command():
+        calls.append(1)
+        raise throttled('InvalidInstanceId')
+
+    with pytest.raises(ClientError):
+        limiter.call(send_command)
+    assert len(calls) == 1
+    assert state(limiter)['rate'] == limiter.max_rate
+
+def test_call_gives_up_after_max_attempts(limiter):
+    def send_command():
+        raise throttled()
+
+    with pytest.raises(ClientError):
+        limiter.call(send_command)
+    # Halved on each of the four retried attempts, less what the backoff won back
+    assert state(limiter)['rate'] < limiter.max_rate / 4
+
+def test_wait_beyond_max_wait_times_out(clock):
+    limiter = rate_limiter.RateLimiter('ssm:SendCommand', rate=1, burst=1, max_wait=2.0)
+    limiter.acquire()
+    limiter.record_throttle()
+    with pytest.raises(rate_limiter.RateLimitTimeout):
+        limiter.acquire()
@@ -0,0 +1,79 @@
+"""Ranged reads of block-compressed capture output by byte offset and line."""
+import gzip
+from collections import OrderedDict
+
+import pytest
+
+import raw_output
+
+KEY = raw_output.output_key('snap-1', 'i-0abc')
+# About 380 KB: six blocks, with lines straddling the block boundaries
+LINES = [f"{n:05d} {'pip package listing ' * (n % 4)}".encode() + b'\n' for n in range(12000)]
+DATA = b''.join(LINES)
+
+class CountingStore(raw_output.LocalStore):
+    def __init__(self, directory):
+        super().__init__(directory)
+        self.ranged_gets = 0
+
+    def get(self, key, start=None, end=None):
+        if start is not None:
+            self.ranged_gets += 1
+        return super().get(key, start, end)
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(raw_output, '_index_cache', OrderedDict())
+    store = CountingStore(str(tmp_path))
+    raw_output.write_output(store, KEY, [DATA[i:i + 10000] for i in range(0, len(DATA), 10000)])
+    return store
+
+def test_object_is_one_gzip_file_with_an_index(store):
+    index = raw_output.load_index(store, KEY)
+    assert gzip.decompress(store.get(KEY)) == DATA
+    assert index['totalBytes'] == len(DATA)
+    assert index['totalLines'] == len(LINES)
+    assert len(index['blocks']) == -(-len(DATA) // raw_output.BLOCK_SIZE)
+
+@pytest.mark.parametrize('line', [0, 1, 2047, 2048, 5000, 11999])
+def test_read_from_a_line(store, line):
+    chunk = raw_output.read_range(store, KEY, line=line, max_lines=3)
+    assert chunk['content'].encode() == b''.join(LINES[line:line + 3])
+    assert chunk['offset'] == len(b''.join(LINES[:line]))
+    assert chunk['nextLine'] == min(line + 3, len(LINES))
+
+def test_offset_reads_resume_on_line_boundaries(store):
+    content, offset, line, reads = b'', 0, 0, 0
+    while True:
+        chunk = raw_output.read_range(store, KEY, offset=offset, max_bytes=100000)
+        reads += 1
+        assert chunk['line'] == line
+        assert chunk['content'].endswith('\n')
+        content += chunk['content'].encode()
+        offset, line = chunk['nextOffset'], chunk['nextLine']
+        if chunk['eof']:
+            break
+    assert content == DATA
+    assert line == len(LINES)
+    # One ranged GET per read, covering only the blocks it needs
+    assert store.ranged_gets == reads
+
+def test_offset_inside_a_line_counts_the_lines_before_it(store):
+    offset = len(b''.join(LINES[:3000])) + 3
+    chunk = raw_output.read_range(store, KEY, offset=offset, max_lines=1)
+    assert chunk['line'] == 3000
+    assert chunk['content'].encode() == LINES[3000][3:]
+
+def test_read_past_the_end_is_empty(store):
+    assert raw_output.read_range(store, KEY, offset=len(DATA))['content'] == ''
+    past = raw_output.read_range(store, KEY, line=len(LINES))
+    assert past['eof'] and past['content'] == ''
+
+def test_final_line_without_newline_is_counted(tmp_path, monkeypatch):
+    monkeypatch.setattr(raw_output, '_index_cache', OrderedDict())
+    store = raw_output.LocalStore(str(tmp_path))
+    raw_output.write_output(store, KEY, [b'first\nsecond'])
+    assert raw_output.load_index(store, KEY)['totalLines'] == 2
+    chunk = raw_output.read_range(store, KEY, line=1)
+    assert chunk['content'] == 'second'
+    assert chunk['eof']
@@ -0,0 +1,80 @@
+"""Per-table change counters and ETag helpers for conditional GETs.
+
+Writers bump a named counter in the counters table whenever they change data
+a read endpoint serves; readers derive an ETag from the counters alone, so a
+matching If-None-Match can be answered with a 304 before any scan or query.
+"""
+import hashlib
+import os
+import boto3
+
+dynamodb = boto3.resource('dynamodb')
+counters_table = dynamodb.Table(os.environ['COUNTERS_TABLE'])
+
+ENVIRONMENTS = 'environments'
+AUDIT_LOG = 'audit-log'
+
+def drift_counter(environment_id):
+    """Counter covering an environment's snapshots and drift events"""
+    return f"drift#{environment_id}"
+
+def trend_counter(environment_id):
+    """Counter covering an environment's drift rollup rows"""
+    return f"trend#{environment_id}"
+
+def bump_version(*names):
+    """Increment change counters; failures only cost a cache miss"""
+    for name in names:
+        try:
+            counters_table.update_item(
+                Key={'name': name},
+                UpdateExpression='ADD version :one',
+                ExpressionAttributeValues={':one': 1}
+            )
+        except Exception as e:
+            print(f"Error bumping version {name}: {e}")
+
+def get_versions(*names):
+    """Read current counter values (0 for counters never bumped)"""
+    request = {counters_table.name: {
+        'Keys': [{'name': name} for name in set(names)],
+        'ProjectionExpression': '#n, version',
+        'ExpressionAttributeNames': {'#n': 'name'}
+    }}
+    versions = {}
+    while request:
+        response = dynamodb.batch_get_item(RequestItems=request)
+        for item in response['Responses'].get(counters_table.name, []):
+            versions[item['name']] = int(item.get('version', 0))
+        request = response.get('UnprocessedKeys')
+    return [versions.get(name, 0) for name in names]
+
+def compute_etag(*parts):
+    """Weak ETag over counter values and any request parameters"""
+    digest = hashlib.sha1('|'.join(str(part) for part in parts).encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+def is_not_modified(event, etag):
+    """True when the request's If-None-Match already names this ETag"""
+    headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+    candidates = [tag.strip() for tag in headers.get('if-none-match', '').split(',')]
+    return etag in candidates or '*' in candidates
+
+def etag_headers(etag, extra=None):
+    """Response headers carrying an ETag readable from the browser"""
+    headers = {
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Expose-Headers': 'ETag',
+        'Cache-Control': 'no-cache',
+        'ETag': etag
+    }
+    headers.update(extra or {})
+    return headers
+
+def not_modified_response(etag):
+    """Empty 304 response"""
+    return {
+        'statusCode': 304,
+        'headers': etag_headers(etag),
+        'body': ''
+    }
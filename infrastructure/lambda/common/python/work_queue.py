@@ -0,0 +1,149 @@
+"""Priority-laned work queue: SQS in the stack, an in-process stand-in locally.
+
+Each lane is its own queue. Workers always take from the first lane in LANES
+that has messages, so a backlog in the standard lane never delays priority
+work. A message that fails MAX_RECEIVES times is moved to the dead-letter
+queue (an SQS redrive policy on the stack; a list on the local queue).
+
+WORK_QUEUE_URLS is a JSON object configured on the stack:
+
+    {"priority": "https://sqs.../CapturePriorityQueue",
+     "standard": "https://sqs.../CaptureQueue"}
+
+Without it, one LocalQueue per process stands in.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+
+import boto3
+
+PRIORITY = 'priority'
+STANDARD = 'standard'
+LANES = (PRIORITY, STANDARD)
+
+# Must match maxReceiveCount of the stack's redrive policy
+MAX_RECEIVES = 3
+# SQS returns at most 10 messages per ReceiveMessage
+MAX_RECEIVE_BATCH = 10
+
+class SqsQueue:
+    def __init__(self, urls, sqs=None):
+        self.urls = urls
+        self.sqs = sqs or boto3.client('sqs')
+
+    def send(self, lane, body):
+        self.sqs.send_message(QueueUrl=self.urls[lane], MessageBody=json.dumps(body))
+
+    def receive(self, lane, max_messages):
+        response = self.sqs.receive_message(
+            QueueUrl=self.urls[lane],
+            MaxNumberOfMessages=max(1, min(max_messages, MAX_RECEIVE_BATCH)),
+            AttributeNames=['ApproximateReceiveCount', 'SentTimestamp']
+        )
+        return [
+            {
+                'lane': lane,
+                'body': json.loads(message['Body']),
+                'handle': message['ReceiptHandle'],
+                'receiveCount': int(message['Attributes']['ApproximateReceiveCount']),
+                'enqueuedAt': int(message['Attributes']['SentTimestamp']) / 1000
+            }
+            for message in response.get('Messages', [])
+        ]
+
+    def delete(self, message):
+        self.sqs.delete_message(QueueUrl=self.urls[message['lane']], ReceiptHandle=message['handle'])
+
+    def release(self, message):
+        """Make a failed message visible again; the redrive policy dead-letters it after MAX_RECEIVES"""
+        self.sqs.change_message_visibility(
+            QueueUrl=self.urls[message['lane']],
+            ReceiptHandle=message['handle'],
+            VisibilityTimeout=0
+        )
+
+    def depth(self, lane):
+        """(waiting, in flight) message counts, approximate as SQS reports them"""
+        attributes = self.sqs.get_queue_attributes(
+            QueueUrl=self.urls[lane],
+            AttributeNames=['ApproximateNumberOfMessages', 'ApproximateNumberOfMessagesNotVisible']
+        )['Attributes']
+        return int(attributes['ApproximateNumberOfMessages']), int(attributes['ApproximateNumberOfMessagesNotVisible'])
+
+class LocalQueue:
+    """In-process stand-in for the SQS lanes"""
+
+    def __init__(self):
+        self.lanes = {lane: deque() for lane in LANES}
+        self.in_flight = {}
+        self.dead_letters = []
+        self.lock = threading.Lock()
+
+    def send(self, lane, body):
+        with self.lock:
+            self.lanes[lane].append({'lane': lane, 'body': body, 'receiveCount': 0, 'enqueuedAt': time.time()})
+
+    def receive(self, lane, max_messages):
+        received = []
+        with self.lock:
+            while self.lanes[lane] and len(received) < max_messages:
+                message = self.lanes[lane].popleft()
+                message.update(handle=str(uuid.uuid4()), receiveCount=message['receiveCount'] + 1)
+                self.in_flight[message['handle']] = message
+                received.append(message)
+        return received
+
+    def delete(self, message):
+        with self.lock:
+            self.in_flight.pop(message['handle'], None)
+
+    def release(self, message):
+        with self.lock:
+            if self.in_flight.pop(message['handle'], None) is None:
+                return
+            if message['receiveCount'] >= MAX_RECEIVES:
+                self.dead_letters.append(message)
+            else:
+                self.lanes[message['lane']].appendleft(message)
+
+    def depth(self, lane):
+        with self.lock:
+            return len(self.lanes[lane]), sum(1 for m in self.in_flight.values() if m['lane'] == lane)
+
+_local_queue = LocalQueue()
+
+def queue_from_env():
+    """SQS lanes when WORK_QUEUE_URLS is set, else this process's local queue"""
+    if os.environ.get('WORK_QUEUE_URLS'):
+        return SqsQueue(json.loads(os.environ['WORK_QUEUE_URLS']))
+    return _local_queue
+
+def receive_next(queue, max_messages):
+    """Up to max_messages from the highest-priority lane that has any"""
+    for lane in LANES:
+        messages = queue.receive(lane, max_messages)
+        if messages:
+            return messages
+    return []
+
+def emit_metrics(namespace, dimensions, **values):
+    """Log CloudWatch metrics in embedded metric format (milliseconds for *WaitTime, else counts)"""
+    print(json.dumps({
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': namespace,
+                'Dimensions': [list(dimensions)],
+                'Metrics': [
+                    {'Name': name, 'Unit': 'Milliseconds' if name.endswith('WaitTime') else 'Count'}
+                    for name in values
+                ]
+            }]
+        },
+        **dimensions,
+        **values
+    }))
@@ -0,0 +1,333 @@
+import json
+import os
+import time
+import boto3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from rate_limiter import NO_RETRY_CONFIG, limiter_for
+from versioning import AUDIT_LOG, ENVIRONMENTS, bump_version, drift_counter
+
+dynamodb = boto3.resource('dynamodb')
+cloudformation = boto3.client('cloudformation', config=NO_RETRY_CONFIG)
+
+environments_table = dynamodb.Table(os.environ['ENVIRONMENTS_TABLE'])
+drift_events_table = dynamodb.Table(os.environ['DRIFT_EVENTS_TABLE'])
+audit_log_table = dynamodb.Table(os.environ['AUDIT_LOG_TABLE'])
+
+MAX_WORKERS = 16
+POLL_INITIAL_DELAY = 2.0
+POLL_MAX_DELAY = 15.0
+# Stop polling with this much Lambda time left; unfinished detections are resumed next run
+TIME_MARGIN_MS = 30000
+
+SEVERITY_BY_STATUS = {
+    'DELETED': 'CRITICAL',
+    'MODIFIED': 'WARNING',
+}
+
+def handler(event, context):
+    """Detect CloudFormation drift for many environment stacks concurrently"""
+    try:
+        event = event or {}
+        environments = select_environments(event.get('environmentIds'), event.get('facility'))
+
+        # Resume detections a previous run left in progress instead of restarting them
+        detections = {}
+        to_start = []
+        for env in environments:
+            if env.get('stackDriftDetectionId') and env.get('stackDriftStatus') == 'DETECTION_IN_PROGRESS':
+                detections[env['stackDriftDetectionId']] = env
+            else:
+                to_start.append(env)
+
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            started = list(executor.map(start_detection, to_start))
+        errors = []
+        for env, (detection_id, error) in zip(to_start, started):
+            if detection_id:
+                detections[detection_id] = env
+            else:
+                errors.append({'environmentId': env['id'], 'stackName': env['cloudformationStackName'], 'error': error})
+
+        statuses = poll_detections(list(detections), context)
+
+        finished = [
+            (detections[detection_id], status)
+            for detection_id, status in statuses.items()
+            if status['DetectionStatus'] != 'DETECTION_IN_PROGRESS'
+        ]
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            fetched = list(executor.map(
+                lambda item: get_resource_drifts(item[0], item[1]), finished
+            ))
+
+        # A stack whose drifts could not be read keeps its detection and is retried next run
+        recorded, resource_drifts = [], []
+        for (env, status), (drifts, error) in zip(finished, fetched):
+            if error:
+                errors.append({'environmentId': env['id'], 'stackName': env['cloudformationStackName'], 'error': error})
+            else:
+                recorded.append((env, status))
+                resource_drifts.append(drifts)
+
+        drifted, resolved = record_results(recorded, resource_drifts)
+        pending = [
+            {'environmentId': detections[d]['id'], 'detectionId': d}
+            for d, status in statuses.items()
+            if status['DetectionStatus'] == 'DETECTION_IN_PROGRESS'
+        ]
+
+        return {
+            'statusCode': 200,
+            'headers': {'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({
+                'stacksChecked': len(recorded),
+                'stacksDrifted': drifted,
+                'resourceDrifts': sum(len(drifts) for drifts in resource_drifts),
+                'resourceDriftsResolved': resolved,
+                'pending': pending,
+                'errors': errors
+            })
+        }
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return {
+            'statusCode': 500,
+            'headers': {'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({
+                'error': 'VAULT-TEC SYSTEMS ERROR: Stack drift detection failed',
+                'details': str(e)
+            })
+        }
+
+def select_environments(environment_ids=None, facility=None):
+    """Environments with a CloudFormation stack, optionally narrowed by id or facility"""
+    if environment_ids:
+        # BatchGetItem takes at most 100 distinct keys per call
+        keys = [{'id': env_id} for env_id in dict.fromkeys(environment_ids)]
+        items = []
+        for start in range(0, len(keys), 100):
+            request = {environments_table.name: {'Keys': keys[start:start + 100]}}
+            while request:
+                response = dynamodb.batch_get_item(RequestItems=request)
+                items.extend(response['Responses'].get(environments_table.name, []))
+                request = response.get('UnprocessedKeys')
+    else:
+        items = []
+        kwargs = {}
+        while True:
+            response = environments_table.scan(**kwargs)
+            items.extend(response.get('Items', []))
+            if 'LastEvaluatedKey' not in response:
+                break
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    return [
+        env for env in items
+        if env.get('cloudformationStackName')
+        and (not facility or env.get('facility') == facility)
+        and not str(env.get('cloudformationStackStatus', '')).startswith('DELETE')
+    ]
+
+def start_detection(environment):
+    """Start drift detection for one stack and record its detection id"""
+    stack_name = environment['cloudformationStackName']
+    try:
+        response = limiter_for('cloudformation:DetectStackDrift').call(
+            cloudformation.detect_stack_drift,
+            StackName=stack_name
+        )
+    except Exception as e:
+        print(f"Error starting drift detection for {stack_name}: {e}")
+        return None, str(e)
+
+    detection_id = response['StackDriftDetectionId']
+    environments_table.update_item(
+        Key={'id': environment['id']},
+        UpdateExpression='SET stackDriftDetectionId = :detection, stackDriftStatus = :status',
+        ExpressionAttributeValues={':detection': detection_id, ':status': 'DETECTION_IN_PROGRESS'}
+    )
+    return detection_id, None
+
+def poll_detections(detection_ids, context):
+    """One poller for every outstanding detection; returns the last status of each"""
+    statuses = {}
+    pending = set(detection_ids)
+    delay = POLL_INITIAL_DELAY
+
+    def describe(detection_id):
+        try:
+            return detection_id, limiter_for('cloudformation:DescribeStackDriftDetectionStatus').call(
+                cloudformation.describe_stack_drift_detection_status,
+                StackDriftDetectionId=detection_id
+            )
+        except Exception as e:
+            # Expired or unknown detection ids are reported as failed, not retried
+            print(f"Error polling drift detection {detection_id}: {e}")
+            return detection_id, {
+                'StackDriftDetectionId': detection_id,
+                'DetectionStatus': 'DETECTION_FAILED',
+                'DetectionStatusReason': str(e)
+            }
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        while pending:
+            for detection_id, status in executor.map(describe, sorted(pending)):
+                statuses[detection_id] = status
+                if status['DetectionStatus'] != 'DETECTION_IN_PROGRESS':
+                    pending.discard(detection_id)
+            if not pending:
+                break
+            if context and context.get_remaining_time_in_millis() < TIME_MARGIN_MS + delay * 1000:
+                break
+            time.sleep(delay)
+            delay = min(POLL_MAX_DELAY, delay * 1.5)
+
+    return statuses
+
+def get_resource_drifts(environment, status):
+    """Modified or deleted resources for a completed detection; returns (drifts, error)"""
+    if status.get('StackDriftStatus') != 'DRIFTED':
+        return [], None
+    drifts = []
+    kwargs = {
+        'StackName': environment['cloudformationStackName'],
+        'StackResourceDriftStatusFilters': ['MODIFIED', 'DELETED']
+    }
+    try:
+        while True:
+            response = limiter_for('cloudformation:DescribeStackResourceDrifts').call(
+                cloudformation.describe_stack_resource_drifts, **kwargs
+            )
+            drifts.extend(response.get('StackResourceDrifts', []))
+            if not response.get('NextToken'):
+                return drifts, None
+            kwargs['NextToken'] = response['NextToken']
+    except Exception as e:
+        print(f"Error reading resource drifts for {environment['cloudformationStackName']}: {e}")
+        return [], str(e)
+
+def get_open_stack_drift(environment_id):
+    """Unresolved CloudFormation drift events of one environment, by parameter"""
+    events = {}
+    kwargs = {
+        'KeyConditionExpression': 'environmentId = :env_id',
+        'FilterExpression': '#source = :source AND (attribute_not_exists(resolved) OR resolved = :false)',
+        'ExpressionAttributeNames': {'#source': 'source'},
+        'ExpressionAttributeValues': {':env_id': environment_id, ':source': 'cloudformation', ':false': False}
+    }
+    while True:
+        response = drift_events_table.query(**kwargs)
+        for event in response.get('Items', []):
+            events[event['parameter']] = event
+        if 'LastEvaluatedKey' not in response:
+            return events
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def drift_fields(drift):
+    """Event fields describing one resource drift"""
+    differences = drift.get('PropertyDifferences', [])
+    return {
+        'severity': SEVERITY_BY_STATUS.get(drift['StackResourceDriftStatus'], 'INFO'),
+        'expectedValue': '; '.join(f"{d['PropertyPath']}={d.get('ExpectedValue')}" for d in differences)
+                         or 'present',
+        'actualValue': '; '.join(f"{d['PropertyPath']}={d.get('ActualValue')}" for d in differences)
+                       or drift['StackResourceDriftStatus'].lower(),
+        'resourceType': drift.get('ResourceType'),
+        'physicalResourceId': drift.get('PhysicalResourceId'),
+    }
+
+def record_results(finished, resource_drifts):
+    """Merge resource drifts into DriftEventsTable and update stack drift state.
+
+    A drifted resource has at most one open event per environment: later
+    detections update it in place, and it is resolved once the resource is
+    back in sync, so persistent drift is counted once. Returns (stacks with
+    new drift, events resolved).
+    """
+    timestamp = datetime.now().strftime('%Y.%m.%d %H:%M:%S')
+    drifted = 0
+    resolved = 0
+
+    with drift_events_table.batch_writer() as drift_writer, audit_log_table.batch_writer() as audit_writer:
+        for (environment, status), drifts in zip(finished, resource_drifts):
+            environment_id = environment['id']
+            detection_id = status['StackDriftDetectionId']
+            stack_status = status.get('StackDriftStatus') or status['DetectionStatus']
+
+            environments_table.update_item(
+                Key={'id': environment_id},
+                UpdateExpression='SET stackDriftStatus = :status, stackDriftCheckedAt = :checked, '
+                                 'driftedStackResourceCount = :count',
+                ExpressionAttributeValues={
+                    ':status': stack_status,
+                    ':checked': timestamp,
+                    ':count': int(status.get('DriftedStackResourceCount', 0))
+                }
+            )
+
+            # A failed detection says nothing about which resources are back in sync
+            if status['DetectionStatus'] != 'DETECTION_COMPLETE':
+                continue
+
+            open_events = get_open_stack_drift(environment_id)
+            new_drifts = 0
+            for drift in drifts:
+                logical_id = drift['LogicalResourceId']
+                parameter = f"cloudformation.{logical_id}"
+                fields = drift_fields(drift)
+                existing = open_events.pop(parameter, None)
+                if existing:
+                    update_drift_event(existing, {**fields, 'detectionId': detection_id, 'lastSeenAt': timestamp})
+                    continue
+                new_drifts += 1
+                drift_writer.put_item(Item={
+                    'id': f"drift-cfn-{environment_id}-{detection_id[:8]}-{logical_id}",
+                    'environmentId': environment_id,
+                    # Resource id suffix keeps one event per resource under the shared timestamp
+                    'detectedAt': f"{timestamp}#{logical_id}",
+                    'parameter': parameter,
+                    'category': 'infrastructure',
+                    'source': 'cloudformation',
+                    'stackName': environment['cloudformationStackName'],
+                    'detectionId': detection_id,
+                    'lastSeenAt': timestamp,
+                    'resolved': False,
+                    **fields
+                })
+
+            for event in open_events.values():
+                update_drift_event(event, {'resolved': True, 'resolvedAt': timestamp, 'resolvedBy': detection_id})
+                resolved += 1
+
+            if not new_drifts:
+                continue
+            drifted += 1
+
+            audit_writer.put_item(Item={
+                'id': f"log-{int(time.time() * 1000)}-{environment_id}",
+                'timestamp': timestamp,
+                'actor': 'SYSTEM',
+                'environmentId': environment_id,
+                'action': 'STACK_DRIFT_DETECTED',
+                'details': f"Stack {environment['cloudformationStackName']} drifted: {new_drifts} new resources modified or deleted "
+                           f"({len(drifts)} drifted in total)",
+                'severity': 'warning'
+            })
+
+    bump_version(ENVIRONMENTS, *[drift_counter(env['id']) for env, _ in finished])
+    if drifted:
+        bump_version(AUDIT_LOG)
+    return drifted, resolved
+
+def update_drift_event(event, fields):
+    """Set fields on an existing drift event"""
+    names = {f"#f{n}": name for n, name in enumerate(fields)}
+    drift_events_table.update_item(
+        Key={'environmentId': event['environmentId'], 'detectedAt': event['detectedAt']},
+        UpdateExpression='SET ' + ', '.join(f"#f{n} = :f{n}" for n in range(len(fields))),
+        ExpressionAttributeNames=names,
+        ExpressionAttributeValues={f":f{n}": value for n, value in enumerate(fields.values())}
+    )
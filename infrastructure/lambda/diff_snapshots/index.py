@@ -0,0 +1,89 @@
+import json
+import os
+import boto3
+from functools import lru_cache
+
+from snapshot_diff import diff_snapshots
+
+dynamodb = boto3.resource('dynamodb')
+snapshots_table = dynamodb.Table(os.environ['SNAPSHOTS_TABLE'])
+
+# Snapshots are immutable, so a diff for a given id pair never goes stale
+DIFF_CACHE_SIZE = int(os.environ.get('DIFF_CACHE_SIZE', '256'))
+
+class SnapshotNotFound(Exception):
+    pass
+
+def handler(event, context):
+    """Diff two snapshots, from the same or different environments"""
+    try:
+        params = event.get('queryStringParameters', {}) or {}
+        snapshot_a = params.get('a')
+        snapshot_b = params.get('b')
+
+        if not snapshot_a or not snapshot_b:
+            return {
+                'statusCode': 400,
+                'headers': {'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Query parameters a and b (snapshot ids) are required'})
+            }
+
+        try:
+            diff = cached_diff(snapshot_a, snapshot_b)
+        except SnapshotNotFound as e:
+            return {
+                'statusCode': 404,
+                'headers': {'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': f"Snapshot not found: {e}"})
+            }
+
+        return {
+            'statusCode': 200,
+            'headers': {'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps(diff, default=str)
+        }
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return {
+            'statusCode': 500,
+            'headers': {'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({
+                'error': 'VAULT-TEC SYSTEMS ERROR: Snapshot diff failed',
+                'details': str(e)
+            })
+        }
+
+@lru_cache(maxsize=DIFF_CACHE_SIZE)
+def cached_diff(snapshot_a_id, snapshot_b_id):
+    """Memoized diff keyed by the (a, b) snapshot id pair"""
+    snapshots = get_snapshots([snapshot_a_id, snapshot_b_id])
+    return diff_snapshots(snapshots[snapshot_a_id], snapshots[snapshot_b_id])
+
+def get_snapshots(snapshot_ids):
+    """Resolve snapshot ids via SnapshotIdIndex, then batch-read the full items"""
+    keys = {}
+    for snapshot_id in set(snapshot_ids):
+        response = snapshots_table.query(
+            IndexName='SnapshotIdIndex',
+            KeyConditionExpression='id = :id',
+            ExpressionAttributeValues={':id': snapshot_id},
+            Limit=1
+        )
+        if not response['Items']:
+            raise SnapshotNotFound(snapshot_id)
+        item = response['Items'][0]
+        keys[snapshot_id] = {'environmentId': item['environmentId'], 'capturedAt': item['capturedAt']}
+
+    request = {snapshots_table.name: {'Keys': list(keys.values())}}
+    items = []
+    while request:
+        response = dynamodb.batch_get_item(RequestItems=request)
+        items.extend(response['Responses'].get(snapshots_table.name, []))
+        request = response.get('UnprocessedKeys')
+
+    by_id = {item['id']: item for item in items}
+    for snapshot_id in snapshot_ids:
+        if snapshot_id not in by_id:
+            raise SnapshotNotFound(snapshot_id)
+    return by_id
@@ -0,0 +1,336 @@
+"""Streaming export of snapshots and audit history to partitioned NDJSON.gz.
+
+Each table is read with a parallel segmented scan. Every segment is a
+generator pipeline (scan pages -> flatten -> partitioned writers), so memory
+use is bounded by one scan page plus a fixed number of open part files,
+whatever the table size.
+
+Output layout (local directory or S3 prefix):
+
+    <dataset>/month=YYYY-MM/part-<segment>-<seq>.ndjson.gz
+
+Datasets: snapshots, snapshot_packages, snapshot_services, snapshot_drivers,
+audit_events.
+
+Audit events past the hot horizon live in the audit archive, not the table.
+Given an archive, the day files its catalogs list for the requested range are
+streamed into audit_events as well, one file at a time, spread over
+`segments` writers numbered after the table's segments. Events an interrupted
+archive run left in both tiers are exported once.
+"""
+import argparse
+import gzip
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+DEFAULT_SEGMENTS = 8
+ROWS_PER_PART = 100000
+# Open part files per segment; least recently used are closed beyond this
+MAX_OPEN_PARTS = 32
+
+class ExportEncoder(json.JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, Decimal):
+            return int(obj) if obj == obj.to_integral_value() else float(obj)
+        return super(ExportEncoder, self).default(obj)
+
+class LocalSink:
+    """Writes part files under a local directory (S3 stand-in)"""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def open(self, key):
+        path = os.path.join(self.directory, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return gzip.open(path, 'wt', encoding='utf-8'), lambda: None
+
+class S3Sink:
+    """Spools each part file in /tmp and uploads it when closed"""
+
+    def __init__(self, bucket, prefix=''):
+        import boto3
+        self.s3 = boto3.client('s3')
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+
+    def open(self, key):
+        handle, path = tempfile.mkstemp(suffix='.ndjson.gz')
+        os.close(handle)
+        s3_key = f"{self.prefix}/{key}" if self.prefix else key
+
+        def upload():
+            self.s3.upload_file(path, self.bucket, s3_key)
+            os.remove(path)
+
+        return gzip.open(path, 'wt', encoding='utf-8'), upload
+
+class PartitionedWriter:
+    """Routes rows to time-partitioned part files, rolling them by row count"""
+
+    def __init__(self, sink, segment):
+        self.sink = sink
+        self.segment = segment
+        self.open_parts = OrderedDict()
+        self.sequence = {}
+        self.rows = 0
+        self.files = 0
+
+    def write(self, dataset, month, row):
+        key = (dataset, month)
+        part = self.open_parts.get(key)
+        if part is None:
+            part = self._open(key)
+        else:
+            self.open_parts.move_to_end(key)
+
+        part['file'].write(json.dumps(row, cls=ExportEncoder, separators=(',', ':')))
+        part['file'].write('\n')
+        part['rows'] += 1
+        self.rows += 1
+        if part['rows'] >= ROWS_PER_PART:
+            self._close(key)
+
+    def _open(self, key):
+        while len(self.open_parts) >= MAX_OPEN_PARTS:
+            self._close(next(iter(self.open_parts)))
+        dataset, month = key
+        seq = self.sequence.get(key, 0)
+        self.sequence[key] = seq + 1
+        file, on_close = self.sink.open(f"{dataset}/month={month}/part-{self.segment:03d}-{seq:04d}.ndjson.gz")
+        part = {'file': file, 'on_close': on_close, 'rows': 0}
+        self.open_parts[key] = part
+        self.files += 1
+        return part
+
+    def _close(self, key):
+        part = self.open_parts.pop(key)
+        part['file'].close()
+        part['on_close']()
+
+    def close(self):
+        for key in list(self.open_parts):
+            self._close(key)
+
+def partition_month(timestamp):
+    """'2077.10.23 14:32:01' -> '2077-10'"""
+    return (timestamp or 'unknown')[:7].replace('.', '-')
+
+def scan_segment(table, segment, total_segments, time_attribute, start=None, end=None):
+    """Yield items from one segment of a parallel scan, a page at a time"""
+    kwargs = {'Segment': segment, 'TotalSegments': total_segments}
+    conditions, values = [], {}
+    if start:
+        conditions.append('#t >= :start')
+        values[':start'] = start
+    if end:
+        conditions.append('#t <= :end')
+        values[':end'] = end
+    if conditions:
+        kwargs['FilterExpression'] = ' AND '.join(conditions)
+        kwargs['ExpressionAttributeNames'] = {'#t': time_attribute}
+        kwargs['ExpressionAttributeValues'] = values
+    while True:
+        response = table.scan(**kwargs)
+        yield from response.get('Items', [])
+        if 'LastEvaluatedKey' not in response:
+            return
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def flatten_snapshots(items):
+    """Yield (dataset, month, row) with component lists split into their own datasets"""
+    for item in items:
+        month = partition_month(item.get('capturedAt'))
+        keys = {
+            'snapshotId': item.get('id'),
+            'environmentId': item.get('environmentId'),
+            'capturedAt': item.get('capturedAt')
+        }
+        row = {k: v for k, v in item.items() if k not in ('packages', 'services', 'drivers', 'rawOutput', 'environmentVariables')}
+        row['packageCount'] = len(item.get('packages') or [])
+        row['serviceCount'] = len(item.get('services') or [])
+        row['environmentVariables'] = json.dumps(item.get('environmentVariables') or {}, sort_keys=True)
+        yield 'snapshots', month, row
+
+        for dataset, field in (('snapshot_packages', 'packages'), ('snapshot_services', 'services'), ('snapshot_drivers', 'drivers')):
+            for component in item.get(field) or []:
+                yield dataset, month, {**keys, **component}
+
+def flatten_audit_events(items):
+    """Yield (dataset, month, row) for audit log items"""
+    for item in items:
+        yield 'audit_events', partition_month(item.get('timestamp')), item
+
+def export_segment(items, flatten, sink, segment):
+    """Drain one segment pipeline into partitioned part files"""
+    writer = PartitionedWriter(sink, segment)
+    try:
+        for dataset, month, row in flatten(items):
+            writer.write(dataset, month, row)
+    finally:
+        writer.close()
+    return writer.rows, writer.files
+
+def archived_events(archive, entries, start=None, end=None, exported_ids=frozenset()):
+    """Yield archived audit items in range from the given catalog entries, one file at a time"""
+    for entry in entries:
+        for item in archive.read_file(entry['key']):
+            timestamp = item.get('timestamp', '')
+            if (start and timestamp < start) or (end and timestamp > end):
+                continue
+            if item.get('id') in exported_ids:
+                continue
+            yield item
+
+def export_archive(archive, entries, sink, segments=DEFAULT_SEGMENTS, start=None, end=None, exported_ids=frozenset()):
+    """Archived audit events of the catalog entries into the sink; writers follow the table's segment numbers"""
+    def run(n):
+        items = archived_events(archive, entries[n::segments], start, end, exported_ids)
+        return export_segment(items, flatten_audit_events, sink, segments + n)
+
+    with ThreadPoolExecutor(max_workers=segments) as executor:
+        results = list(executor.map(run, range(min(segments, len(entries)))))
+    return sum(rows for rows, _ in results), sum(files for _, files in results)
+
+def export_table(table, time_attribute, flatten, sink, segments=DEFAULT_SEGMENTS, start=None, end=None):
+    """Parallel segmented scan of one table into the sink"""
+    def run(segment):
+        items = scan_segment(table, segment, segments, time_attribute, start, end)
+        return export_segment(items, flatten, sink, segment)
+
+    with ThreadPoolExecutor(max_workers=segments) as executor:
+        results = list(executor.map(run, range(segments)))
+    return sum(rows for rows, _ in results), sum(files for _, files in results)
+
+def export_history(snapshots_table, audit_log_table, sink, segments=DEFAULT_SEGMENTS, start=None, end=None, archive=None):
+    """Export both tables, and the audit archive if given; returns row/file counts and throughput"""
+    started = time.perf_counter()
+    snapshot_rows, snapshot_files = export_table(
+        snapshots_table, 'capturedAt', flatten_snapshots, sink, segments, start, end
+    )
+
+    # Table events no newer than the newest archived one may also sit in the
+    # archive; their ids are kept so the archive pass skips them
+    entries = archive.candidates({}, start, end) if archive else []
+    archived_until = entries[0]['maxTimestamp'] if entries else ''
+    exported_ids = set()
+
+    def flatten_table_events(items):
+        for item in items:
+            if item.get('timestamp', '') <= archived_until:
+                exported_ids.add(item.get('id'))
+            yield 'audit_events', partition_month(item.get('timestamp')), item
+
+    audit_rows, audit_files = export_table(
+        audit_log_table, 'timestamp', flatten_table_events, sink, segments, start, end
+    )
+    archived_rows, archived_files = 0, 0
+    if entries:
+        archived_rows, archived_files = export_archive(archive, entries, sink, segments, start, end, exported_ids)
+
+    elapsed = time.perf_counter() - started
+    rows = snapshot_rows + audit_rows + archived_rows
+    return {
+        'snapshotRows': snapshot_rows,
+        'auditRows': audit_rows + archived_rows,
+        'archivedAuditRows': archived_rows,
+        'files': snapshot_files + audit_files + archived_files,
+        'seconds': round(elapsed, 3),
+        'rowsPerSecond': round(rows / elapsed) if elapsed else rows
+    }
+
+class SyntheticTable:
+    """Scan-compatible generator of synthetic snapshot or audit items"""
+
+    def __init__(self, kind, count, packages=40):
+        self.kind = kind
+        self.count = count
+        self.packages = packages
+
+    def scan(self, Segment, TotalSegments, ExclusiveStartKey=None, **kwargs):
+        page_size = 200
+        position = ExclusiveStartKey['position'] if ExclusiveStartKey else Segment
+        items = []
+        while position < self.count and len(items) < page_size:
+            items.append(self._item(position))
+            position += TotalSegments
+        response = {'Items': items}
+        if position < self.count:
+            response['LastEvaluatedKey'] = {'position': position}
+        return response
+
+    def _item(self, n):
+        timestamp = f"2077.{(n % 3) + 7:02d}.{(n % 28) + 1:02d} {n % 24:02d}:00:00"
+        env_id = f"env-bench-{n % 500:04d}"
+        if self.kind == 'audit':
+            return {
+                'id': f"log-{n}", 'timestamp': timestamp, 'actor': 'Dr. Bench',
+                'environmentId': env_id, 'action': 'SNAPSHOT_CAPTURED',
+                'details': f"Snapshot snap-{n} captured.", 'severity': 'info'
+            }
+        return {
+            'id': f"snap-{env_id}-{n}", 'environmentId': env_id, 'capturedAt': timestamp,
+            'capturedBy': 'Dr. Bench', 'osVersion': 'Amazon Linux 2', 'kernelVersion': '5.10.0',
+            'packages': [{'name': f"pkg-{p}", 'version': f"1.{p}.{n % 10}"} for p in range(self.packages)],
+            'services': [{'name': 'sshd', 'status': 'active', 'version': '8.2p1'}],
+            'drivers': [{'name': 'CUDA', 'version': '11.4'}],
+            'environmentVariables': {'FEV_DATA_PATH': '/vault/data/fev'},
+            'totalComponents': Decimal(self.packages + 2), 'verified': True
+        }
+
+def benchmark(directory, snapshots=5000, audit_events=50000, segments=DEFAULT_SEGMENTS):
+    """Export synthetic tables to a local directory and report rows/sec"""
+    shutil.rmtree(directory, ignore_errors=True)
+    return export_history(
+        SyntheticTable('snapshot', snapshots),
+        SyntheticTable('audit', audit_events),
+        LocalSink(directory),
+        segments=segments
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description='Export snapshots and audit history to NDJSON.gz')
+    parser.add_argument('--out', required=True, help='Local output directory (S3 stand-in)')
+    parser.add_argument('--snapshots-table', default=os.environ.get('SNAPSHOTS_TABLE'))
+    parser.add_argument('--audit-log-table', default=os.environ.get('AUDIT_LOG_TABLE'))
+    parser.add_argument('--start', help="Inclusive lower bound, e.g. '2077.07.01 00:00:00'")
+    parser.add_argument('--end', help="Inclusive upper bound, e.g. '2077.09.30 23:59:59'")
+    parser.add_argument('--segments', type=int, default=DEFAULT_SEGMENTS)
+    parser.add_argument('--archive-bucket', default=os.environ.get('AUDIT_ARCHIVE_BUCKET'), help='Audit archive bucket to include')
+    parser.add_argument('--archive-dir', help='Local audit archive directory to include (bucket stand-in)')
+    parser.add_argument('--endpoint-url', help='DynamoDB endpoint, e.g. http://localhost:8000 for DynamoDB Local')
+    parser.add_argument('--benchmark', action='store_true', help='Export synthetic tables instead of DynamoDB')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        result = benchmark(args.out, segments=args.segments)
+    else:
+        import boto3
+        dynamodb = boto3.resource('dynamodb', endpoint_url=args.endpoint_url)
+        archive = None
+        if args.archive_bucket or args.archive_dir:
+            # Outside Lambda the common layer is not on the path
+            sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common', 'python'))
+            from audit_archive import AuditArchive
+            from raw_output import LocalStore, S3Store
+            archive = AuditArchive(S3Store(args.archive_bucket) if args.archive_bucket else LocalStore(args.archive_dir))
+        result = export_history(
+            dynamodb.Table(args.snapshots_table),
+            dynamodb.Table(args.audit_log_table),
+            LocalSink(args.out),
+            segments=args.segments,
+            start=args.start,
+            end=args.end,
+            archive=archive
+        )
+    print(json.dumps(result, indent=2))
+
+if __name__ == '__main__':
+    main()
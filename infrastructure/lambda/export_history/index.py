@@ -0,0 +1,48 @@
+import json
+import os
+import boto3
+from datetime import datetime
+
+import audit_archive
+from export import LocalSink, S3Sink, export_history
+
+dynamodb = boto3.resource('dynamodb')
+snapshots_table = dynamodb.Table(os.environ['SNAPSHOTS_TABLE'])
+audit_log_table = dynamodb.Table(os.environ['AUDIT_LOG_TABLE'])
+
+EXPORT_BUCKET = os.environ.get('EXPORT_BUCKET')
+EXPORT_DIR = os.environ.get('EXPORT_DIR', '/tmp/export')
+
+# Events past the hot horizon are exported from here
+archive = audit_archive.AuditArchive(audit_archive.store_from_env())
+
+def handler(event, context):
+    """Export snapshots and audit events for a time range to partitioned NDJSON.gz"""
+    try:
+        event = event or {}
+        prefix = event.get('prefix') or f"exports/{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+        sink = S3Sink(EXPORT_BUCKET, prefix) if EXPORT_BUCKET else LocalSink(os.path.join(EXPORT_DIR, prefix))
+
+        result = export_history(
+            snapshots_table,
+            audit_log_table,
+            sink,
+            segments=int(event.get('segments', 8)),
+            start=event.get('start'),
+            end=event.get('end'),
+            archive=archive
+        )
+        result['location'] = f"s3://{EXPORT_BUCKET}/{prefix}/" if EXPORT_BUCKET else os.path.join(EXPORT_DIR, prefix)
+        print(json.dumps(result))
+
+        return {
+            'statusCode': 200,
+            'body': json.dumps(result)
+        }
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'error': str(e)})
+        }
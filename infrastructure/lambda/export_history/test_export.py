@@ -0,0 +1,109 @@
+"""Segmented export into month-partitioned NDJSON.gz part files."""
+import glob
+import gzip
+import json
+import os
+
+import pytest
+
+import audit_archive
+
+@pytest.fixture
+def export(load_lambda):
+    return load_lambda('export_history', 'export')
+
+def read_dataset(directory, dataset):
+    rows = {}
+    for path in sorted(glob.glob(os.path.join(directory, dataset, 'month=*', '*.ndjson.gz'))):
+        month = os.path.basename(os.path.dirname(path))[len('month='):]
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            rows.setdefault(month, []).extend(json.loads(line) for line in f)
+    return rows
+
+def test_every_row_lands_once_in_its_month(export, tmp_path):
+    result = export.export_history(
+        export.SyntheticTable('snapshot', 120, packages=3), export.SyntheticTable('audit', 500),
+        export.LocalSink(str(tmp_path)), segments=4
+    )
+    assert result['snapshotRows'] == 120 * (1 + 3 + 1 + 1)
+    assert result['auditRows'] == 500
+
+    audit = read_dataset(str(tmp_path), 'audit_events')
+    assert sorted(audit) == ['2077-07', '2077-08', '2077-09']
+    ids = [row['id'] for rows in audit.values() for row in rows]
+    assert sorted(ids) == sorted(f"log-{n}" for n in range(500))
+    assert all(row['timestamp'].startswith(month.replace('-', '.')) for month, rows in audit.items() for row in rows)
+
+def test_snapshots_are_split_into_component_datasets(export, tmp_path):
+    export.export_history(
+        export.SyntheticTable('snapshot', 10, packages=2), export.SyntheticTable('audit', 0),
+        export.LocalSink(str(tmp_path)), segments=2
+    )
+    snapshots = [row for rows in read_dataset(str(tmp_path), 'snapshots').values() for row in rows]
+    packages = [row for rows in read_dataset(str(tmp_path), 'snapshot_packages').values() for row in rows]
+
+    assert len(snapshots) == 10 and len(packages) == 20
+    assert 'packages' not in snapshots[0] and snapshots[0]['packageCount'] == 2
+    assert json.loads(snapshots[0]['environmentVariables']) == {'FEV_DATA_PATH': '/vault/data/fev'}
+    assert snapshots[0]['totalComponents'] == 4
+    assert {'snapshotId', 'environmentId', 'capturedAt', 'name', 'version'} <= set(packages[0])
+
+def test_parts_roll_over_by_row_count(export, tmp_path, monkeypatch):
+    monkeypatch.setattr(export, 'ROWS_PER_PART', 10)
+    writer = export.PartitionedWriter(export.LocalSink(str(tmp_path)), 3)
+    for n in range(25):
+        writer.write('audit_events', '2077-10', {'id': n})
+    writer.close()
+
+    parts = sorted(os.listdir(tmp_path / 'audit_events' / 'month=2077-10'))
+    assert parts == ['part-003-0000.ndjson.gz', 'part-003-0001.ndjson.gz', 'part-003-0002.ndjson.gz']
+    assert (writer.rows, writer.files) == (25, 3)
+
+def test_open_parts_are_bounded(export, tmp_path, monkeypatch):
+    monkeypatch.setattr(export, 'MAX_OPEN_PARTS', 2)
+    writer = export.PartitionedWriter(export.LocalSink(str(tmp_path)), 0)
+    for month in ('2077-08', '2077-09', '2077-10', '2077-08'):
+        writer.write('audit_events', month, {'month': month})
+        assert len(writer.open_parts) <= 2
+    writer.close()
+    # A month reopened after eviction continues in a new part
+    assert sorted(os.listdir(tmp_path / 'audit_events' / 'month=2077-08')) == ['part-000-0000.ndjson.gz', 'part-000-0001.ndjson.gz']
+
+def test_scan_filters_on_the_time_attribute(export):
+    calls = []
+
+    class Table:
+        def scan(self, **kwargs):
+            calls.append(kwargs)
+            return {'Items': []}
+
+    list(export.scan_segment(Table(), 1, 4, 'capturedAt', '2077.10.01', '2077.10.31'))
+    assert calls == [{
+        'Segment': 1, 'TotalSegments': 4,
+        'FilterExpression': '#t >= :start AND #t <= :end',
+        'ExpressionAttributeNames': {'#t': 'capturedAt'},
+        'ExpressionAttributeValues': {':start': '2077.10.01', ':end': '2077.10.31'}
+    }]
+
+def test_archived_events_are_exported_once(export, tmp_path):
+    archive = audit_archive.AuditArchive(audit_archive.LocalStore(str(tmp_path / 'archive')))
+    archived = [{'id': f"log-{n}", 'timestamp': f"2077.08.{n + 1:02d} 09:00:00"} for n in range(6)]
+    archive.write('run-1', archived)
+
+    class AuditTable:
+        # log-5 was archived by a run interrupted before its deletes
+        items = [archived[5], {'id': 'log-6', 'timestamp': '2077.10.01 09:00:00'}]
+
+        def scan(self, Segment, **kwargs):
+            return {'Items': self.items if Segment == 0 else []}
+
+    out = tmp_path / 'out'
+    result = export.export_history(
+        export.SyntheticTable('snapshot', 0), AuditTable(), export.LocalSink(str(out)), segments=2, archive=archive
+    )
+    assert (result['auditRows'], result['archivedAuditRows']) == (7, 5)
+
+    audit = read_dataset(str(out), 'audit_events')
+    assert sorted(row['id'] for rows in audit.values() for row in rows) == [f"log-{n}" for n in range(7)]
+    # Archive writers are numbered after the table's segments
+    assert sorted(os.listdir(out / 'audit_events' / 'month=2077-08'))[-1].startswith('part-003')
@@ -3,6 +3,8 @@ import os
 import boto3
 from datetime import datetime
 
+from versioning import AUDIT_LOG, ENVIRONMENTS, bump_version
+
 dynamodb = boto3.resource('dynamodb')
 environments_table = dynamodb.Table(os.environ['ENVIRONMENTS_TABLE'])
 audit_log_table = dynamodb.Table(os.environ['AUDIT_LOG_TABLE'])
@@ -45,6 +47,7 @@ def handler(event, context):
             'details': f"Environment {environment.get('labName')} {'frozen' if action == 'freeze' else 'unfrozen'}",
             'severity': 'warning' if action == 'freeze' else 'info'
         })
+        bump_version(ENVIRONMENTS, AUDIT_LOG)
         
         return {
             'statusCode': 200,
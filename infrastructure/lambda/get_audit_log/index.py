@@ -2,43 +2,60 @@ import json
 import os
 import boto3
 
+from versioning import (
+    AUDIT_LOG, compute_etag, etag_headers, get_versions,
+    is_not_modified, not_modified_response
+)
+
+import audit_archive
+import query_planner
+
 dynamodb = boto3.resource('dynamodb')
 audit_log_table = dynamodb.Table(os.environ['AUDIT_LOG_TABLE'])
 
+# Events past the hot horizon; catalogs and recently read files are cached per container
+archive = audit_archive.AuditArchive(audit_archive.store_from_env())
+
+# Equality filters (one GSI each) plus an inclusive timestamp range
+FILTER_PARAMS = ('environmentId', 'actor', 'action', 'severity', 'since', 'until')
+MAX_LIMIT = 200
+
 def handler(event, context):
-    """Get audit log entries"""
+    """Get audit log entries, filtered server-side through the audit indexes"""
     try:
         # Get query parameters
         params = event.get('queryStringParameters', {}) or {}
-        environment_id = params.get('environmentId')
-        limit = int(params.get('limit', 50))
-        
-        if environment_id:
-            # Query by environment
-            response = audit_log_table.query(
-                IndexName='EnvironmentIndex',  # Would need to add GSI
-                KeyConditionExpression='environmentId = :env_id',
-                ExpressionAttributeValues={':env_id': environment_id},
-                Limit=limit,
-                ScanIndexForward=False
-            )
-        else:
-            # Scan all (for demo purposes)
-            response = audit_log_table.scan(Limit=limit)
+        filters = {name: params.get(name) for name in FILTER_PARAMS if params.get(name)}
+        limit = max(1, min(int(params.get('limit', 50)), MAX_LIMIT))
+        cursor = params.get('cursor')
         
-        items = response.get('Items', [])
+        # Any audit write bumps the counter; parameters select the view. Archiving
+        # moves events between tiers without changing results, so it is not counted
+        version, = get_versions(AUDIT_LOG)
+        etag = compute_etag(AUDIT_LOG, version, sorted(filters.items()), limit, cursor)
+        if is_not_modified(event, etag):
+            return not_modified_response(etag)
         
-        # Sort by timestamp descending
-        items.sort(key=lambda x: x.get('timestamp', ''), reverse=True)
+        items, next_cursor, query_plan = query_planner.execute(
+            audit_log_table, filters, limit, cursor, archive=archive
+        )
         
         return {
             'statusCode': 200,
-            'headers': {'Access-Control-Allow-Origin': '*'},
+            'headers': etag_headers(etag),
             'body': json.dumps({
-                'auditLog': items[:limit]
+                'auditLog': items,
+                'nextCursor': next_cursor,
+                'index': query_plan['index']
             }, default=str)
         }
     
+    except (query_planner.InvalidCursor, ValueError) as e:
+        return {
+            'statusCode': 400,
+            'headers': {'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)})
+        }
     except Exception as e:
         return {
             'statusCode': 500,
@@ -0,0 +1,167 @@
+import json
+import os
+import time
+import boto3
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import inventory
+import query_planner
+from rollups import DEFAULT_WEIGHT, MAX_SCORE, SEVERITY_WEIGHTS
+from versioning import (
+    AUDIT_LOG, ENVIRONMENTS, compute_etag, etag_headers, get_versions,
+    is_not_modified, not_modified_response
+)
+
+dynamodb = boto3.resource('dynamodb')
+
+environments_table = dynamodb.Table(os.environ['ENVIRONMENTS_TABLE'])
+drift_events_table = dynamodb.Table(os.environ['DRIFT_EVENTS_TABLE'])
+audit_log_table = dynamodb.Table(os.environ['AUDIT_LOG_TABLE'])
+
+# Same staleness bound for live EC2 state as GET /environments
+INSTANCE_STATE_TTL = int(os.environ.get('INSTANCE_STATE_TTL', '60'))
+
+MAX_WORKERS = 16
+MAX_ENVIRONMENT_IDS = 100
+DEFAULT_AUDIT_LIMIT = 50
+MAX_AUDIT_LIMIT = 200
+DEFAULT_EVENTS_PER_ENVIRONMENT = 10
+MAX_EVENTS_PER_ENVIRONMENT = 50
+# Synchronous Lambda responses are capped at 6 MB; leave room for headers
+MAX_BODY_BYTES = 5 * 1024 * 1024
+
+# Internal caches on environment items the dashboard never renders
+OMITTED_FIELDS = ('compiledConstraints', 'workspaceSyncHash')
+
+class DecimalEncoder(json.JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, Decimal):
+            return int(obj)
+        return super(DecimalEncoder, self).default(obj)
+
+def handler(event, context):
+    """Environments, open drift and recent audit entries in one response"""
+    try:
+        params = event.get('queryStringParameters', {}) or {}
+        environment_ids = sorted({i for i in params.get('environmentIds', '').split(',') if i}) or None
+        if environment_ids and len(environment_ids) > MAX_ENVIRONMENT_IDS:
+            return {
+                'statusCode': 400,
+                'headers': {'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': f"At most {MAX_ENVIRONMENT_IDS} environmentIds per request"})
+            }
+        audit_limit = max(1, min(int(params.get('auditLimit', DEFAULT_AUDIT_LIMIT)), MAX_AUDIT_LIMIT))
+        events_per_environment = max(1, min(
+            int(params.get('eventsPerEnvironment', DEFAULT_EVENTS_PER_ENVIRONMENT)), MAX_EVENTS_PER_ENVIRONMENT
+        ))
+
+        # Drift event writes also bump ENVIRONMENTS, so two counters cover the whole view
+        versions = get_versions(ENVIRONMENTS, AUDIT_LOG)
+        etag = compute_etag(
+            'dashboard', *versions, int(time.time() // INSTANCE_STATE_TTL),
+            environment_ids, audit_limit, events_per_environment
+        )
+        if is_not_modified(event, etag):
+            return not_modified_response(etag)
+
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            audit = executor.submit(query_planner.execute, audit_log_table, {}, audit_limit)
+            environments, failures = inventory.load_environments(environments_table, environment_ids)
+            open_drift = dict(zip(
+                [env['id'] for env in environments],
+                executor.map(get_open_drift, [env['id'] for env in environments])
+            ))
+            audit_log, _, _ = audit.result()
+
+        for env in environments:
+            for field in OMITTED_FIELDS:
+                env.pop(field, None)
+            env['openDrift'] = summarize_drift(open_drift[env['id']])
+
+        body, truncated = bounded_body(environments, open_drift, audit_log, events_per_environment, failures)
+
+        # Partial results are not cached under the ETag
+        headers = {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}
+        if not failures:
+            headers = etag_headers(etag, {'Content-Type': 'application/json'})
+        if truncated:
+            print(f"Dashboard response truncated to fit {MAX_BODY_BYTES} bytes")
+
+        return {
+            'statusCode': 200,
+            'headers': headers,
+            'body': body
+        }
+
+    except ValueError as e:
+        return {
+            'statusCode': 400,
+            'headers': {'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)})
+        }
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return {
+            'statusCode': 500,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({
+                'error': 'VAULT-TEC SYSTEMS ERROR: Dashboard unavailable',
+                'details': str(e)
+            })
+        }
+
+def get_open_drift(environment_id):
+    """Unresolved drift events of one environment, newest first"""
+    items = []
+    kwargs = {
+        'KeyConditionExpression': 'environmentId = :env_id',
+        'FilterExpression': 'attribute_not_exists(resolved) OR resolved = :false',
+        'ExpressionAttributeValues': {':env_id': environment_id, ':false': False},
+        'ScanIndexForward': False
+    }
+    while True:
+        response = drift_events_table.query(**kwargs)
+        items.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            return items
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def summarize_drift(events):
+    """Open event counts by severity and the drift score they add up to"""
+    counts = Counter(drift.get('severity') for drift in events)
+    return {
+        'open': len(events),
+        'critical': counts['CRITICAL'],
+        'warning': counts['WARNING'],
+        'info': len(events) - counts['CRITICAL'] - counts['WARNING'],
+        # Same weights as GET /environments/{id}/drift
+        'driftScore': min(sum(SEVERITY_WEIGHTS.get(e.get('severity'), DEFAULT_WEIGHT) for e in events), MAX_SCORE),
+        'latestDetectedAt': events[0]['detectedAt'] if events else None
+    }
+
+def bounded_body(environments, open_drift, audit_log, events_per_environment, failures):
+    """Serialized response, halving the event and audit lists until it fits MAX_BODY_BYTES"""
+    truncated = False
+    while True:
+        drift_events = [e for env in environments for e in open_drift[env['id']][:events_per_environment]]
+        body = json.dumps({
+            'environments': environments,
+            'driftEvents': drift_events,
+            'auditLog': audit_log,
+            'eventsPerEnvironment': events_per_environment,
+            'truncated': truncated,
+            'partial': bool(failures),
+            'unavailableTargets': failures
+        }, cls=DecimalEncoder)
+        if len(body.encode('utf-8')) <= MAX_BODY_BYTES or (events_per_environment == 0 and not audit_log):
+            return body, truncated
+        truncated = True
+        if events_per_environment:
+            events_per_environment //= 2
+        else:
+            audit_log = audit_log[:len(audit_log) // 2]
@@ -0,0 +1,88 @@
+import json
+import os
+import boto3
+
+from rollups import (
+    COUNTERS, LEVEL, LEVEL_BUCKET, MAX_SCORE, bucket_range, levels, parse_window, series_key
+)
+from versioning import (
+    compute_etag, etag_headers, get_versions, is_not_modified,
+    not_modified_response, trend_counter
+)
+
+dynamodb = boto3.resource('dynamodb')
+rollups_table = dynamodb.Table(os.environ['DRIFT_ROLLUPS_TABLE'])
+
+def handler(event, context):
+    """Drift trend for one environment from precomputed rollups"""
+    try:
+        environment_id = event['pathParameters']['id']
+        params = event.get('queryStringParameters', {}) or {}
+        try:
+            granularity, count = parse_window(params.get('window'))
+        except ValueError as e:
+            return {
+                'statusCode': 400,
+                'headers': {'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': str(e)})
+            }
+        buckets = bucket_range(granularity, count)
+
+        # The last bucket changes with the clock as well as with new rollups
+        version, = get_versions(trend_counter(environment_id))
+        etag = compute_etag(trend_counter(environment_id), version, granularity, count, buckets[-1])
+        if is_not_modified(event, etag):
+            return not_modified_response(etag)
+
+        series = series_key('env', environment_id, granularity)
+        rows = query_series(series, buckets[0], buckets[-1], count)
+        level = rollups_table.get_item(
+            Key={'series': series_key('env', environment_id, LEVEL), 'bucket': LEVEL_BUCKET}
+        ).get('Item', {})
+
+        # Score at the end of each bucket: weight of the events open then, capped like check_drift
+        open_weight = levels(buckets, rows, int(level.get('openPoints', 0)))
+        points = []
+        for bucket in buckets:
+            row = rows.get(bucket, {})
+            point = {'bucket': bucket, **{field: int(row.get(field, 0)) for field in COUNTERS}}
+            point['driftScore'] = max(0, min(open_weight[bucket], MAX_SCORE))
+            points.append(point)
+
+        return {
+            'statusCode': 200,
+            'headers': etag_headers(etag),
+            'body': json.dumps({
+                'environmentId': environment_id,
+                'granularity': granularity,
+                'trend': points
+            })
+        }
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return {
+            'statusCode': 500,
+            'headers': {'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({
+                'error': 'VAULT-TEC SYSTEMS ERROR: Drift trend unavailable',
+                'details': str(e)
+            })
+        }
+
+def query_series(series, first, last, count):
+    """Rollup rows for a bucket range; at most `count` rows are read"""
+    rows = {}
+    kwargs = {
+        'KeyConditionExpression': '#s = :series AND #b BETWEEN :first AND :last',
+        'ExpressionAttributeNames': {'#s': 'series', '#b': 'bucket'},
+        'ExpressionAttributeValues': {':series': series, ':first': first, ':last': last},
+        'Limit': count
+    }
+    while len(rows) < count:
+        response = rollups_table.query(**kwargs)
+        rows.update((item['bucket'], item) for item in response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            break
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    return rows
@@ -0,0 +1,94 @@
+import json
+import os
+import boto3
+
+import raw_output
+
+dynamodb = boto3.resource('dynamodb')
+snapshots_table = dynamodb.Table(os.environ['SNAPSHOTS_TABLE'])
+
+store = raw_output.store_from_env()
+
+def handler(event, context):
+    """Page through a snapshot's full command output by byte offset or line"""
+    try:
+        snapshot_id = event['pathParameters']['snapshotId']
+        params = event.get('queryStringParameters', {}) or {}
+
+        outputs = get_raw_outputs(snapshot_id)
+        if not outputs:
+            return {
+                'statusCode': 404,
+                'headers': {'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': f"No stored output for snapshot {snapshot_id}"})
+            }
+
+        instance_id = params.get('instanceId') or sorted(outputs)[0]
+        if instance_id not in outputs:
+            return {
+                'statusCode': 404,
+                'headers': {'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': f"No output from {instance_id} in snapshot {snapshot_id}"})
+            }
+
+        try:
+            offset = int(params['offset']) if params.get('offset') else None
+            line = int(params['line']) if params.get('line') else None
+            max_bytes = int(params.get('maxBytes', raw_output.MAX_READ_BYTES))
+            max_lines = int(params['maxLines']) if params.get('maxLines') else None
+        except ValueError:
+            return {
+                'statusCode': 400,
+                'headers': {'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'offset, line, maxBytes and maxLines must be integers'})
+            }
+        if offset is None and line is None:
+            offset = 0
+
+        chunk = raw_output.read_range(
+            store, outputs[instance_id]['key'],
+            offset=offset, line=line, max_bytes=max_bytes, max_lines=max_lines
+        )
+
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                # Stored output never changes once the capture finishes
+                'Cache-Control': 'private, max-age=86400'
+            },
+            'body': json.dumps({
+                'snapshotId': snapshot_id,
+                'instanceId': instance_id,
+                'instanceIds': sorted(outputs),
+                **chunk
+            })
+        }
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return {
+            'statusCode': 500,
+            'headers': {'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({
+                'error': 'VAULT-TEC SYSTEMS ERROR: Snapshot output unavailable',
+                'details': str(e)
+            })
+        }
+
+def get_raw_outputs(snapshot_id):
+    """rawOutputs map of a snapshot, resolved through SnapshotIdIndex"""
+    response = snapshots_table.query(
+        IndexName='SnapshotIdIndex',
+        KeyConditionExpression='id = :id',
+        ExpressionAttributeValues={':id': snapshot_id},
+        Limit=1
+    )
+    if not response['Items']:
+        return None
+    keys = response['Items'][0]
+    item = snapshots_table.get_item(
+        Key={'environmentId': keys['environmentId'], 'capturedAt': keys['capturedAt']},
+        ProjectionExpression='rawOutputs'
+    ).get('Item', {})
+    return item.get('rawOutputs')
@@ -0,0 +1,138 @@
+import json
+import os
+import time
+import boto3
+from concurrent.futures import ThreadPoolExecutor
+
+import federation
+from rate_limiter import NO_RETRY_CONFIG, limiter_for
+from versioning import ENVIRONMENTS, bump_version
+
+dynamodb = boto3.resource('dynamodb')
+
+environments_table = dynamodb.Table(os.environ['ENVIRONMENTS_TABLE'])
+
+# Discovered instance ids are trusted for this long after a sweep
+MAP_TTL_SECONDS = int(os.environ.get('INSTANCE_MAP_TTL_SECONDS', '3600'))
+MAX_WORKERS = 16
+# Per-target deadline for one sweep (the function times out at 120s)
+SWEEP_TIMEOUT = 60
+
+def handler(event, context):
+    """Sweep EC2 in every fleet target and write the EnvironmentId tag -> instance map back to environments"""
+    try:
+        environments = [(env, environments_table) for env in scan_environment_instances(environments_table)]
+        for env, _ in environments:
+            env['fleetTarget'] = env.get('fleetTarget') or federation.LOCAL
+
+        def sweep(target):
+            remote = []
+            if target.get('environmentsTable'):
+                table = federation.resource('dynamodb', target).Table(target['environmentsTable'])
+                remote = [(env, table) for env in scan_environment_instances(table)]
+                for env, _ in remote:
+                    env['fleetTarget'] = target['name']
+            return build_instance_map(target), remote
+
+        results, failures = federation.fan_out(sweep, list(federation.TARGETS.values()), timeout=SWEEP_TIMEOUT)
+        for _, remote in results.values():
+            environments.extend(remote)
+
+        now = int(time.time())
+        expires_at = now + MAP_TTL_SECONDS
+        updates = []
+        for env, table in environments:
+            # Keep the cached map of environments whose target could not be swept
+            if env['fleetTarget'] not in results:
+                continue
+            discovered = results[env['fleetTarget']][0].get(env['id'], [])
+            stored = list(env.get('discoveredInstanceIds', []))
+            # Environments never mapped get an (empty) entry too: captures wait for one
+            if not discovered and not stored and 'instanceMapExpiresAt' in env:
+                continue
+            # Rewrite unchanged entries only once they are past half their TTL
+            if discovered == stored and int(env.get('instanceMapExpiresAt', 0)) > now + MAP_TTL_SECONDS // 2:
+                continue
+            updates.append((table, env['id'], discovered))
+
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            list(executor.map(lambda update: write_instance_ids(*update, expires_at), updates))
+        if updates:
+            bump_version(ENVIRONMENTS)
+
+        known = {(env['fleetTarget'], env['id']) for env, _ in environments}
+        mapped = [
+            (name, env_id, ids)
+            for name, (instance_map, _) in results.items()
+            for env_id, ids in instance_map.items()
+        ]
+
+        return {
+            'statusCode': 200,
+            'body': json.dumps({
+                'environmentsMapped': sum(1 for name, env_id, _ in mapped if (name, env_id) in known),
+                'instancesMapped': sum(len(ids) for _, _, ids in mapped),
+                'itemsUpdated': len(updates),
+                'unmatchedEnvironmentIds': sorted(env_id for name, env_id, _ in mapped if (name, env_id) not in known),
+                'unavailableTargets': failures
+            })
+        }
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'error': str(e)})
+        }
+
+def build_instance_map(target):
+    """Map EnvironmentId tag -> sorted running instance ids with one paginated sweep of a target"""
+    ec2 = federation.client('ec2', target, NO_RETRY_CONFIG)
+    limiter = limiter_for('ec2:DescribeInstances', federation.limiter_scope(target))
+    instance_map = {}
+    kwargs = {
+        'Filters': [
+            {'Name': 'tag-key', 'Values': ['EnvironmentId']},
+            {'Name': 'instance-state-name', 'Values': ['running']}
+        ],
+        'MaxResults': 1000
+    }
+    while True:
+        # Paginated by hand so every page request goes through the shared limiter
+        page = limiter.call(ec2.describe_instances, **kwargs)
+        for reservation in page['Reservations']:
+            for instance in reservation['Instances']:
+                tags = {tag['Key']: tag['Value'] for tag in instance.get('Tags', [])}
+                environment_id = tags.get('EnvironmentId')
+                if environment_id:
+                    instance_map.setdefault(environment_id, []).append(instance['InstanceId'])
+        if not page.get('NextToken'):
+            break
+        kwargs['NextToken'] = page['NextToken']
+
+    return {env_id: sorted(ids) for env_id, ids in instance_map.items()}
+
+def scan_environment_instances(table):
+    """Read id, fleet target and cached instance fields of every environment in a registry"""
+    items = []
+    kwargs = {
+        'ProjectionExpression': 'id, fleetTarget, discoveredInstanceIds, instanceMapExpiresAt'
+    }
+    while True:
+        response = table.scan(**kwargs)
+        items.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            return items
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def write_instance_ids(table, environment_id, instance_ids, expires_at):
+    """Store discovered instance ids and their expiry on an environment item"""
+    try:
+        table.update_item(
+            Key={'id': environment_id},
+            UpdateExpression='SET discoveredInstanceIds = :ids, instanceMapExpiresAt = :expires',
+            ConditionExpression='attribute_exists(id)',
+            ExpressionAttributeValues={':ids': instance_ids, ':expires': expires_at}
+        )
+    except Exception as e:
+        print(f"Error writing instance ids for {environment_id}: {e}")
@@ -0,0 +1,691 @@
+import json
+import os
+import time
+import uuid
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from decimal import Decimal
+
+import federation
+from plan import build_plan, remediation_steps
+from rate_limiter import NO_RETRY_CONFIG
+from rollups import DEFAULT_WEIGHT, SEVERITY_WEIGHTS
+from rollout import MAX_COMMAND_TARGETS, command_batches, halt_reason, plan_waves, run_batch
+from snapshot_diff import diff_snapshots
+from versioning import AUDIT_LOG, ENVIRONMENTS, bump_version, drift_counter
+
+dynamodb = boto3.resource('dynamodb')
+lambda_client = boto3.client('lambda')
+# Verification captures run synchronously and can outlast the default 60s read timeout
+CAPTURE_TIMEOUT_SECONDS = 330
+capture_client = boto3.client('lambda', config=Config(read_timeout=CAPTURE_TIMEOUT_SECONDS, retries={'total_max_attempts': 1}))
+
+environments_table = dynamodb.Table(os.environ['ENVIRONMENTS_TABLE'])
+snapshots_table = dynamodb.Table(os.environ['SNAPSHOTS_TABLE'])
+audit_log_table = dynamodb.Table(os.environ['AUDIT_LOG_TABLE'])
+drift_events_table = dynamodb.Table(os.environ['DRIFT_EVENTS_TABLE'])
+jobs_table = dynamodb.Table(os.environ['REMEDIATION_JOBS_TABLE'])
+
+CAPTURE_FUNCTION = os.environ.get('CAPTURE_FUNCTION')
+
+# Rollout options: default and allowed range
+OPTIONS = {
+    'canary': (1, 0, 50),
+    'batchSize': (20, 1, 200),
+    'concurrency': (10, 1, 50),
+    'maxFailureRate': (0.1, 0.0, 1.0),
+}
+MAX_ENVIRONMENTS = 500
+MAX_WORKERS = 16
+JOB_TTL_SECONDS = 30 * 24 * 3600
+
+# A wave (commands, then verification captures) must fit in what is left of
+# the invocation; otherwise the job continues in a fresh invocation
+WAVE_BUDGET_MS = 9 * 60 * 1000
+# One invocation runs a job at a time; a crashed run's claim lapses after this
+RUN_LEASE_SECONDS = 16 * 60
+# Commands and verification stop this long before the invocation times out
+WAVE_MARGIN_SECONDS = 60
+# A job not updated for this long after its lease lapsed has no run left to continue it
+SWEEP_GRACE_SECONDS = 5 * 60
+
+# Capture coalesces requests within 15s of a finished capture, so a stale
+# verification snapshot is retried after that window
+VERIFY_ATTEMPTS = 3
+VERIFY_RETRY_SECONDS = 16
+
+FINISHED = ('COMPLETED', 'HALTED', 'FAILED')
+
+def handler(event, context):
+    """Start, inspect or run (async, {"mode": "run"}) batched drift remediation jobs"""
+    event = event or {}
+    if event.get('mode') == 'run':
+        return run_job(event['jobId'], context)
+    if event.get('mode') == 'sweep':
+        return sweep_jobs()
+    if event.get('httpMethod') == 'GET':
+        return get_job(event)
+    return start_job(event, context)
+
+def start_job(event, context):
+    """Plan a remediation job and hand it to an asynchronous run"""
+    try:
+        body = json.loads(event.get('body') or '{}')
+        try:
+            options = parse_options(body)
+        except ValueError as e:
+            return {
+                'statusCode': 400,
+                'headers': {'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': str(e)})
+            }
+
+        environment_ids = list(dict.fromkeys(body.get('environmentIds') or drifted_environment_ids()))
+        if len(environment_ids) > MAX_ENVIRONMENTS:
+            return {
+                'statusCode': 400,
+                'headers': {'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': f"At most {MAX_ENVIRONMENTS} environments per job"})
+            }
+
+        if body.get('dryRun'):
+            entries = plan_environments(environment_ids)
+            return {
+                'statusCode': 200,
+                'headers': {'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'dryRun': True, 'environments': [public_entry(e) for e in entries]}, default=str)
+            }
+
+        timestamp = datetime.now().strftime('%Y.%m.%d %H:%M:%S')
+        job_id = f"rem-{int(time.time())}-{uuid.uuid4().hex[:8]}"
+        actor = body.get('actor', 'System')
+        jobs_table.put_item(Item={
+            'jobId': job_id,
+            'entry': 'job',
+            'status': 'PENDING',
+            'createdAt': timestamp,
+            'updatedAt': timestamp,
+            'requestedBy': actor,
+            'options': {name: Decimal(str(value)) for name, value in options.items()},
+            'environmentIds': environment_ids,
+            'ttl': int(time.time()) + JOB_TTL_SECONDS
+        })
+
+        lambda_client.invoke(
+            FunctionName=context.invoked_function_arn,
+            InvocationType='Event',
+            Payload=json.dumps({'mode': 'run', 'jobId': job_id}).encode('utf-8')
+        )
+
+        log_audit_event(None, actor, 'REMEDIATION_STARTED',
+                        f"Remediation job {job_id} started for {len(environment_ids)} environments", 'info')
+
+        return {
+            'statusCode': 202,
+            'headers': {'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({
+                'jobId': job_id,
+                'status': 'PENDING',
+                'environments': len(environment_ids)
+            })
+        }
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return {
+            'statusCode': 500,
+            'headers': {'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({
+                'error': 'VAULT-TEC SYSTEMS ERROR: Remediation could not be started',
+                'details': str(e)
+            })
+        }
+
+def get_job(event):
+    """Job progress and per-environment results"""
+    try:
+        job_id = event['pathParameters']['jobId']
+        items = []
+        kwargs = {
+            'KeyConditionExpression': 'jobId = :job_id',
+            'ExpressionAttributeValues': {':job_id': job_id}
+        }
+        while True:
+            response = jobs_table.query(**kwargs)
+            items.extend(response.get('Items', []))
+            if 'LastEvaluatedKey' not in response:
+                break
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+        job = next((item for item in items if item['entry'] == 'job'), None)
+        if not job:
+            return {
+                'statusCode': 404,
+                'headers': {'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Remediation job not found'})
+            }
+
+        environments = [public_entry(item) for item in items if item['entry'].startswith('env#')]
+        job = {k: v for k, v in job.items() if k not in ('entry', 'ttl', 'waves', 'runOwner', 'leaseUntil')}
+        return {
+            'statusCode': 200,
+            'headers': {'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'job': plain(job), 'environments': plain(environments)}, default=str)
+        }
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return {
+            'statusCode': 500,
+            'headers': {'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({
+                'error': 'VAULT-TEC SYSTEMS ERROR: Remediation job unavailable',
+                'details': str(e)
+            })
+        }
+
+def run_job(job_id, context):
+    """Plan (first run only) and execute the remaining waves of a job"""
+    try:
+        job = claim_job(job_id, context.aws_request_id)
+        if not job or job['status'] in FINISHED:
+            # Duplicate async delivery of a job that is running or already ran
+            return {'statusCode': 200, 'body': json.dumps({'jobId': job_id, 'skipped': True})}
+        options = {name: float(value) if name == 'maxFailureRate' else int(value) for name, value in job['options'].items()}
+
+        if job['status'] == 'PENDING':
+            job = start_rollout(job, options)
+
+        waves = job['waves']
+        for index in range(int(job.get('currentWave', 0)), len(waves)):
+            if context.get_remaining_time_in_millis() < WAVE_BUDGET_MS:
+                update_job(job_id, currentWave=index, leaseUntil=0)
+                lambda_client.invoke(
+                    FunctionName=context.invoked_function_arn,
+                    InvocationType='Event',
+                    Payload=json.dumps({'mode': 'run', 'jobId': job_id}).encode('utf-8')
+                )
+                return {'statusCode': 202, 'body': json.dumps({'jobId': job_id, 'continuedAt': index})}
+
+            update_job(job_id, currentWave=index)
+            deadline = time.time() + context.get_remaining_time_in_millis() / 1000 - WAVE_MARGIN_SECONDS
+            totals = run_wave(job_id, waves[index], options, deadline)
+            job = jobs_table.get_item(Key={'jobId': job_id, 'entry': 'job'})['Item']
+
+            failed = int(job.get('failed', 0)) + int(job.get('unverified', 0))
+            finished = int(job.get('succeeded', 0)) + int(job.get('failed', 0))
+            canary = index == 0 and options['canary'] > 0
+            reason = halt_reason(canary, failed, finished, options['maxFailureRate'])
+            if reason:
+                skip_environments(job_id, [e for wave in waves[index + 1:] for e in wave], reason)
+                update_job(job_id, status='HALTED', haltReason=reason, currentWave=index + 1)
+                log_audit_event(None, job['requestedBy'], 'REMEDIATION_HALTED', f"Remediation job {job_id} halted: {reason}", 'critical')
+                return {'statusCode': 200, 'body': json.dumps({'jobId': job_id, 'status': 'HALTED', 'reason': reason})}
+            print(json.dumps({'jobId': job_id, 'wave': index, **totals}))
+
+        update_job(job_id, status='COMPLETED', currentWave=len(waves))
+        log_audit_event(None, job['requestedBy'], 'REMEDIATION_COMPLETED',
+                        f"Remediation job {job_id} completed: {int(job.get('succeeded', 0))} restored, "
+                        f"{int(job.get('failed', 0))} failed, {int(job.get('manual', 0))} need manual action", 'info')
+        return {'statusCode': 200, 'body': json.dumps({'jobId': job_id, 'status': 'COMPLETED'})}
+
+    except Exception as e:
+        # Not re-raised: an async retry would resend commands to instances already remediated
+        print(f"Error: {str(e)}")
+        update_job(job_id, status='FAILED', error=str(e))
+        return {
+            'statusCode': 500,
+            'body': json.dumps({
+                'error': 'VAULT-TEC SYSTEMS ERROR: Remediation job failed',
+                'details': str(e)
+            })
+        }
+
+def claim_job(job_id, owner):
+    """Job entry if this invocation may run it, else None"""
+    now = int(time.time())
+    try:
+        return jobs_table.update_item(
+            Key={'jobId': job_id, 'entry': 'job'},
+            UpdateExpression='SET runOwner = :owner, leaseUntil = :until',
+            ConditionExpression='attribute_exists(jobId) AND (attribute_not_exists(leaseUntil) OR leaseUntil < :now OR runOwner = :owner)',
+            ExpressionAttributeValues={':owner': owner, ':until': now + RUN_LEASE_SECONDS, ':now': now},
+            ReturnValues='ALL_NEW'
+        )['Attributes']
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return None
+        raise
+
+def sweep_jobs():
+    """Fail jobs whose run ended without finishing them (e.g. the invocation timed out)"""
+    now = int(time.time())
+    stale = datetime.fromtimestamp(now - SWEEP_GRACE_SECONDS).strftime('%Y.%m.%d %H:%M:%S')
+    jobs = []
+    kwargs = {
+        'FilterExpression': 'entry = :job AND #status IN (:pending, :running) AND updatedAt < :stale '
+                            'AND (attribute_not_exists(leaseUntil) OR leaseUntil < :now)',
+        'ExpressionAttributeNames': {'#status': 'status'},
+        'ExpressionAttributeValues': {
+            ':job': 'job', ':pending': 'PENDING', ':running': 'RUNNING', ':stale': stale, ':now': now
+        }
+    }
+    while True:
+        response = jobs_table.scan(**kwargs)
+        jobs.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            break
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    failed = []
+    for job in jobs:
+        job_id = job['jobId']
+        reason = 'Run interrupted before the job finished'
+        try:
+            # Conditional, so a run that claimed the job meanwhile keeps it
+            jobs_table.update_item(
+                Key={'jobId': job_id, 'entry': 'job'},
+                UpdateExpression='SET #status = :failed, #error = :reason, updatedAt = :updated',
+                ConditionExpression='#status = :status AND (attribute_not_exists(leaseUntil) OR leaseUntil < :now)',
+                ExpressionAttributeNames={'#status': 'status', '#error': 'error'},
+                ExpressionAttributeValues={
+                    ':failed': 'FAILED', ':reason': reason, ':status': job['status'], ':now': now,
+                    ':updated': datetime.now().strftime('%Y.%m.%d %H:%M:%S')
+                }
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                continue
+            raise
+
+        waves = job.get('waves') or []
+        current = int(job.get('currentWave', 0))
+        interrupted = [e for e in get_entries(job_id, waves[current] if current < len(waves) else []) if e['status'] == 'RUNNING']
+        for entry in interrupted:
+            entry['status'] = 'FAILED'
+            entry['error'] = reason
+            put_entry(entry)
+        if interrupted:
+            add_to_job(job_id, failed=len(interrupted))
+        remaining = [e for wave in waves[current + 1:] for e in wave]
+        if remaining:
+            skip_environments(job_id, remaining, reason)
+        log_audit_event(None, job.get('requestedBy', 'System'), 'REMEDIATION_FAILED',
+                        f"Remediation job {job_id} failed: {reason}", 'critical')
+        failed.append(job_id)
+
+    result = {'jobsFailed': failed}
+    print(json.dumps(result))
+    return {'statusCode': 200, 'body': json.dumps(result)}
+
+def parse_options(body):
+    """Rollout options from a request body, defaulted and range-checked"""
+    options = {}
+    for name, (default, low, high) in OPTIONS.items():
+        value = body.get(name, default)
+        try:
+            value = float(value) if isinstance(default, float) else int(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{name} must be a number")
+        if not low <= value <= high:
+            raise ValueError(f"{name} must be between {low} and {high}")
+        options[name] = value
+    return options
+
+def drifted_environment_ids():
+    """Environments with open drift events that are not frozen or archived"""
+    candidates = []
+    kwargs = {
+        'ProjectionExpression': 'id, #status',
+        'ExpressionAttributeNames': {'#status': 'status'}
+    }
+    while True:
+        response = environments_table.scan(**kwargs)
+        candidates.extend(
+            item['id'] for item in response.get('Items', [])
+            if item.get('status') not in ('FROZEN', 'ARCHIVED')
+        )
+        if 'LastEvaluatedKey' not in response:
+            break
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        drifted = executor.map(lambda environment_id: bool(open_drift_events(environment_id, first_only=True)), candidates)
+        return sorted(environment_id for environment_id, has_drift in zip(candidates, drifted) if has_drift)
+
+def open_drift_events(environment_id, first_only=False, restorable_only=True):
+    """Unresolved drift events of one environment; by default only those a restore can fix (not stack resources)"""
+    events = []
+    kwargs = {
+        'KeyConditionExpression': 'environmentId = :env_id',
+        'FilterExpression': 'attribute_not_exists(resolved) OR resolved = :false',
+        'ExpressionAttributeValues': {':env_id': environment_id, ':false': False}
+    }
+    if restorable_only:
+        kwargs['FilterExpression'] = f"({kwargs['FilterExpression']}) AND (attribute_not_exists(#source) OR #source <> :cloudformation)"
+        kwargs['ExpressionAttributeNames'] = {'#source': 'source'}
+        kwargs['ExpressionAttributeValues'][':cloudformation'] = 'cloudformation'
+
+    while True:
+        response = drift_events_table.query(**kwargs)
+        events.extend(response.get('Items', []))
+        if (first_only and events) or 'LastEvaluatedKey' not in response:
+            return events
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def plan_environments(environment_ids):
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        return list(executor.map(plan_environment, environment_ids))
+
+def plan_environment(environment_id):
+    """Restore plan for one environment, or why it is skipped"""
+    entry = {'environmentId': environment_id, 'status': 'SKIPPED'}
+    environment = environments_table.get_item(Key={'id': environment_id}).get('Item')
+    if not environment:
+        return {**entry, 'reason': 'Environment not found'}
+    entry['labName'] = environment.get('labName')
+    entry['fleetTarget'] = environment.get('fleetTarget') or federation.LOCAL
+    if environment.get('status') == 'FROZEN':
+        return {**entry, 'reason': 'Environment is frozen'}
+    if entry['fleetTarget'] not in federation.TARGETS:
+        return {**entry, 'reason': f"Unknown fleet target '{entry['fleetTarget']}'"}
+
+    baseline = get_baseline_snapshot(environment)
+    latest = get_latest_snapshot(environment_id)
+    if not baseline or not latest:
+        return {**entry, 'reason': 'No snapshots'}
+    if baseline['id'] == latest['id']:
+        return {**entry, 'status': 'CLEAN', 'baselineSnapshotId': baseline['id'], 'currentSnapshotId': latest['id']}
+
+    entry.update(build_plan(baseline, latest))
+    if not entry['commands']:
+        entry['status'] = 'MANUAL' if entry['manual'] else 'CLEAN'
+        return entry
+
+    entry['instanceIds'] = resolve_instance_ids(environment)
+    if not entry['instanceIds']:
+        return {**entry, 'reason': 'No running instances'}
+    if len(entry['instanceIds']) > MAX_COMMAND_TARGETS:
+        # A partial restore would still be counted as succeeded, so none is attempted
+        return {**entry, 'reason': f"{len(entry['instanceIds'])} instances exceed the {MAX_COMMAND_TARGETS} one restore command can target"}
+    entry['status'] = 'PLANNED'
+    return entry
+
+def resolve_instance_ids(environment):
+    """Instance IDs for an environment from its pin or the discovery map"""
+    if environment.get('instanceId'):
+        return [environment['instanceId']]
+    return list(environment.get('discoveredInstanceIds', []))
+
+def get_baseline_snapshot(environment):
+    """Snapshot named by baselineSnapshotId, else the environment's first snapshot"""
+    if environment.get('baselineSnapshotId'):
+        return get_snapshot(environment['baselineSnapshotId'])
+    response = snapshots_table.query(
+        KeyConditionExpression='environmentId = :env_id',
+        ExpressionAttributeValues={':env_id': environment['id']},
+        ScanIndexForward=True,
+        Limit=1
+    )
+    return response['Items'][0] if response['Items'] else None
+
+def get_latest_snapshot(environment_id):
+    response = snapshots_table.query(
+        KeyConditionExpression='environmentId = :env_id',
+        ExpressionAttributeValues={':env_id': environment_id},
+        ScanIndexForward=False,
+        Limit=1
+    )
+    return response['Items'][0] if response['Items'] else None
+
+def get_snapshot(snapshot_id):
+    """Full snapshot item by id via SnapshotIdIndex"""
+    response = snapshots_table.query(
+        IndexName='SnapshotIdIndex',
+        KeyConditionExpression='id = :id',
+        ExpressionAttributeValues={':id': snapshot_id},
+        Limit=1
+    )
+    if not response['Items']:
+        return None
+    keys = response['Items'][0]
+    return snapshots_table.get_item(
+        Key={'environmentId': keys['environmentId'], 'capturedAt': keys['capturedAt']}
+    ).get('Item')
+
+def start_rollout(job, options):
+    """Plan every environment, store the plans and fix the wave order"""
+    job_id = job['jobId']
+    entries = plan_environments(job['environmentIds'])
+
+    # Smallest change sets go first, so the canary wave risks the least
+    planned = sorted((e for e in entries if e['status'] == 'PLANNED'), key=lambda e: (len(e['commands']), e['environmentId']))
+    waves = plan_waves([e['environmentId'] for e in planned], options['canary'], options['batchSize'])
+
+    expires = int(time.time()) + JOB_TTL_SECONDS
+    with jobs_table.batch_writer() as writer:
+        for entry in entries:
+            writer.put_item(Item={'jobId': job_id, 'entry': f"env#{entry['environmentId']}", 'ttl': expires, **entry})
+
+    counts = {status: sum(1 for e in entries if e['status'] == status) for status in ('PLANNED', 'CLEAN', 'MANUAL', 'SKIPPED')}
+    return update_job(
+        job_id,
+        status='RUNNING',
+        waves=waves,
+        totalWaves=len(waves),
+        currentWave=0,
+        planned=counts['PLANNED'],
+        clean=counts['CLEAN'],
+        manual=counts['MANUAL'],
+        skipped=counts['SKIPPED'],
+        succeeded=0, failed=0, verified=0, unverified=0
+    )
+
+def run_wave(job_id, environment_ids, options, deadline):
+    """Run one wave's commands, then verify every environment that succeeded, all before deadline"""
+    entries = get_entries(job_id, environment_ids)
+    for entry in entries:
+        entry['status'] = 'RUNNING'
+        put_entry(entry)
+
+    batches = command_batches(entries)
+    with ThreadPoolExecutor(max_workers=min(len(batches), MAX_WORKERS) or 1) as executor:
+        # Leave room for at least one verification capture after the commands
+        command_deadline = deadline - CAPTURE_TIMEOUT_SECONDS
+        list(executor.map(lambda batch: execute_batch(job_id, batch, options, command_deadline), batches))
+    finished_at = datetime.now().strftime('%Y.%m.%d %H:%M:%S')
+
+    succeeded = [entry for entry in entries if entry['status'] == 'SUCCEEDED']
+    with ThreadPoolExecutor(max_workers=min(len(succeeded), options['concurrency'], MAX_WORKERS) or 1) as executor:
+        list(executor.map(lambda entry: verify_entry(job_id, entry, finished_at, deadline), succeeded))
+
+    return {
+        'succeeded': len(succeeded),
+        'failed': len(entries) - len(succeeded),
+        'verified': sum(1 for entry in succeeded if entry['verification'].get('verified'))
+    }
+
+def execute_batch(job_id, batch, options, deadline):
+    """Send one batch and record each environment's outcome as it lands"""
+    target = federation.TARGETS[batch['fleetTarget']]
+    try:
+        ssm = federation.client('ssm', target, NO_RETRY_CONFIG)
+        command_id, statuses = run_batch(
+            ssm, federation.limiter_scope(target), batch,
+            options['concurrency'], options['maxFailureRate'],
+            f"West Tek remediation {job_id}",
+            deadline
+        )
+        error = None
+    except Exception as e:
+        print(f"Error sending remediation batch: {e}")
+        command_id, statuses, error = None, {}, str(e)
+
+    for entry in batch['entries']:
+        entry['commandId'] = command_id
+        entry['instanceStatuses'] = {i: statuses.get(i, 'Failed') for i in entry['instanceIds']}
+        ok = all(status == 'Success' for status in entry['instanceStatuses'].values())
+        entry['status'] = 'SUCCEEDED' if ok else 'FAILED'
+        if error:
+            entry['error'] = error
+        put_entry(entry)
+        add_to_job(job_id, succeeded=1 if ok else 0, failed=0 if ok else 1)
+        if not ok:
+            failed = ', '.join(f"{i} {s}" for i, s in entry['instanceStatuses'].items() if s != 'Success')
+            log_audit_event(entry['environmentId'], 'Remediation', 'REMEDIATION_FAILED',
+                            f"Restore to {entry['baselineSnapshotId']} failed ({error or failed})", 'warning')
+
+def verify_entry(job_id, entry, remediated_at, deadline):
+    """Capture a fresh snapshot and check nothing restorable still differs from the baseline"""
+    snapshot = None
+    error = 'No snapshot captured after remediation'
+    for attempt in range(VERIFY_ATTEMPTS):
+        if attempt:
+            time.sleep(VERIFY_RETRY_SECONDS)
+        # A capture still running at the timeout would take the invocation down with it
+        if time.time() + CAPTURE_TIMEOUT_SECONDS > deadline:
+            error = 'No time left to capture a verification snapshot'
+            break
+        response = capture_client.invoke(
+            FunctionName=CAPTURE_FUNCTION,
+            Payload=json.dumps({'pathParameters': {'id': entry['environmentId']}}).encode('utf-8')
+        )
+        result = json.loads(response['Payload'].read())
+        if result.get('statusCode') == 200:
+            captured = json.loads(result['body'])['snapshot']
+            if captured['capturedAt'] >= remediated_at:
+                snapshot = captured
+                break
+
+    if snapshot is None:
+        entry['verification'] = {'verified': False, 'error': error}
+    else:
+        baseline = get_snapshot(entry['baselineSnapshotId'])
+        remaining, _ = remediation_steps(diff_snapshots(baseline, snapshot), baseline)
+        entry['verification'] = {
+            'snapshotId': snapshot['id'],
+            'verified': not remaining,
+            'remainingSteps': remaining
+        }
+
+    verified = entry['verification']['verified']
+    put_entry(entry)
+    add_to_job(job_id, verified=1 if verified else 0, unverified=0 if verified else 1)
+    if verified:
+        resolved = resolve_drift(entry['environmentId'], remediated_at, job_id)
+        log_audit_event(entry['environmentId'], 'Remediation', 'ENV_REMEDIATED',
+                        f"Restored to baseline {entry['baselineSnapshotId']}; verified by {snapshot['id']}; "
+                        f"{resolved} drift events resolved", 'info')
+    else:
+        log_audit_event(entry['environmentId'], 'Remediation', 'REMEDIATION_FAILED',
+                        f"Restore to {entry['baselineSnapshotId']} not verified: "
+                        f"{entry['verification'].get('error') or str(len(remaining)) + ' steps still differ'}", 'warning')
+
+def resolve_drift(environment_id, remediated_at, job_id):
+    """Resolve the drift a verified restore fixed and reset the environment's score"""
+    events = open_drift_events(environment_id, restorable_only=False)
+    fixed = [
+        event for event in events
+        if event.get('source') != 'cloudformation' and event['detectedAt'] <= remediated_at
+    ]
+    timestamp = datetime.now().strftime('%Y.%m.%d %H:%M:%S')
+    for event in fixed:
+        drift_events_table.update_item(
+            Key={'environmentId': environment_id, 'detectedAt': event['detectedAt']},
+            UpdateExpression='SET resolved = :true, resolvedAt = :resolved_at, resolvedBy = :job_id',
+            ExpressionAttributeValues={':true': True, ':resolved_at': timestamp, ':job_id': job_id}
+        )
+
+    # Events detected after the restore, and stack drift, still count
+    remaining = [event for event in events if event not in fixed]
+    environments_table.update_item(
+        Key={'id': environment_id},
+        UpdateExpression='SET driftScore = :score',
+        ExpressionAttributeValues={':score': drift_score(remaining)}
+    )
+    bump_version(ENVIRONMENTS, drift_counter(environment_id))
+    return len(fixed)
+
+def drift_score(events):
+    """Same weights as GET /environments/{id}/drift"""
+    return min(sum(SEVERITY_WEIGHTS.get(event.get('severity'), DEFAULT_WEIGHT) for event in events), 100)
+
+def skip_environments(job_id, environment_ids, reason):
+    for entry in get_entries(job_id, environment_ids):
+        entry['status'] = 'SKIPPED'
+        entry['reason'] = reason
+        put_entry(entry)
+    add_to_job(job_id, skipped=len(environment_ids))
+
+def get_entries(job_id, environment_ids):
+    """Environment entries of a job, in the given order"""
+    found = {}
+    keys = [{'jobId': job_id, 'entry': f"env#{environment_id}"} for environment_id in environment_ids]
+    for start in range(0, len(keys), 100):
+        request = {jobs_table.name: {'Keys': keys[start:start + 100]}}
+        while request:
+            response = dynamodb.batch_get_item(RequestItems=request)
+            for item in response['Responses'].get(jobs_table.name, []):
+                found[item['environmentId']] = item
+            request = response.get('UnprocessedKeys')
+    return [found[environment_id] for environment_id in environment_ids if environment_id in found]
+
+def put_entry(entry):
+    jobs_table.put_item(Item=entry)
+
+def update_job(job_id, **fields):
+    """SET fields on the job entry; returns the updated entry"""
+    fields['updatedAt'] = datetime.now().strftime('%Y.%m.%d %H:%M:%S')
+    names = {f"#f{n}": name for n, name in enumerate(fields)}
+    values = {f":f{n}": value for n, value in enumerate(fields.values())}
+    return jobs_table.update_item(
+        Key={'jobId': job_id, 'entry': 'job'},
+        UpdateExpression='SET ' + ', '.join(f"#f{n} = :f{n}" for n in range(len(fields))),
+        ExpressionAttributeNames=names,
+        ExpressionAttributeValues=values,
+        ReturnValues='ALL_NEW'
+    )['Attributes']
+
+def add_to_job(job_id, **counters):
+    """Atomically add to the job's progress counters"""
+    names = {f"#c{n}": name for n, name in enumerate(counters)}
+    values = {f":c{n}": value for n, value in enumerate(counters.values())}
+    jobs_table.update_item(
+        Key={'jobId': job_id, 'entry': 'job'},
+        UpdateExpression='ADD ' + ', '.join(f"#c{n} :c{n}" for n in range(len(counters))),
+        ExpressionAttributeNames=names,
+        ExpressionAttributeValues=values
+    )
+
+def public_entry(entry):
+    """Environment entry as returned by the API (scripts omitted)"""
+    return {k: v for k, v in entry.items() if k not in ('jobId', 'entry', 'ttl', 'script')}
+
+def plain(value):
+    """DynamoDB Decimals as ints/floats for JSON"""
+    if isinstance(value, list):
+        return [plain(v) for v in value]
+    if isinstance(value, dict):
+        return {k: plain(v) for k, v in value.items()}
+    if isinstance(value, Decimal):
+        return int(value) if value == int(value) else float(value)
+    return value
+
+def log_audit_event(environment_id, actor, action, details, severity):
+    """Log event to audit trail"""
+    item = {
+        # Suffixed: concurrent batches log within the same millisecond
+        'id': f"log-{int(time.time() * 1000)}-{uuid.uuid4().hex[:6]}",
+        'timestamp': datetime.now().strftime('%Y.%m.%d %H:%M:%S'),
+        'actor': actor,
+        'action': action,
+        'details': details,
+        'severity': severity
+    }
+    if environment_id:
+        item['environmentId'] = environment_id
+    audit_log_table.put_item(Item=item)
+    bump_version(AUDIT_LOG)
@@ -0,0 +1,110 @@
+"""Turn a baseline-vs-current snapshot diff into per-instance restore steps.
+
+Steps are shell commands for AWS-RunShellScript. Packages are pinned back to
+their baseline versions with the package manager named on the component
+(`manager`: "pip" or "rpm", default "pip"); packages absent from the baseline
+are removed. Services the baseline had running are started again, and
+/etc/environment entries are restored. Anything without a safe automatic fix
+(drivers, kernel, OS, image hash, service version changes) is returned as a
+manual item instead.
+"""
+import hashlib
+import shlex
+
+from snapshot_diff import diff_snapshots
+
+DEFAULT_MANAGER = 'pip'
+ENVIRONMENT_FILE = '/etc/environment'
+
+def pin_package(component):
+    name, version = component.get('name'), component.get('version')
+    if component.get('manager', DEFAULT_MANAGER) == 'rpm':
+        spec = shlex.quote(f"{name}-{version}")
+        # install does not move to an older version; downgrade does
+        return f"yum install -y {spec} || yum downgrade -y {spec}"
+    return f"pip3 install --no-deps {shlex.quote(f'{name}=={version}')}"
+
+def remove_package(component):
+    name = shlex.quote(component.get('name'))
+    if component.get('manager', DEFAULT_MANAGER) == 'rpm':
+        return f"yum remove -y {name}"
+    return f"pip3 uninstall -y {name}"
+
+def unset_variable(name):
+    # /etc/environment entries are usually NAME=value; profile-style files use export
+    return f"sed -E -i {shlex.quote(f'/^(export )?{name}=/d')} {ENVIRONMENT_FILE}"
+
+def set_variable(name, value):
+    line = shlex.quote(f"{name}={shlex.quote(value)}")
+    return f"{unset_variable(name)} && echo {line} >> {ENVIRONMENT_FILE}"
+
+def remediation_steps(diff, baseline):
+    """(commands, manual items) that move the diff's `b` side back to its `a` side (the baseline)"""
+    commands, manual = [], []
+
+    # Changed entries carry only the compared attributes, not the package manager
+    managers = {c.get('name'): c.get('manager', DEFAULT_MANAGER) for c in baseline.get('packages') or []}
+    packages = diff['packages']
+    for component in packages['removed']:
+        commands.append(pin_package(component))
+    for change in packages['changed']:
+        commands.append(pin_package({
+            'name': change['name'],
+            'version': change['changes']['version']['from'],
+            'manager': managers.get(change['name'], DEFAULT_MANAGER)
+        }))
+    for component in packages['added']:
+        commands.append(remove_package(component))
+
+    services = diff['services']
+    for component in services['removed']:
+        if component.get('status') == 'active':
+            commands.append(f"systemctl start {shlex.quote(component['name'])}")
+    for change in services['changed']:
+        status = change['changes'].get('status')
+        if status and status['from'] == 'active':
+            commands.append(f"systemctl start {shlex.quote(change['name'])}")
+        elif status and status['to'] == 'active':
+            commands.append(f"systemctl stop {shlex.quote(change['name'])}")
+        if 'version' in change['changes']:
+            manual.append({'section': 'services', 'name': change['name'], 'changes': change['changes']})
+    for component in services['added']:
+        manual.append({'section': 'services', 'name': component.get('name'), 'changes': 'not in baseline'})
+
+    variables = diff['environmentVariables']
+    for entry in variables['removed']:
+        commands.append(set_variable(entry['name'], entry['value']))
+    for entry in variables['changed']:
+        commands.append(set_variable(entry['name'], entry['changes']['value']['from']))
+    for entry in variables['added']:
+        commands.append(unset_variable(entry['name']))
+
+    drivers = diff['drivers']
+    for kind in ('added', 'removed', 'changed'):
+        for component in drivers[kind]:
+            manual.append({'section': 'drivers', 'name': component.get('name'), 'changes': component.get('changes', kind)})
+    for field, change in diff['system'].items():
+        manual.append({'section': 'system', 'name': field, 'changes': change})
+
+    return commands, manual
+
+def build_plan(baseline, current):
+    """Restore plan for one environment from its baseline and latest snapshots"""
+    diff = diff_snapshots(baseline, current)
+    commands, manual = remediation_steps(diff, baseline)
+    return {
+        'baselineSnapshotId': baseline['id'],
+        'currentSnapshotId': current['id'],
+        'commands': commands,
+        'manual': manual,
+        'script': build_script(commands) if commands else None,
+        'scriptHash': script_hash(commands) if commands else None
+    }
+
+def build_script(commands):
+    """Shell script that stops at the first failing step"""
+    return '\n'.join(['#!/bin/bash', 'set -euo pipefail'] + [f"echo {shlex.quote('>>> ' + c)}\n{c}" for c in commands])
+
+def script_hash(commands):
+    """Environments with the same steps share one SSM command"""
+    return hashlib.sha256('\n'.join(commands).encode('utf-8')).hexdigest()[:16]
@@ -0,0 +1,127 @@
+"""Canary-first waves of SSM restore commands with failure-rate halting.
+
+Environments are split into a canary wave followed by waves of `batchSize`.
+Within a wave, environments with identical steps in the same fleet target
+share one SendCommand (up to 50 instances each), which SSM runs with
+MaxConcurrency/MaxErrors; results are read back with ListCommandInvocations
+rather than one GetCommandInvocation per instance.
+"""
+import math
+import time
+from collections import defaultdict
+
+from rate_limiter import limiter_for
+
+# SSM SendCommand accepts at most 50 instance IDs per call
+MAX_COMMAND_TARGETS = 50
+
+COMMAND_TIMEOUT_SECONDS = 600
+POLL_INITIAL_DELAY = 2.0
+POLL_MAX_DELAY = 15.0
+
+TERMINAL_STATUSES = {'Success', 'Failed', 'TimedOut', 'Cancelled', 'Undeliverable', 'Terminated', 'DeliveryTimedOut', 'ExecutionTimedOut', 'AccessDenied'}
+
+def plan_waves(environment_ids, canary, batch_size):
+    """Canary wave, then fixed-size waves, in the given order"""
+    waves = []
+    if canary:
+        waves.append(environment_ids[:canary])
+    rest = environment_ids[canary:]
+    waves.extend(rest[start:start + batch_size] for start in range(0, len(rest), batch_size))
+    return [wave for wave in waves if wave]
+
+def halt_reason(canary, failed, finished, max_failure_rate):
+    """Why the rollout must stop after a wave, or None to continue"""
+    if canary and failed:
+        return f"Canary wave failed on {failed} of {finished} environments"
+    if finished and failed / finished > max_failure_rate:
+        return f"Failure rate {failed / finished:.0%} exceeds {max_failure_rate:.0%} ({failed} of {finished} environments)"
+    return None
+
+def command_batches(entries):
+    """Group wave entries by (fleet target, script) into SendCommand-sized batches"""
+    groups = defaultdict(list)
+    for entry in entries:
+        groups[(entry['fleetTarget'], entry['scriptHash'])].append(entry)
+
+    batches = []
+    for (target, _), group in groups.items():
+        batch, instances = [], 0
+        for entry in group:
+            if batch and instances + len(entry['instanceIds']) > MAX_COMMAND_TARGETS:
+                batches.append({'fleetTarget': target, 'entries': batch})
+                batch, instances = [], 0
+            batch.append(entry)
+            instances += len(entry['instanceIds'])
+        batches.append({'fleetTarget': target, 'entries': batch})
+    return batches
+
+def run_batch(ssm, scope, batch, concurrency, max_failure_rate, comment, deadline=None):
+    """Send one batch's script and wait for every invocation; returns (command id, status by instance)"""
+    instance_ids = [i for entry in batch['entries'] for i in entry['instanceIds']]
+    response = limiter_for('ssm:SendCommand', scope).call(
+        ssm.send_command,
+        InstanceIds=instance_ids,
+        DocumentName='AWS-RunShellScript',
+        Parameters={'commands': [batch['entries'][0]['script']]},
+        TimeoutSeconds=COMMAND_TIMEOUT_SECONDS,
+        MaxConcurrency=str(concurrency),
+        # SSM stops sending to further instances once this many have failed
+        MaxErrors=str(max(1, math.floor(len(instance_ids) * max_failure_rate))),
+        Comment=comment[:100]
+    )
+    command_id = response['Command']['CommandId']
+    return command_id, wait_for_invocations(ssm, scope, command_id, instance_ids, deadline)
+
+def wait_for_invocations(ssm, scope, command_id, instance_ids, deadline=None):
+    """Poll ListCommandInvocations until every instance reaches a terminal status.
+
+    At `deadline` (epoch seconds) the command is cancelled and instances still
+    pending are reported TimedOut, so the caller never outlives its invocation.
+    """
+    statuses = {}
+    deadline = min(deadline or float('inf'), time.time() + COMMAND_TIMEOUT_SECONDS + 60)
+    delay = POLL_INITIAL_DELAY
+    while time.time() < deadline:
+        # Checked before listing so no invocation can finish unseen in between
+        finished = command_finished(ssm, scope, command_id)
+        statuses.update(invocation_statuses(ssm, scope, command_id))
+        if all(statuses.get(instance_id) in TERMINAL_STATUSES for instance_id in instance_ids):
+            return statuses
+        if finished:
+            # Instances SSM never sent to once MaxErrors was reached
+            return settle(statuses, instance_ids, 'Cancelled')
+        time.sleep(max(0, min(delay, deadline - time.time())))
+        delay = min(POLL_MAX_DELAY, delay * 1.5)
+    cancel_command(ssm, scope, command_id)
+    return settle(statuses, instance_ids, 'TimedOut')
+
+def cancel_command(ssm, scope, command_id):
+    """Stop a command that is being abandoned (best effort)"""
+    try:
+        limiter_for('ssm:CancelCommand', scope).call(ssm.cancel_command, CommandId=command_id)
+    except Exception as e:
+        print(f"Error cancelling command {command_id}: {e}")
+
+def invocation_statuses(ssm, scope, command_id):
+    statuses = {}
+    kwargs = {'CommandId': command_id}
+    while True:
+        response = limiter_for('ssm:ListCommandInvocations', scope).call(ssm.list_command_invocations, **kwargs)
+        for invocation in response.get('CommandInvocations', []):
+            statuses[invocation['InstanceId']] = invocation['Status']
+        if not response.get('NextToken'):
+            return statuses
+        kwargs['NextToken'] = response['NextToken']
+
+def command_finished(ssm, scope, command_id):
+    response = limiter_for('ssm:ListCommands', scope).call(ssm.list_commands, CommandId=command_id)
+    commands = response.get('Commands', [])
+    return bool(commands) and commands[0]['Status'] in TERMINAL_STATUSES
+
+def settle(statuses, instance_ids, default):
+    """Status per instance, with `default` for any still pending"""
+    return {
+        instance_id: statuses[instance_id] if statuses.get(instance_id) in TERMINAL_STATUSES else default
+        for instance_id in instance_ids
+    }
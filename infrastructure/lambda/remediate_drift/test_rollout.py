@@ -0,0 +1,79 @@
+"""Restore plans, wave order, halting and SendCommand batching."""
+import pytest
+
+def entry(environment_id, instances, target='local', script='s1'):
+    return {
+        'environmentId': environment_id, 'fleetTarget': target, 'scriptHash': script,
+        'instanceIds': [f"i-{environment_id}-{n}" for n in range(instances)]
+    }
+
+def snapshot(snapshot_id, numpy):
+    return {
+        'id': snapshot_id, 'environmentId': 'env-1', 'capturedAt': '2077.10.23 14:05:00',
+        'packages': [{'name': 'numpy', 'version': numpy}, {'name': 'driver-tools', 'version': '1.0', 'manager': 'rpm'}]
+    }
+
+@pytest.fixture
+def rollout(load_lambda):
+    return load_lambda('remediate_drift', 'rollout')
+
+@pytest.fixture
+def plan(load_lambda):
+    return load_lambda('remediate_drift', 'plan')
+
+def test_waves_start_with_the_canary(rollout):
+    ids = [f"env-{n}" for n in range(7)]
+    assert rollout.plan_waves(ids, 1, 3) == [['env-0'], ['env-1', 'env-2', 'env-3'], ['env-4', 'env-5', 'env-6']]
+    assert rollout.plan_waves(ids, 0, 5) == [ids[:5], ids[5:]]
+
+def test_any_canary_failure_halts(rollout):
+    assert rollout.halt_reason(True, 1, 1, 1.0) == 'Canary wave failed on 1 of 1 environments'
+    assert rollout.halt_reason(True, 0, 1, 0.0) is None
+
+def test_failure_rate_halts_only_above_the_limit(rollout):
+    assert rollout.halt_reason(False, 1, 10, 0.1) is None
+    assert rollout.halt_reason(False, 2, 10, 0.1) == 'Failure rate 20% exceeds 10% (2 of 10 environments)'
+    assert rollout.halt_reason(False, 0, 0, 0.0) is None
+
+def test_batches_group_by_target_and_script(rollout):
+    entries = [entry('a', 1), entry('b', 1, script='s2'), entry('c', 1), entry('d', 1, target='remote')]
+    batches = rollout.command_batches(entries)
+    assert [(b['fleetTarget'], [e['environmentId'] for e in b['entries']]) for b in batches] == [
+        ('local', ['a', 'c']), ('local', ['b']), ('remote', ['d'])
+    ]
+
+def test_batches_stay_within_the_command_target_limit(rollout):
+    entries = [entry('a', 30), entry('b', 20), entry('c', 1), entry('d', 50)]
+    batches = rollout.command_batches(entries)
+    assert [[e['environmentId'] for e in b['entries']] for b in batches] == [['a', 'b'], ['c'], ['d']]
+    assert all(sum(len(e['instanceIds']) for e in b['entries']) <= rollout.MAX_COMMAND_TARGETS for b in batches)
+
+def test_plan_pins_changed_packages_back_to_the_baseline(plan):
+    baseline, current = snapshot('snap-1', '1.24.0'), snapshot('snap-2', '1.26.0')
+    current['packages'].append({'name': 'scipy', 'version': '1.11.0'})
+    result = plan.build_plan(baseline, current)
+    assert result['commands'] == ["pip3 install --no-deps numpy==1.24.0", "pip3 uninstall -y scipy"]
+    assert result['manual'] == []
+    assert result['scriptHash'] == plan.script_hash(result['commands'])
+    assert result['script'].startswith('#!/bin/bash\nset -euo pipefail')
+
+def test_environment_beyond_one_command_is_skipped(load_lambda, monkeypatch):
+    index = load_lambda('remediate_drift')
+    environment = {'id': 'env-1', 'labName': 'Big Lab', 'discoveredInstanceIds': [f"i-{n}" for n in range(51)]}
+
+    class Environments:
+        def get_item(self, Key):
+            return {'Item': environment}
+
+    monkeypatch.setattr(index, 'environments_table', Environments())
+    monkeypatch.setattr(index, 'get_baseline_snapshot', lambda env: snapshot('snap-1', '1.24.0'))
+    monkeypatch.setattr(index, 'get_latest_snapshot', lambda env_id: snapshot('snap-2', '1.26.0'))
+
+    skipped = index.plan_environment('env-1')
+    assert skipped['status'] == 'SKIPPED'
+    assert skipped['reason'] == '51 instances exceed the 50 one restore command can target'
+
+    environment['discoveredInstanceIds'] = environment['discoveredInstanceIds'][:50]
+    planned = index.plan_environment('env-1')
+    assert planned['status'] == 'PLANNED'
+    assert len(planned['instanceIds']) == 50
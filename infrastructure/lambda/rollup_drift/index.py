@@ -0,0 +1,333 @@
+import json
+import os
+import random
+import threading
+import time
+import boto3
+from botocore.exceptions import ClientError
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from boto3.dynamodb.types import TypeDeserializer
+
+from rollups import (
+    COUNTERS, DAILY, HOURLY, LEVEL, LEVEL_BUCKET, bucket_of, drift_deltas,
+    expires_at, open_points, series_key
+)
+from versioning import bump_version, trend_counter
+
+dynamodb = boto3.resource('dynamodb')
+deserializer = TypeDeserializer()
+
+environments_table = dynamodb.Table(os.environ['ENVIRONMENTS_TABLE'])
+snapshots_table = dynamodb.Table(os.environ['SNAPSHOTS_TABLE'])
+drift_events_table = dynamodb.Table(os.environ['DRIFT_EVENTS_TABLE'])
+rollups_table = dynamodb.Table(os.environ['DRIFT_ROLLUPS_TABLE'])
+
+MAX_WORKERS = 16
+GRANULARITIES = (HOURLY, DAILY)
+
+# Markers of applied stream records outlive the stream's 24h retention
+APPLIED_MARKER_SECONDS = 2 * 24 * 3600
+# Records touching the same rows conflict inside a transaction; retried with jitter
+TRANSACTION_ATTEMPTS = 8
+BASE_BACKOFF = 0.05
+
+# environmentId -> facility, shared across warm invocations
+facility_cache = {}
+
+def handler(event, context):
+    """Maintain drift rollups from table streams, or rebuild them with {"mode": "backfill"}"""
+    try:
+        event = event or {}
+        if event.get('mode') == 'backfill':
+            result = backfill(event.get('environmentIds'))
+        else:
+            result = apply_stream_records(event.get('Records', []))
+
+        return {
+            'statusCode': 200,
+            'body': json.dumps(result)
+        }
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        # Re-raise for stream batches so the event source mapping retries them
+        if event.get('Records'):
+            raise
+        return {
+            'statusCode': 500,
+            'body': json.dumps({
+                'error': 'VAULT-TEC SYSTEMS ERROR: Drift rollup failed',
+                'details': str(e)
+            })
+        }
+
+def apply_stream_records(records):
+    """Fold drift event changes and new snapshots into their hourly and daily rows.
+
+    New drift events are counted where they were detected. Any change to
+    whether an event is open (detected, resolved, severity changed while
+    open, deleted) moves openPoints in the bucket it happened in and on the
+    level rows, so the trend follows the drift score down as well as up.
+
+    Each record is applied in one transaction with a marker keyed by its
+    stream eventID, so records of a retried (or bisected) batch that were
+    already applied are skipped instead of counted again.
+    """
+    events = []
+    for record in records:
+        source = record.get('eventSourceARN', '')
+        if f":table/{snapshots_table.name}/" in source:
+            if record.get('eventName') != 'INSERT':
+                continue
+            item = deserialize(record['dynamodb'].get('NewImage') or record['dynamodb'].get('Keys'))
+            events.append((record['eventID'], item['environmentId'], item['capturedAt'], {'snapshots': 1}))
+        elif f":table/{drift_events_table.name}/" in source:
+            event = drift_event_change(record)
+            if event:
+                events.append(event)
+
+    if not events:
+        return {'records': len(records), 'applied': 0}
+
+    facilities = get_facilities({environment_id for _, environment_id, _, _ in events})
+
+    def apply(event):
+        event_id, environment_id, timestamp, deltas = event
+        facility = facilities.get(environment_id)
+        updates = [row_update(key, deltas) for key in rollup_keys(environment_id, facility, timestamp)]
+        if deltas.get('openPoints'):
+            updates += [row_update(key, {'openPoints': deltas['openPoints']}) for key in level_keys(environment_id, facility)]
+        return apply_once(event_id, updates)
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        applied = sum(executor.map(apply, events))
+
+    bump_version(*[trend_counter(environment_id) for environment_id in {e for _, e, _, _ in events}])
+    return {'records': len(records), 'applied': applied, 'duplicates': len(events) - applied}
+
+def deserialize(image):
+    return {k: deserializer.deserialize(v) for k, v in (image or {}).items()}
+
+def drift_event_change(record):
+    """(eventID, environmentId, timestamp, deltas) for one drift events record, or None if nothing changes"""
+    new = deserialize(record['dynamodb'].get('NewImage'))
+    old = deserialize(record['dynamodb'].get('OldImage'))
+    inserted = record.get('eventName') == 'INSERT'
+
+    deltas = drift_deltas(new.get('severity')) if inserted else {}
+    change = open_points(new) - open_points(old)
+    if change:
+        deltas['openPoints'] = change
+    if not deltas:
+        return None
+
+    item = new or old
+    if inserted:
+        timestamp = item['detectedAt']
+    elif new.get('resolved') and not old.get('resolved') and new.get('resolvedAt'):
+        timestamp = new['resolvedAt']
+    else:
+        timestamp = record_time(record)
+    return record['eventID'], item['environmentId'], timestamp, deltas
+
+def record_time(record):
+    """When the stream record was written, in the tables' timestamp format"""
+    created = record['dynamodb'].get('ApproximateCreationDateTime')
+    moment = datetime.fromtimestamp(float(created)) if created else datetime.now()
+    return moment.strftime('%Y.%m.%d %H:%M:%S')
+
+def level_keys(environment_id, facility):
+    """Level rows one open-weight change moves"""
+    yield series_key('env', environment_id, LEVEL), LEVEL_BUCKET
+    if facility:
+        yield series_key('facility', facility, LEVEL), LEVEL_BUCKET
+
+def rollup_keys(environment_id, facility, timestamp):
+    """(series, bucket) pairs one event contributes to"""
+    for granularity in GRANULARITIES:
+        bucket = bucket_of(timestamp, granularity)
+        yield series_key('env', environment_id, granularity), bucket
+        if facility:
+            yield series_key('facility', facility, granularity), bucket
+
+def apply_once(event_id, updates):
+    """Apply one record's row updates with its marker; False if it was applied before"""
+    marker = {
+        'Put': {
+            'TableName': rollups_table.name,
+            'Item': {'series': f"applied#{event_id}", 'bucket': '-', 'ttl': int(time.time()) + APPLIED_MARKER_SECONDS},
+            'ConditionExpression': 'attribute_not_exists(series)'
+        }
+    }
+    for attempt in range(TRANSACTION_ATTEMPTS):
+        try:
+            # The resource's client takes plain Python values, like the Table methods
+            rollups_table.meta.client.transact_write_items(TransactItems=[marker] + [{'Update': u} for u in updates])
+            return True
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'TransactionCanceledException':
+                raise
+            reasons = [reason.get('Code') for reason in e.response.get('CancellationReasons', [])]
+            if reasons and reasons[0] == 'ConditionalCheckFailed':
+                return False
+            if 'TransactionConflict' not in reasons or attempt == TRANSACTION_ATTEMPTS - 1:
+                raise
+            time.sleep(random.uniform(0, BASE_BACKOFF * 2 ** attempt))
+
+def row_update(key, deltas):
+    """Update adding counter deltas to one rollup row"""
+    series, bucket = key
+    granularity = series.rsplit('#', 1)[1]
+    names = {f"#c{n}": field for n, field in enumerate(deltas)}
+    values = {f":c{n}": value for n, value in enumerate(deltas.values())}
+    update = 'ADD ' + ', '.join(f"#c{n} :c{n}" for n in range(len(deltas)))
+    ttl = expires_at(bucket, granularity)
+    if ttl:
+        update += ' SET #ttl = if_not_exists(#ttl, :ttl)'
+        names['#ttl'] = 'ttl'
+        values[':ttl'] = ttl
+    return {
+        'TableName': rollups_table.name,
+        'Key': {'series': series, 'bucket': bucket},
+        'UpdateExpression': update,
+        'ExpressionAttributeNames': names,
+        'ExpressionAttributeValues': values
+    }
+
+def get_facilities(environment_ids):
+    """Facility of each environment, from the warm cache or one batch read"""
+    missing = [environment_id for environment_id in environment_ids if environment_id not in facility_cache]
+    for start in range(0, len(missing), 100):
+        request = {environments_table.name: {
+            'Keys': [{'id': environment_id} for environment_id in missing[start:start + 100]],
+            'ProjectionExpression': 'id, facility'
+        }}
+        while request:
+            response = dynamodb.batch_get_item(RequestItems=request)
+            for item in response['Responses'].get(environments_table.name, []):
+                facility_cache[item['id']] = item.get('facility')
+            request = response.get('UnprocessedKeys')
+    return {environment_id: facility_cache.get(environment_id) for environment_id in environment_ids}
+
+def query_all(table, environment_id, projection, names=None):
+    """Every item of one environment partition"""
+    kwargs = {
+        'KeyConditionExpression': 'environmentId = :env_id',
+        'ExpressionAttributeValues': {':env_id': environment_id},
+        'ProjectionExpression': projection
+    }
+    if names:
+        kwargs['ExpressionAttributeNames'] = names
+    while True:
+        response = table.query(**kwargs)
+        yield from response.get('Items', [])
+        if 'LastEvaluatedKey' not in response:
+            return
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def environment_rollups(environment_id, facility):
+    """Complete rollup rows for one environment rebuilt from raw history"""
+    totals = defaultdict(Counter)
+    projection = 'detectedAt, severity, #r, resolvedAt'
+    for item in query_all(drift_events_table, environment_id, projection, {'#r': 'resolved'}):
+        points = open_points({'severity': item.get('severity')})
+        for key in rollup_keys(environment_id, facility, item['detectedAt']):
+            totals[key].update({**drift_deltas(item.get('severity')), 'openPoints': points})
+        if item.get('resolved'):
+            # Resolved where it was resolved; events without resolvedAt only ever counted as resolved
+            for key in rollup_keys(environment_id, facility, item.get('resolvedAt') or item['detectedAt']):
+                totals[key]['openPoints'] -= points
+        else:
+            for key in level_keys(environment_id, facility):
+                totals[key]['openPoints'] += points
+    for item in query_all(snapshots_table, environment_id, 'capturedAt'):
+        for key in rollup_keys(environment_id, facility, item['capturedAt']):
+            totals[key]['snapshots'] += 1
+    return totals
+
+def replace_series(series, rows):
+    """Overwrite one series with rebuilt rows and delete buckets that no longer exist"""
+    existing = set()
+    kwargs = {
+        'KeyConditionExpression': '#s = :series',
+        'ExpressionAttributeValues': {':series': series},
+        # BUCKET is a DynamoDB reserved word
+        'ProjectionExpression': '#b',
+        'ExpressionAttributeNames': {'#s': 'series', '#b': 'bucket'}
+    }
+    while True:
+        response = rollups_table.query(**kwargs)
+        existing.update(item['bucket'] for item in response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            break
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    granularity = series.rsplit('#', 1)[1]
+    with rollups_table.batch_writer() as writer:
+        for bucket, counters in rows.items():
+            item = {'series': series, 'bucket': bucket, **{field: counters.get(field, 0) for field in COUNTERS}}
+            ttl = expires_at(bucket, granularity)
+            if ttl:
+                if ttl < time.time():
+                    continue
+                item['ttl'] = ttl
+            writer.put_item(Item=item)
+        for bucket in existing - set(rows):
+            writer.delete_item(Key={'series': series, 'bucket': bucket})
+
+def backfill(environment_ids=None):
+    """Rebuild rollups from raw drift events and snapshots, one environment at a time.
+
+    Facility series are only rebuilt by a full backfill, since they need every
+    environment's history.
+    """
+    started = time.perf_counter()
+    if environment_ids:
+        facilities = get_facilities(environment_ids)
+    else:
+        facilities = {}
+        kwargs = {'ProjectionExpression': 'id, facility'}
+        while True:
+            response = environments_table.scan(**kwargs)
+            for item in response.get('Items', []):
+                facilities[item['id']] = item.get('facility')
+            if 'LastEvaluatedKey' not in response:
+                break
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    facility_totals = defaultdict(Counter)
+    lock = threading.Lock()
+
+    def rebuild(environment_id):
+        totals = environment_rollups(environment_id, facilities.get(environment_id))
+        by_series = defaultdict(dict)
+        for (series, bucket), counters in totals.items():
+            if series.startswith('facility#'):
+                with lock:
+                    facility_totals[(series, bucket)].update(counters)
+            else:
+                by_series[series][bucket] = counters
+        for granularity in GRANULARITIES + (LEVEL,):
+            series = series_key('env', environment_id, granularity)
+            replace_series(series, by_series.get(series, {}))
+        return sum(len(series_rows) for series_rows in by_series.values())
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        rows = sum(executor.map(rebuild, list(facilities)))
+
+    if not environment_ids:
+        by_series = defaultdict(dict)
+        for (series, bucket), counters in facility_totals.items():
+            by_series[series][bucket] = counters
+        for series, series_rows in by_series.items():
+            replace_series(series, series_rows)
+
+    bump_version(*[trend_counter(environment_id) for environment_id in facilities])
+    return {
+        'environments': len(facilities),
+        'rows': rows,
+        'facilities': len({series for series, _ in facility_totals}) if not environment_ids else 0,
+        'seconds': round(time.perf_counter() - started, 3)
+    }
@@ -0,0 +1,50 @@
+"""Drift rollups follow the open-event weight up on detection and down on resolution."""
+import pytest
+from boto3.dynamodb.types import TypeSerializer
+
+from rollups import levels
+
+serializer = TypeSerializer()
+
+OPEN_CRITICAL = {'environmentId': 'env-1', 'detectedAt': '2077.10.23 14:05:00', 'severity': 'CRITICAL', 'resolved': False}
+
+def record(name, new=None, old=None, event_id='e-1', created=None):
+    data = {}
+    if new:
+        data['NewImage'] = {k: serializer.serialize(v) for k, v in new.items()}
+    if old:
+        data['OldImage'] = {k: serializer.serialize(v) for k, v in old.items()}
+    if created:
+        data['ApproximateCreationDateTime'] = created
+    return {'eventID': event_id, 'eventName': name, 'dynamodb': data}
+
+@pytest.fixture
+def rollup(load_lambda):
+    return load_lambda('rollup_drift')
+
+def test_new_open_event_counts_and_raises_the_level(rollup):
+    change = rollup.drift_event_change(record('INSERT', new=OPEN_CRITICAL))
+    assert change == ('e-1', 'env-1', '2077.10.23 14:05:00', {'events': 1, 'critical': 1, 'openPoints': 30})
+
+def test_resolution_lowers_the_level_where_it_was_resolved(rollup):
+    resolved = {**OPEN_CRITICAL, 'resolved': True, 'resolvedAt': '2077.10.24 09:00:00'}
+    change = rollup.drift_event_change(record('MODIFY', new=resolved, old=OPEN_CRITICAL))
+    assert change == ('e-1', 'env-1', '2077.10.24 09:00:00', {'openPoints': -30})
+
+def test_updates_that_leave_an_event_open_change_nothing(rollup):
+    seen_again = {**OPEN_CRITICAL, 'lastSeenAt': '2077.10.24 09:00:00'}
+    assert rollup.drift_event_change(record('MODIFY', new=seen_again, old=OPEN_CRITICAL)) is None
+
+def test_severity_change_while_open_moves_the_difference(rollup):
+    downgraded = {**OPEN_CRITICAL, 'severity': 'WARNING'}
+    _, _, _, deltas = rollup.drift_event_change(record('MODIFY', new=downgraded, old=OPEN_CRITICAL, created=1e9))
+    assert deltas == {'openPoints': -20}
+
+def test_deleting_an_open_event_lowers_the_level(rollup):
+    _, _, _, deltas = rollup.drift_event_change(record('REMOVE', old=OPEN_CRITICAL, created=1e9))
+    assert deltas == {'openPoints': -30}
+
+def test_levels_walk_back_from_the_current_weight():
+    buckets = ['2077.10.21', '2077.10.22', '2077.10.23']
+    rows = {'2077.10.22': {'openPoints': 40}, '2077.10.23': {'openPoints': -30}}
+    assert levels(buckets, rows, 13) == {'2077.10.21': 3, '2077.10.22': 43, '2077.10.23': 13}
@@ -0,0 +1,208 @@
+import hashlib
+import json
+import os
+import boto3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import environment_search
+import federation
+from rate_limiter import NO_RETRY_CONFIG, limiter_for
+from versioning import ENVIRONMENTS, bump_version
+
+dynamodb = boto3.resource('dynamodb')
+
+environments_table = dynamodb.Table(os.environ['ENVIRONMENTS_TABLE'])
+
+MAX_WORKERS = 16
+# DescribeWorkspaces pages and DescribeWorkspaceBundles id lists top out at 25
+PAGE_SIZE = 25
+# Per-target deadline for one sweep (the function times out at 300s)
+SWEEP_TIMEOUT = 240
+
+def handler(event, context):
+    """Sync WorkSpaces and their bundles from every fleet target into the environments table"""
+    try:
+        environments = scan_workspace_environments()
+        linked = {env['workspaceId']: env for env in environments if env.get('workspaceId')}
+
+        results, failures = federation.fan_out(sweep_workspaces, list(federation.TARGETS.values()), timeout=SWEEP_TIMEOUT)
+
+        timestamp = datetime.now().strftime('%Y.%m.%d %H:%M:%S')
+        inserts, updates, seen = [], [], set()
+        for target_name, workspaces in results.items():
+            for record in workspaces:
+                seen.add(record['workspaceId'])
+                sync_hash = fingerprint(record)
+                env = linked.get(record['workspaceId'])
+                if env is None:
+                    inserts.append(new_environment(record, sync_hash, target_name, timestamp))
+                elif env.get('workspaceSyncHash') != sync_hash:
+                    updates.append((env['id'], record, sync_hash))
+
+        changed = len(updates)
+
+        # WorkSpaces gone from a target that was fully swept are kept, marked terminated
+        for workspace_id, env in linked.items():
+            stored = env.get('workspace') or {}
+            target_name = env.get('fleetTarget') or federation.LOCAL
+            if workspace_id in seen or target_name not in results or stored.get('state') == 'TERMINATED':
+                continue
+            record = {**stored, 'workspaceId': workspace_id, 'state': 'TERMINATED'}
+            updates.append((env['id'], record, fingerprint(record)))
+
+        # New items go in batches; existing items only get their workspace
+        # fields set, so captures, freezes and drift scores are never overwritten
+        with environments_table.batch_writer() as writer:
+            for item in inserts:
+                writer.put_item(Item=item)
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            list(executor.map(lambda update: write_workspace(*update), updates))
+        if inserts or updates:
+            bump_version(ENVIRONMENTS)
+
+        result = {
+            'workspaces': len(seen),
+            'inserted': len(inserts),
+            'updated': changed,
+            'terminated': len(updates) - changed,
+            'unchanged': len(seen) - len(inserts) - changed,
+            'unavailableTargets': failures
+        }
+        print(json.dumps(result))
+        return {
+            'statusCode': 200,
+            'body': json.dumps(result)
+        }
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'error': str(e)})
+        }
+
+def sweep_workspaces(target):
+    """Every WorkSpace in a target with its bundle, directories swept in parallel"""
+    workspaces = federation.client('workspaces', target, NO_RETRY_CONFIG)
+    scope = federation.limiter_scope(target)
+
+    directory_ids = [
+        directory['DirectoryId']
+        for page in paginate(workspaces.describe_workspace_directories, 'workspaces:DescribeWorkspaceDirectories', scope, 'Directories')
+        for directory in page
+    ]
+
+    def list_directory(directory_id):
+        return [
+            workspace
+            for page in paginate(workspaces.describe_workspaces, 'workspaces:DescribeWorkspaces', scope, 'Workspaces',
+                                 DirectoryId=directory_id, Limit=PAGE_SIZE)
+            for workspace in page
+        ]
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        found = [workspace for listed in executor.map(list_directory, directory_ids) for workspace in listed]
+
+        bundle_ids = sorted({workspace['BundleId'] for workspace in found if workspace.get('BundleId')})
+        chunks = [bundle_ids[start:start + PAGE_SIZE] for start in range(0, len(bundle_ids), PAGE_SIZE)]
+        bundles = {}
+        for listed in executor.map(lambda chunk: describe_bundles(workspaces, scope, chunk), chunks):
+            bundles.update(listed)
+
+    return [workspace_record(workspace, bundles.get(workspace.get('BundleId')), target) for workspace in found]
+
+def paginate(operation, api, scope, key, **kwargs):
+    """Pages of one WorkSpaces list call, each page through the shared limiter"""
+    limiter = limiter_for(api, scope)
+    while True:
+        response = limiter.call(operation, **kwargs)
+        yield response.get(key, [])
+        if not response.get('NextToken'):
+            return
+        kwargs['NextToken'] = response['NextToken']
+
+def describe_bundles(workspaces, scope, bundle_ids):
+    return {
+        bundle['BundleId']: bundle
+        for page in paginate(workspaces.describe_workspace_bundles, 'workspaces:DescribeWorkspaceBundles', scope, 'Bundles',
+                             BundleIds=bundle_ids)
+        for bundle in page
+    }
+
+def workspace_record(workspace, bundle, target):
+    """Fields of a WorkSpace (and its bundle) stored on its environment"""
+    properties = workspace.get('WorkspaceProperties', {})
+    record = {
+        'workspaceId': workspace['WorkspaceId'],
+        'directoryId': workspace.get('DirectoryId'),
+        'userName': workspace.get('UserName'),
+        'computerName': workspace.get('ComputerName'),
+        'ipAddress': workspace.get('IpAddress'),
+        'state': workspace.get('State'),
+        'runningMode': properties.get('RunningMode'),
+        'computeType': properties.get('ComputeTypeName'),
+        'rootVolumeGib': properties.get('RootVolumeSizeGib'),
+        'userVolumeGib': properties.get('UserVolumeSizeGib'),
+        'region': target['region'],
+        'bundle': {'id': workspace.get('BundleId')}
+    }
+    if bundle:
+        record['bundle'].update({
+            'name': bundle.get('Name'),
+            'description': bundle.get('Description'),
+            'computeType': bundle.get('ComputeType', {}).get('Name')
+        })
+    return record
+
+def fingerprint(record):
+    """Stable hash of a synced record; unchanged WorkSpaces are not rewritten"""
+    return hashlib.sha256(json.dumps(record, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:16]
+
+def new_environment(record, sync_hash, target_name, timestamp):
+    """Environment item for a WorkSpace not linked to any environment yet"""
+    item = {
+        'id': f"env-{record['workspaceId']}",
+        'labName': record.get('computerName') or record['workspaceId'],
+        'facility': f"WorkSpaces {record['region']}",
+        'researcher': {'name': record.get('userName') or 'Unassigned', 'role': 'WorkSpaces User'},
+        'experimentId': 'UNASSIGNED',
+        'experimentName': 'Unassigned',
+        'status': 'ACTIVE',
+        'driftScore': 0,
+        'constraints': [],
+        'createdAt': timestamp,
+        'source': 'workspaces',
+        'workspaceId': record['workspaceId'],
+        'workspace': record,
+        'workspaceSyncHash': sync_hash
+    }
+    if target_name != federation.LOCAL:
+        item['fleetTarget'] = target_name
+    item.update(environment_search.search_keys(item))
+    return item
+
+def scan_workspace_environments():
+    """Id, target and synced WorkSpace fields of every environment"""
+    items = []
+    kwargs = {
+        'ProjectionExpression': 'id, fleetTarget, workspaceId, workspace, workspaceSyncHash'
+    }
+    while True:
+        response = environments_table.scan(**kwargs)
+        items.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            return items
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def write_workspace(environment_id, record, sync_hash):
+    """Store the synced WorkSpace fields on an existing environment item"""
+    try:
+        environments_table.update_item(
+            Key={'id': environment_id},
+            UpdateExpression='SET workspace = :workspace, workspaceSyncHash = :hash',
+            ConditionExpression='attribute_exists(id)',
+            ExpressionAttributeValues={':workspace': record, ':hash': sync_hash}
+        )
+    except Exception as e:
+        print(f"Error writing WorkSpace {record['workspaceId']} to {environment_id}: {e}")
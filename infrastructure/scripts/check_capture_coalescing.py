@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""Fire concurrent capture requests at one environment and check they coalesce.
+
+Sends N simultaneous POST /environments/{id}/snapshot calls (each with its own
+Idempotency-Key) and verifies that exactly one capture ran: every completed
+response carries the same snapshot id, and, when --instance-id is given, SSM
+recorded exactly one command for the instance during the run.
+
+API captures are queued, so a capture slower than the API's attach wait
+answers 202 (`queued` for the request that enqueued it, `coalesced` for the
+rest). Like the console, each request is then re-sent with its own key until
+the capture's result comes back. The leader is the request that enqueued the
+capture (202 `queued`) or ran it inline (200 without `coalesced`).
+
+    python scripts/check_capture_coalescing.py --api-url https://xxxxx.execute-api.us-east-1.amazonaws.com/prod \\
+      --token "$TOKEN" --environment-id env-mariposa-07 --instance-id i-0123456789abcdef0
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+# Queued captures are followed this long before the request counts as unfinished
+FOLLOW_SECONDS = 600
+FOLLOW_INTERVAL_SECONDS = 5
+
+def send(url, token, key):
+    """One POST with the given Idempotency-Key; returns (status, body)"""
+    request = urllib.request.Request(url, method='POST', data=b'', headers={
+        'Authorization': f"Bearer {token}",
+        'Idempotency-Key': key
+    })
+    try:
+        with urllib.request.urlopen(request, timeout=60) as response:
+            return response.status, json.loads(response.read() or b'{}')
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or b'{}')
+
+def post_capture(url, token, barrier):
+    """One capture, followed with the same key while it is queued; returns (status, body, led)"""
+    key = str(uuid.uuid4())
+    barrier.wait()
+    status, body = send(url, token, key)
+    led = (status == 202 and body.get('queued')) or (status == 200 and not body.get('coalesced'))
+    deadline = time.time() + FOLLOW_SECONDS
+    while status == 202 and time.time() < deadline:
+        time.sleep(FOLLOW_INTERVAL_SECONDS)
+        status, body = send(url, token, key)
+    return status, body, bool(led)
+
+def count_ssm_commands(instance_id, since, region=None):
+    """SSM commands sent to an instance since the given time"""
+    import boto3
+    ssm = boto3.client('ssm', region_name=region)
+    kwargs = {
+        'InstanceId': instance_id,
+        'Filters': [{'key': 'InvokedAfter', 'value': since.strftime('%Y-%m-%dT%H:%M:%SZ')}]
+    }
+    count = 0
+    while True:
+        response = ssm.list_commands(**kwargs)
+        count += len(response.get('Commands', []))
+        if not response.get('NextToken'):
+            return count
+        kwargs['NextToken'] = response['NextToken']
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that concurrent snapshot captures coalesce')
+    parser.add_argument('--api-url', required=True, help='API base URL including the stage')
+    parser.add_argument('--token', required=True, help='Cognito IdToken')
+    parser.add_argument('--environment-id', required=True)
+    parser.add_argument('--instance-id', help='Instance to count SSM commands for')
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--region')
+    args = parser.parse_args()
+
+    url = f"{args.api_url.rstrip('/')}/environments/{args.environment_id}/snapshot"
+    barrier = threading.Barrier(args.requests)
+    started = datetime.now(timezone.utc)
+
+    with ThreadPoolExecutor(max_workers=args.requests) as executor:
+        results = list(executor.map(
+            lambda _: post_capture(url, args.token, barrier), range(args.requests)
+        ))
+
+    statuses = Counter(status for status, _, _ in results)
+    snapshot_ids = {
+        body['snapshot']['id'] for status, body, _ in results
+        if status == 200 and isinstance(body.get('snapshot'), dict)
+    }
+    leaders = sum(1 for _, _, led in results if led)
+
+    report = {
+        'requests': args.requests,
+        'statuses': dict(statuses),
+        'leaders': leaders,
+        'distinctSnapshots': sorted(snapshot_ids)
+    }
+    ok = leaders == 1 and len(snapshot_ids) == 1 and statuses == Counter({200: args.requests})
+    if args.instance_id:
+        report['ssmCommands'] = count_ssm_commands(args.instance_id, started, args.region)
+        ok = ok and report['ssmCommands'] == 1
+
+    print(json.dumps(report, indent=2))
+    sys.exit(0 if ok else 1)
+
+if __name__ == '__main__':
+    main()
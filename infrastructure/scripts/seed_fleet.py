@@ -0,0 +1,493 @@
+#!/usr/bin/env python3
+"""Generate and load reproducible synthetic fleets for scale testing.
+
+Writes environments, snapshot histories with a controlled drift rate, drift
+events and audit logs with batch_writer from parallel workers. Each
+environment's history ends within the 60 days before --end (default: today),
+so trends and dashboards have recent data. Output is a pure function of
+--seed, --end (or --start) and the size arguments, so benchmark datasets can
+be rebuilt exactly.
+
+    # DynamoDB Local as a stand-in (creates the tables first)
+    python scripts/seed_fleet.py --endpoint-url http://localhost:8000 --create-tables \\
+        --environments 5000 --snapshots 200
+
+    # Deployed tables
+    python scripts/seed_fleet.py --environments 5000 --snapshots 200 \\
+        --environments-table <EnvironmentsTable> --snapshots-table <SnapshotsTable> \\
+        --drift-events-table <DriftEventsTable> --audit-log-table <AuditLogTable> \\
+        --counters-table <CountersTable>
+
+    # The two original demo labs only
+    python scripts/seed_fleet.py --demo
+
+    # Add the environment search index keys to items written before the indexes
+    python scripts/seed_fleet.py --backfill-search-keys --environments-table <EnvironmentsTable>
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import boto3
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda', 'common', 'python'))
+from environment_search import search_keys
+
+TIMESTAMP_FORMAT = '%Y.%m.%d %H:%M:%S'
+
+FACILITIES = [
+    'West Tek Headquarters',
+    'Appalachia Research Facility',
+    'Galaxy News Radio Research Wing',
+    'Mariposa Military Base',
+    'Big MT Research Center',
+]
+RESEARCHERS = [
+    ('Dr. J. Whitmore', 'Senior Researcher'),
+    ('Dr. A. Petrov', 'Bio-Enhancement Lead'),
+    ('Dr. M. Chen', 'Chemical Engineer'),
+    ('Dr. R. Grey', 'Principal Investigator'),
+    ('Dr. K. Okoye', 'Nanotech Specialist'),
+    ('Dr. H. Tanaka', 'Atmospheric Scientist'),
+    ('Dr. L. Moreau', 'Virologist'),
+    ('Dr. S. Adeyemi', 'Computational Biologist'),
+]
+EXPERIMENT_PREFIXES = ['FEV', 'BIO', 'CHM', 'NANO', 'ATM', 'RAD']
+STATUSES = [('ACTIVE', 0.55), ('FROZEN', 0.25), ('STAGING', 0.1), ('ARCHIVED', 0.1)]
+
+BASE_PACKAGES = [
+    ('python3', '3.8.12'), ('numpy', '1.21.0'), ('scipy', '1.7.3'), ('pandas', '1.3.5'),
+    ('tensorflow', '2.8.0'), ('torch', '1.10.2'), ('matplotlib', '3.5.1'), ('scikit-learn', '1.0.2'),
+    ('biopython', '1.79'), ('h5py', '3.6.0'), ('wtek-datalogger', '2.1.0'), ('fev-analyzer', '4.7.2'),
+]
+BASE_SERVICES = [('sshd', '8.2p1'), ('docker', '20.10.21'), ('amazon-ssm-agent', '3.1.1188.0')]
+BASE_DRIVERS = [('NVIDIA Driver', '470.161.03'), ('CUDA', '11.4')]
+
+CONSTRAINT_TEMPLATES = [
+    'DO NOT update {name} beyond {version}',
+    '{name} must remain at {version}',
+    '{name} version locked for reproducibility',
+]
+
+# Fleet-wide change counters read by the ETag endpoints
+COUNTER_NAMES = ('environments', 'audit-log')
+
+DEMO_ENVIRONMENTS = [
+    {
+        'id': 'env-mariposa-07',
+        'labName': 'Lab Mariposa 07',
+        'facility': 'West Tek Headquarters',
+        'researcher': {
+            'name': 'Dr. J. Whitmore',
+            'role': 'Senior Researcher'
+        },
+        'experimentId': 'FEV-2077-ALPHA',
+        'experimentName': 'Forced Evolutionary Virus Batch 11-111',
+        'status': 'FROZEN',
+        'driftScore': 0,
+        'lastSnapshotAt': '2077.10.23 14:32:01',
+        'createdAt': '2077.08.15 09:00:00',
+        'constraints': [
+            'DO NOT update Python beyond 3.8.12',
+            'CUDA driver must remain at 11.4',
+            'FEV analyzer package is proprietary - no modifications'
+        ],
+        'cloudformationStackName': 'mariposa-07-stack',
+        'cloudformationStackStatus': 'UPDATE_COMPLETE'
+    },
+    {
+        'id': 'env-westtek-12',
+        'labName': 'Lab West Tek 12',
+        'facility': 'West Tek Headquarters',
+        'researcher': {
+            'name': 'Dr. A. Petrov',
+            'role': 'Bio-Enhancement Lead'
+        },
+        'experimentId': 'BIO-2078-SERIES9',
+        'experimentName': 'Bio-Enhancement Serum Series 9',
+        'status': 'ACTIVE',
+        'driftScore': 23,
+        'lastSnapshotAt': '2077.10.20 09:30:00',
+        'createdAt': '2077.09.01 10:15:00',
+        'constraints': [
+            'Serum synthesis requires exact temperature control',
+            'NumPy version locked for reproducibility'
+        ],
+        'cloudformationStackName': 'westtek-12-stack',
+        'cloudformationStackStatus': 'UPDATE_COMPLETE'
+    }
+]
+
+def weighted_choice(rng, options):
+    """Pick a value from (value, weight) pairs"""
+    roll = rng.random()
+    for value, weight in options:
+        roll -= weight
+        if roll <= 0:
+            return value
+    return options[-1][0]
+
+def bump_version_string(rng, version):
+    """Move one numeric segment of a version forward"""
+    parts = version.split('.')
+    numeric = [i for i, part in enumerate(parts) if part.isdigit()]
+    if not numeric:
+        return version + '.1'
+    index = rng.choice(numeric[-2:])
+    parts[index] = str(int(parts[index]) + rng.randint(1, 3))
+    return '.'.join(parts)
+
+def generate_environment(index, args):
+    """Build one environment and its full history; deterministic in (seed, index)"""
+    rng = random.Random(f"{args.seed}:{index}")
+    env_id = f"env-synth-{index:06d}"
+    researcher = rng.choice(RESEARCHERS)
+    facility = rng.choice(FACILITIES)
+    status = weighted_choice(rng, STATUSES)
+
+    gaps = [timedelta(hours=rng.uniform(2, args.snapshot_interval_hours * 2)) for _ in range(args.snapshots)]
+    if args.start:
+        created = args.start + timedelta(minutes=rng.randint(0, 60 * 24 * 60))
+    else:
+        # Work back from --end so the last snapshot lands within its 60 days
+        created = args.end - sum(gaps, timedelta()) - timedelta(minutes=rng.randint(60, 60 * 24 * 60))
+    packages = {name: version for name, version in rng.sample(BASE_PACKAGES, rng.randint(6, len(BASE_PACKAGES)))}
+    services = dict(BASE_SERVICES)
+    drivers = dict(BASE_DRIVERS)
+
+    constraints = []
+    for name in rng.sample(sorted(packages), min(len(packages), rng.randint(0, 3))):
+        template = rng.choice(CONSTRAINT_TEMPLATES)
+        constraints.append(template.format(name=name, version=packages[name]))
+
+    snapshots, drift_events, audit_events = [], [], []
+    audit_events.append(audit_event(env_id, created, researcher[0], 'STATE_CHANGED',
+                                    f"Environment created with status {status}", 'info', 0))
+
+    captured = created
+    open_drift = 0
+    for n in range(args.snapshots):
+        captured = captured + gaps[n]
+        timestamp = captured.strftime(TIMESTAMP_FORMAT)
+
+        changes = []
+        if n > 0 and rng.random() < args.drift_rate:
+            for name in rng.sample(sorted(packages), rng.randint(1, min(3, len(packages)))):
+                before = packages[name]
+                packages[name] = bump_version_string(rng, before)
+                changes.append(('package', name, before, packages[name]))
+            if rng.random() < 0.1:
+                name = rng.choice(sorted(drivers))
+                before = drivers[name]
+                drivers[name] = bump_version_string(rng, before)
+                changes.append(('driver', name, before, drivers[name]))
+
+        snapshot_id = f"snap-{env_id}-{n:05d}"
+        snapshots.append({
+            'id': snapshot_id,
+            'environmentId': env_id,
+            'capturedAt': timestamp,
+            'capturedBy': researcher[0],
+            'osVersion': 'Amazon Linux 2',
+            'kernelVersion': '5.10.0',
+            'packages': [{'name': k, 'version': v} for k, v in sorted(packages.items())],
+            'services': [{'name': k, 'status': 'active', 'version': v} for k, v in sorted(services.items())],
+            'drivers': [{'name': k, 'version': v} for k, v in sorted(drivers.items())],
+            'environmentVariables': {'FEV_DATA_PATH': '/vault/data/fev', 'CUDA_VISIBLE_DEVICES': '0,1'},
+            'diskImageHash': f"{rng.getrandbits(128):032x}",
+            'totalComponents': len(packages) + len(services) + len(drivers),
+            'verified': True,
+            'synthetic': True
+        })
+        audit_events.append(audit_event(env_id, captured, researcher[0], 'SNAPSHOT_CAPTURED',
+                                        f"Snapshot {snapshot_id} captured. {snapshots[-1]['totalComponents']} components verified.",
+                                        'info', len(audit_events)))
+
+        for c, (category, name, before, after) in enumerate(changes):
+            severity = 'CRITICAL' if category == 'driver' else 'WARNING'
+            resolved = rng.random() < args.resolve_rate
+            open_drift += 0 if resolved else 1
+            drift_events.append({
+                'id': f"drift-{env_id}-{n:05d}-{c}",
+                'environmentId': env_id,
+                # detectedAt is the sort key; offset keeps same-snapshot events distinct
+                'detectedAt': (captured + timedelta(seconds=c)).strftime(TIMESTAMP_FORMAT),
+                'severity': severity,
+                'parameter': f"{category}.{name}.version",
+                'expectedValue': before,
+                'actualValue': after,
+                'category': category,
+                'resolved': resolved
+            })
+        if changes:
+            audit_events.append(audit_event(env_id, captured, 'SYSTEM', 'DRIFT_DETECTED',
+                                            f"Drift detected: {len(changes)} version changes",
+                                            'warning', len(audit_events)))
+
+    if status == 'FROZEN':
+        frozen_at = captured + timedelta(hours=1)
+        audit_events.append(audit_event(env_id, frozen_at, researcher[0], 'ENV_FROZEN',
+                                        f"Environment Lab Synth {index:06d} frozen", 'warning', len(audit_events)))
+
+    environment = {
+        'id': env_id,
+        'labName': f"Lab Synth {index:06d}",
+        'facility': facility,
+        'researcher': {'name': researcher[0], 'role': researcher[1]},
+        'experimentId': f"{rng.choice(EXPERIMENT_PREFIXES)}-{rng.randint(2076, 2079)}-{rng.randint(1, 999):03d}",
+        'experimentName': f"Synthetic Experiment {index}",
+        'status': status,
+        'driftScore': min(100, open_drift * 10),
+        'lastSnapshotAt': snapshots[-1]['capturedAt'] if snapshots else None,
+        'createdAt': created.strftime(TIMESTAMP_FORMAT),
+        'constraints': constraints,
+        'cloudformationStackName': f"synth-{index:06d}-stack",
+        'cloudformationStackStatus': 'UPDATE_COMPLETE',
+        'synthetic': True
+    }
+    environment.update(search_keys(environment))
+    return environment, snapshots, drift_events, audit_events
+
+def audit_event(env_id, when, actor, action, details, severity, sequence):
+    """Audit log item in the shape the handlers write"""
+    return {
+        'id': f"log-{env_id}-{sequence:06d}",
+        'timestamp': when.strftime(TIMESTAMP_FORMAT),
+        'actor': actor,
+        'environmentId': env_id,
+        'action': action,
+        'details': details,
+        'severity': severity
+    }
+
+class Seeder:
+    """Writes generated items with one batch_writer per table per worker thread"""
+
+    def __init__(self, args):
+        self.args = args
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.counts = {'environments': 0, 'snapshots': 0, 'driftEvents': 0, 'auditEvents': 0}
+
+    def tables(self):
+        if not hasattr(self.local, 'tables'):
+            # boto3 resources are not thread-safe; one session per worker
+            dynamodb = boto3.session.Session().resource('dynamodb', endpoint_url=self.args.endpoint_url)
+            self.local.tables = {
+                name: dynamodb.Table(getattr(self.args, f"{name}_table"))
+                for name in ('environments', 'snapshots', 'drift_events', 'audit_log', 'counters')
+                if getattr(self.args, f"{name}_table")
+            }
+        return self.local.tables
+
+    def seed_range(self, indexes):
+        tables = self.tables()
+        counts = dict.fromkeys(self.counts, 0)
+        with tables['environments'].batch_writer() as environments, \
+                tables['snapshots'].batch_writer() as snapshots, \
+                tables['drift_events'].batch_writer() as drift_events, \
+                tables['audit_log'].batch_writer() as audit_log:
+            for index in indexes:
+                environment, env_snapshots, env_drift, env_audit = generate_environment(index, self.args)
+                environments.put_item(Item=environment)
+                for item in env_snapshots:
+                    snapshots.put_item(Item=item)
+                for item in env_drift:
+                    drift_events.put_item(Item=item)
+                for item in env_audit:
+                    audit_log.put_item(Item=item)
+                counts['environments'] += 1
+                counts['snapshots'] += len(env_snapshots)
+                counts['driftEvents'] += len(env_drift)
+                counts['auditEvents'] += len(env_audit)
+                bump_counters(tables, [f"drift#{environment['id']}"])
+        with self.lock:
+            for key, value in counts.items():
+                self.counts[key] += value
+
+    def seed_demo(self):
+        tables = self.tables()
+        with tables['environments'].batch_writer() as environments:
+            for environment in DEMO_ENVIRONMENTS:
+                environments.put_item(Item={**environment, **search_keys(environment)})
+        self.counts['environments'] = len(DEMO_ENVIRONMENTS)
+
+    def backfill_search_keys(self):
+        """Set missing or stale search index keys on every environment item"""
+        table = self.tables()['environments']
+        kwargs = {'ProjectionExpression': 'id, facility, labName, researcher, facilityLab, researcherName'}
+        while True:
+            response = table.scan(**kwargs)
+            for item in response.get('Items', []):
+                keys = search_keys(item)
+                if keys and any(item.get(name) != value for name, value in keys.items()):
+                    table.update_item(
+                        Key={'id': item['id']},
+                        UpdateExpression='SET ' + ', '.join(f"{name} = :{name}" for name in keys),
+                        ExpressionAttributeValues={f":{name}": value for name, value in keys.items()}
+                    )
+                    self.counts['environments'] += 1
+            if 'LastEvaluatedKey' not in response:
+                return
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def bump_counters(tables, names):
+    """Invalidate ETags served from the change counters, when a counters table is given"""
+    if 'counters' not in tables:
+        return
+    for name in names:
+        tables['counters'].update_item(
+            Key={'name': name},
+            UpdateExpression='ADD version :one',
+            ExpressionAttributeValues={':one': 1}
+        )
+
+# Audit log GSIs (partition attribute, timestamp sort key) as in BackendStack
+AUDIT_LOG_INDEXES = (
+    ('EnvironmentIndex', 'environmentId'),
+    ('ActorIndex', 'actor'),
+    ('ActionIndex', 'action'),
+    ('SeverityIndex', 'severity'),
+)
+
+# Environment search GSIs (partition, sort attribute) as in BackendStack
+ENVIRONMENT_INDEXES = (
+    ('StatusFacilityIndex', ('status', 'facilityLab')),
+    ('ResearcherIndex', ('researcherName', 'labName')),
+)
+
+def create_tables(args):
+    """Create the backend tables (keys and indexes as in BackendStack) in DynamoDB Local"""
+    dynamodb = boto3.resource('dynamodb', endpoint_url=args.endpoint_url)
+    definitions = {
+        args.environments_table: {
+            'KeySchema': [{'AttributeName': 'id', 'KeyType': 'HASH'}],
+            'AttributeDefinitions': [
+                {'AttributeName': 'id', 'AttributeType': 'S'},
+                *[{'AttributeName': attribute, 'AttributeType': 'S'}
+                  for attribute in sorted({a for _, keys in ENVIRONMENT_INDEXES for a in keys})]
+            ],
+            'GlobalSecondaryIndexes': [{
+                'IndexName': index_name,
+                'KeySchema': [
+                    {'AttributeName': partition_attribute, 'KeyType': 'HASH'},
+                    {'AttributeName': sort_attribute, 'KeyType': 'RANGE'}
+                ],
+                'Projection': {'ProjectionType': 'ALL'}
+            } for index_name, (partition_attribute, sort_attribute) in ENVIRONMENT_INDEXES],
+        },
+        args.snapshots_table: {
+            'KeySchema': [
+                {'AttributeName': 'environmentId', 'KeyType': 'HASH'},
+                {'AttributeName': 'capturedAt', 'KeyType': 'RANGE'}
+            ],
+            'AttributeDefinitions': [
+                {'AttributeName': 'environmentId', 'AttributeType': 'S'},
+                {'AttributeName': 'capturedAt', 'AttributeType': 'S'},
+                {'AttributeName': 'id', 'AttributeType': 'S'}
+            ],
+            'GlobalSecondaryIndexes': [{
+                'IndexName': 'SnapshotIdIndex',
+                'KeySchema': [{'AttributeName': 'id', 'KeyType': 'HASH'}],
+                'Projection': {'ProjectionType': 'KEYS_ONLY'}
+            }],
+        },
+        args.drift_events_table: {
+            'KeySchema': [
+                {'AttributeName': 'environmentId', 'KeyType': 'HASH'},
+                {'AttributeName': 'detectedAt', 'KeyType': 'RANGE'}
+            ],
+            'AttributeDefinitions': [
+                {'AttributeName': 'environmentId', 'AttributeType': 'S'},
+                {'AttributeName': 'detectedAt', 'AttributeType': 'S'}
+            ],
+        },
+        args.audit_log_table: {
+            'KeySchema': [
+                {'AttributeName': 'id', 'KeyType': 'HASH'},
+                {'AttributeName': 'timestamp', 'KeyType': 'RANGE'}
+            ],
+            'AttributeDefinitions': [
+                {'AttributeName': 'id', 'AttributeType': 'S'},
+                {'AttributeName': 'timestamp', 'AttributeType': 'S'},
+                *[{'AttributeName': attribute, 'AttributeType': 'S'} for _, attribute in AUDIT_LOG_INDEXES]
+            ],
+            'GlobalSecondaryIndexes': [{
+                'IndexName': index_name,
+                'KeySchema': [
+                    {'AttributeName': attribute, 'KeyType': 'HASH'},
+                    {'AttributeName': 'timestamp', 'KeyType': 'RANGE'}
+                ],
+                'Projection': {'ProjectionType': 'ALL'}
+            } for index_name, attribute in AUDIT_LOG_INDEXES],
+        },
+        args.counters_table: {
+            'KeySchema': [{'AttributeName': 'name', 'KeyType': 'HASH'}],
+            'AttributeDefinitions': [{'AttributeName': 'name', 'AttributeType': 'S'}],
+        },
+    }
+    existing = set(dynamodb.meta.client.list_tables()['TableNames'])
+    for name, definition in definitions.items():
+        if name and name not in existing:
+            dynamodb.create_table(TableName=name, BillingMode='PAY_PER_REQUEST', **definition)
+            dynamodb.Table(name).wait_until_exists()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Seed a synthetic West Tek fleet')
+    parser.add_argument('--environments', type=int, default=1000)
+    parser.add_argument('--snapshots', type=int, default=50, help='Snapshots per environment')
+    parser.add_argument('--drift-rate', type=float, default=0.05, help='Probability a snapshot introduces drift')
+    parser.add_argument('--resolve-rate', type=float, default=0.7, help='Probability a drift event is resolved')
+    parser.add_argument('--snapshot-interval-hours', type=float, default=24.0)
+    parser.add_argument('--start', type=lambda s: datetime.strptime(s, '%Y.%m.%d'),
+                        help='Earliest environment creation date (YYYY.MM.DD); overrides --end')
+    parser.add_argument('--end', type=lambda s: datetime.strptime(s, '%Y.%m.%d'),
+                        default=datetime.combine(datetime.now().date(), datetime.min.time()),
+                        help='Date histories run up to when --start is not given (YYYY.MM.DD, default today)')
+    parser.add_argument('--seed', type=int, default=2077)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--demo', action='store_true', help='Seed only the two original demo labs')
+    parser.add_argument('--backfill-search-keys', action='store_true',
+                        help='Only add environment search index keys to existing items')
+    parser.add_argument('--endpoint-url', help='DynamoDB endpoint, e.g. http://localhost:8000 for DynamoDB Local')
+    parser.add_argument('--create-tables', action='store_true', help='Create missing tables first (DynamoDB Local)')
+    parser.add_argument('--environments-table', default=os.environ.get('ENVIRONMENTS_TABLE', 'EnvironmentsTable'))
+    parser.add_argument('--snapshots-table', default=os.environ.get('SNAPSHOTS_TABLE', 'SnapshotsTable'))
+    parser.add_argument('--drift-events-table', default=os.environ.get('DRIFT_EVENTS_TABLE', 'DriftEventsTable'))
+    parser.add_argument('--audit-log-table', default=os.environ.get('AUDIT_LOG_TABLE', 'AuditLogTable'))
+    parser.add_argument('--counters-table', default=os.environ.get('COUNTERS_TABLE', 'CountersTable'))
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    if args.create_tables:
+        create_tables(args)
+
+    seeder = Seeder(args)
+    started = time.perf_counter()
+    if args.backfill_search_keys:
+        seeder.backfill_search_keys()
+    elif args.demo:
+        seeder.seed_demo()
+    else:
+        chunks = [range(i, min(i + 50, args.environments)) for i in range(0, args.environments, 50)]
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            list(executor.map(seeder.seed_range, chunks))
+    bump_counters(seeder.tables(), COUNTER_NAMES)
+
+    elapsed = time.perf_counter() - started
+    items = sum(seeder.counts.values())
+    print(json.dumps({
+        **seeder.counts,
+        'seconds': round(elapsed, 2),
+        'itemsPerSecond': round(items / elapsed) if elapsed else items
+    }, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,29 @@
+import json
+
 from aws_cdk import (
     Stack,
     Duration,
     RemovalPolicy,
     CfnOutput,
+    ArnFormat,
+    Size,
     aws_dynamodb as dynamodb,
     aws_lambda as lambda_,
     aws_apigateway as apigateway,
     aws_cognito as cognito,
     aws_iam as iam,
     aws_logs as logs,
+    aws_events as events,
+    aws_events_targets as targets,
+    aws_s3 as s3,
+    aws_sqs as sqs,
+    aws_lambda_event_sources as event_sources,
 )
 from constructs import Construct
 
+# Unit tests sit next to the Lambda code; keep them out of the deployed assets
+TEST_FILES = ["test_*.py", "__pycache__"]
+
 class BackendStack(Stack):
     def __init__(self, scope: Construct, construct_id: str, **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
@@ -32,6 +44,29 @@ class BackendStack(Stack):
             point_in_time_recovery=True
         )
 
+        # Server-side environment search (see environment_search.py):
+        # status with "<facility>#<labName>", and researcher name with labName.
+        # One GSI per table update: environmentIndexStage in cdk.json says how
+        # many to deploy, raised by one per deploy on an existing table (see README)
+        environment_indexes = (
+            ("StatusFacilityIndex", "status", "facilityLab"),
+            ("ResearcherIndex", "researcherName", "labName")
+        )
+        environment_index_stage = int(self.node.try_get_context("environmentIndexStage") or len(environment_indexes))
+        for index_name, partition_attribute, sort_attribute in environment_indexes[:environment_index_stage]:
+            self.environments_table.add_global_secondary_index(
+                index_name=index_name,
+                partition_key=dynamodb.Attribute(
+                    name=partition_attribute,
+                    type=dynamodb.AttributeType.STRING
+                ),
+                sort_key=dynamodb.Attribute(
+                    name=sort_attribute,
+                    type=dynamodb.AttributeType.STRING
+                ),
+                projection_type=dynamodb.ProjectionType.ALL
+            )
+
         # Snapshots table
         self.snapshots_table = dynamodb.Table(
             self, "SnapshotsTable",
@@ -44,7 +79,19 @@ class BackendStack(Stack):
                 type=dynamodb.AttributeType.STRING
             ),
             billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
-            removal_policy=RemovalPolicy.DESTROY
+            removal_policy=RemovalPolicy.DESTROY,
+            # Keys are enough for counting snapshots into drift rollups
+            stream=dynamodb.StreamViewType.KEYS_ONLY
+        )
+
+        # Resolve snapshot ids (snap-...) to their table keys for diffs
+        self.snapshots_table.add_global_secondary_index(
+            index_name="SnapshotIdIndex",
+            partition_key=dynamodb.Attribute(
+                name="id",
+                type=dynamodb.AttributeType.STRING
+            ),
+            projection_type=dynamodb.ProjectionType.KEYS_ONLY
         )
 
         # Drift Events table
@@ -59,6 +106,63 @@ class BackendStack(Stack):
                 type=dynamodb.AttributeType.STRING
             ),
             billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            removal_policy=RemovalPolicy.DESTROY,
+            # Old images let rollups see events being resolved, not only created
+            stream=dynamodb.StreamViewType.NEW_AND_OLD_IMAGES
+        )
+
+        # Hourly/daily drift aggregates per environment and facility
+        self.drift_rollups_table = dynamodb.Table(
+            self, "DriftRollupsTable",
+            partition_key=dynamodb.Attribute(
+                name="series",
+                type=dynamodb.AttributeType.STRING
+            ),
+            sort_key=dynamodb.Attribute(
+                name="bucket",
+                type=dynamodb.AttributeType.STRING
+            ),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            time_to_live_attribute="ttl",
+            removal_policy=RemovalPolicy.DESTROY
+        )
+
+        # Remediation jobs: one "job" entry plus an "env#<id>" entry per environment
+        self.remediation_jobs_table = dynamodb.Table(
+            self, "RemediationJobsTable",
+            partition_key=dynamodb.Attribute(
+                name="jobId",
+                type=dynamodb.AttributeType.STRING
+            ),
+            sort_key=dynamodb.Attribute(
+                name="entry",
+                type=dynamodb.AttributeType.STRING
+            ),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            time_to_live_attribute="ttl",
+            removal_policy=RemovalPolicy.DESTROY
+        )
+
+        # Change counters backing ETags on read endpoints
+        self.counters_table = dynamodb.Table(
+            self, "CountersTable",
+            partition_key=dynamodb.Attribute(
+                name="name",
+                type=dynamodb.AttributeType.STRING
+            ),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            removal_policy=RemovalPolicy.DESTROY
+        )
+
+        # Per-environment capture leases and idempotency records
+        self.capture_leases_table = dynamodb.Table(
+            self, "CaptureLeasesTable",
+            partition_key=dynamodb.Attribute(
+                name="key",
+                type=dynamodb.AttributeType.STRING
+            ),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            time_to_live_attribute="ttl",
             removal_policy=RemovalPolicy.DESTROY
         )
 
@@ -77,6 +181,88 @@ class BackendStack(Stack):
             removal_policy=RemovalPolicy.DESTROY
         )
 
+        # Server-side audit filters: one index per filter attribute, newest first by timestamp.
+        # CloudFormation adds one GSI per table update, so an existing table gets them in
+        # this order, one per deploy: raise auditIndexStage in cdk.json by one each time
+        # (see README). Readers check each index is ACTIVE before querying it.
+        audit_indexes = (
+            ("SeverityIndex", "severity"),
+            ("EnvironmentIndex", "environmentId"),
+            ("ActorIndex", "actor"),
+            ("ActionIndex", "action")
+        )
+        audit_index_stage = int(self.node.try_get_context("auditIndexStage") or len(audit_indexes))
+        for index_name, attribute in audit_indexes[:audit_index_stage]:
+            self.audit_log_table.add_global_secondary_index(
+                index_name=index_name,
+                partition_key=dynamodb.Attribute(
+                    name=attribute,
+                    type=dynamodb.AttributeType.STRING
+                ),
+                sort_key=dynamodb.Attribute(
+                    name="timestamp",
+                    type=dynamodb.AttributeType.STRING
+                ),
+                projection_type=dynamodb.ProjectionType.ALL
+            )
+
+        # Cold tier of the audit log: day-partitioned NDJSON.gz plus monthly catalogs
+        self.audit_archive_bucket = s3.Bucket(
+            self, "AuditArchiveBucket",
+            encryption=s3.BucketEncryption.S3_MANAGED,
+            block_public_access=s3.BlockPublicAccess.BLOCK_ALL,
+            lifecycle_rules=[
+                # Day files only (audit/<YYYY.MM.DD>/); catalogs are read often and stay in STANDARD
+                s3.LifecycleRule(
+                    prefix="audit/2",
+                    transitions=[s3.Transition(
+                        storage_class=s3.StorageClass.INFREQUENT_ACCESS,
+                        transition_after=Duration.days(30)
+                    )]
+                )
+            ],
+            removal_policy=RemovalPolicy.DESTROY
+        )
+
+        # Bulk exports of snapshot and audit history
+        self.export_bucket = s3.Bucket(
+            self, "ExportBucket",
+            encryption=s3.BucketEncryption.S3_MANAGED,
+            block_public_access=s3.BlockPublicAccess.BLOCK_ALL,
+            removal_policy=RemovalPolicy.DESTROY
+        )
+
+        # Full capture output: SSM writes raw stdout under ssm/, capture
+        # re-stores it block-compressed under outputs/ for ranged reads
+        self.raw_output_bucket = s3.Bucket(
+            self, "RawOutputBucket",
+            encryption=s3.BucketEncryption.S3_MANAGED,
+            block_public_access=s3.BlockPublicAccess.BLOCK_ALL,
+            lifecycle_rules=[
+                s3.LifecycleRule(prefix="ssm/", expiration=Duration.days(1))
+            ],
+            removal_policy=RemovalPolicy.DESTROY
+        )
+
+        # Capture work queue: priority lane (FROZEN labs, compliance captures)
+        # drained before the standard lane; captures failing 3 times are
+        # dead-lettered. Visibility outlasts a capture (300s) plus its lease margin.
+        self.capture_dead_letter_queue = sqs.Queue(
+            self, "CaptureDeadLetterQueue",
+            retention_period=Duration.days(14)
+        )
+        capture_redrive = sqs.DeadLetterQueue(max_receive_count=3, queue=self.capture_dead_letter_queue)
+        self.capture_priority_queue = sqs.Queue(
+            self, "CapturePriorityQueue",
+            visibility_timeout=Duration.minutes(6),
+            dead_letter_queue=capture_redrive
+        )
+        self.capture_queue = sqs.Queue(
+            self, "CaptureQueue",
+            visibility_timeout=Duration.minutes(6),
+            dead_letter_queue=capture_redrive
+        )
+
         # ========================================
         # Cognito User Pool
         # ========================================
@@ -145,13 +331,25 @@ class BackendStack(Stack):
         self.snapshots_table.grant_read_write_data(self.lambda_role)
         self.drift_events_table.grant_read_write_data(self.lambda_role)
         self.audit_log_table.grant_read_write_data(self.lambda_role)
+        self.counters_table.grant_read_write_data(self.lambda_role)
+        self.capture_leases_table.grant_read_write_data(self.lambda_role)
+        self.drift_rollups_table.grant_read_write_data(self.lambda_role)
+        self.remediation_jobs_table.grant_read_write_data(self.lambda_role)
+        self.export_bucket.grant_read_write(self.lambda_role)
+        self.raw_output_bucket.grant_read_write(self.lambda_role)
+        self.audit_archive_bucket.grant_read_write(self.lambda_role)
+        for queue in (self.capture_priority_queue, self.capture_queue):
+            queue.grant_send_messages(self.lambda_role)
+            queue.grant_consume_messages(self.lambda_role)
 
         # SSM permissions
         self.lambda_role.add_to_policy(iam.PolicyStatement(
             actions=[
                 "ssm:SendCommand",
+                "ssm:CancelCommand",
                 "ssm:GetCommandInvocation",
                 "ssm:ListCommandInvocations",
+                "ssm:ListCommands",
                 "ssm:DescribeInstanceInformation",
                 "ssm:GetInventory"
             ],
@@ -174,6 +372,7 @@ class BackendStack(Stack):
             actions=[
                 "workspaces:DescribeWorkspaces",
                 "workspaces:DescribeWorkspaceBundles",
+                "workspaces:DescribeWorkspaceDirectories",
                 "workspaces:CreateWorkspaces"
             ],
             resources=["*"]
@@ -197,17 +396,40 @@ class BackendStack(Stack):
             "ENVIRONMENTS_TABLE": self.environments_table.table_name,
             "SNAPSHOTS_TABLE": self.snapshots_table.table_name,
             "DRIFT_EVENTS_TABLE": self.drift_events_table.table_name,
-            "AUDIT_LOG_TABLE": self.audit_log_table.table_name
+            "AUDIT_LOG_TABLE": self.audit_log_table.table_name,
+            "COUNTERS_TABLE": self.counters_table.table_name
         }
 
+        # Other accounts/regions in the fleet: cdk deploy -c fleetTargets='[{...}]' (see README)
+        fleet_targets = self.node.try_get_context("fleetTargets") or []
+        if isinstance(fleet_targets, str):
+            fleet_targets = json.loads(fleet_targets)
+        if fleet_targets:
+            lambda_env["FLEET_TARGETS"] = json.dumps(fleet_targets)
+            role_arns = sorted({target["roleArn"] for target in fleet_targets if target.get("roleArn")})
+            if role_arns:
+                self.lambda_role.add_to_policy(iam.PolicyStatement(
+                    actions=["sts:AssumeRole"],
+                    resources=role_arns
+                ))
+
+        # Modules shared by every function (lambda/common/python)
+        common_layer = lambda_.LayerVersion(
+            self, "CommonLayer",
+            code=lambda_.Code.from_asset("lambda/common", exclude=TEST_FILES),
+            compatible_runtimes=[lambda_.Runtime.PYTHON_3_11],
+            description="West Tek shared Lambda modules"
+        )
+
         # Get Environments
         get_environments_fn = lambda_.Function(
             self, "GetEnvironmentsFunction",
             runtime=lambda_.Runtime.PYTHON_3_11,
             handler="index.handler",
-            code=lambda_.Code.from_asset("lambda/get_environments"),
+            code=lambda_.Code.from_asset("lambda/get_environments", exclude=TEST_FILES),
             environment=lambda_env,
             role=self.lambda_role,
+            layers=[common_layer],
             timeout=Duration.seconds(30),
             log_retention=logs.RetentionDays.ONE_WEEK
         )
@@ -217,10 +439,12 @@ class BackendStack(Stack):
             self, "CaptureSnapshotFunction",
             runtime=lambda_.Runtime.PYTHON_3_11,
             handler="index.handler",
-            code=lambda_.Code.from_asset("lambda/capture_snapshot"),
+            code=lambda_.Code.from_asset("lambda/capture_snapshot", exclude=TEST_FILES),
             environment=lambda_env,
             role=self.lambda_role,
+            layers=[common_layer],
             timeout=Duration.seconds(300),
+            memory_size=512,
             log_retention=logs.RetentionDays.ONE_WEEK
         )
 
@@ -229,9 +453,10 @@ class BackendStack(Stack):
             self, "CheckDriftFunction",
             runtime=lambda_.Runtime.PYTHON_3_11,
             handler="index.handler",
-            code=lambda_.Code.from_asset("lambda/check_drift"),
+            code=lambda_.Code.from_asset("lambda/check_drift", exclude=TEST_FILES),
             environment=lambda_env,
             role=self.lambda_role,
+            layers=[common_layer],
             timeout=Duration.seconds(300),
             log_retention=logs.RetentionDays.ONE_WEEK
         )
@@ -241,9 +466,10 @@ class BackendStack(Stack):
             self, "FreezeEnvironmentFunction",
             runtime=lambda_.Runtime.PYTHON_3_11,
             handler="index.handler",
-            code=lambda_.Code.from_asset("lambda/freeze_environment"),
+            code=lambda_.Code.from_asset("lambda/freeze_environment", exclude=TEST_FILES),
             environment=lambda_env,
             role=self.lambda_role,
+            layers=[common_layer],
             timeout=Duration.seconds(30),
             log_retention=logs.RetentionDays.ONE_WEEK
         )
@@ -253,13 +479,316 @@ class BackendStack(Stack):
             self, "GetAuditLogFunction",
             runtime=lambda_.Runtime.PYTHON_3_11,
             handler="index.handler",
-            code=lambda_.Code.from_asset("lambda/get_audit_log"),
+            code=lambda_.Code.from_asset("lambda/get_audit_log", exclude=TEST_FILES),
+            environment={**lambda_env, "AUDIT_ARCHIVE_BUCKET": self.audit_archive_bucket.bucket_name},
+            role=self.lambda_role,
+            layers=[common_layer],
+            timeout=Duration.seconds(30),
+            log_retention=logs.RetentionDays.ONE_WEEK
+        )
+
+        # Get Dashboard (environments, open drift and recent audit entries in one call)
+        get_dashboard_fn = lambda_.Function(
+            self, "GetDashboardFunction",
+            runtime=lambda_.Runtime.PYTHON_3_11,
+            handler="index.handler",
+            code=lambda_.Code.from_asset("lambda/get_dashboard", exclude=TEST_FILES),
+            environment=lambda_env,
+            role=self.lambda_role,
+            layers=[common_layer],
+            timeout=Duration.seconds(30),
+            memory_size=512,
+            log_retention=logs.RetentionDays.ONE_WEEK
+        )
+
+        # Refresh Instance Map (EnvironmentId tag -> running instances)
+        refresh_instance_map_fn = lambda_.Function(
+            self, "RefreshInstanceMapFunction",
+            runtime=lambda_.Runtime.PYTHON_3_11,
+            handler="index.handler",
+            code=lambda_.Code.from_asset("lambda/refresh_instance_map", exclude=TEST_FILES),
+            environment=lambda_env,
+            role=self.lambda_role,
+            layers=[common_layer],
+            timeout=Duration.seconds(120),
+            log_retention=logs.RetentionDays.ONE_WEEK
+        )
+
+        events.Rule(
+            self, "RefreshInstanceMapSchedule",
+            schedule=events.Schedule.rate(Duration.minutes(15)),
+            targets=[targets.LambdaFunction(refresh_instance_map_fn)]
+        )
+
+        # Sync WorkSpaces (WorkSpaces and bundles -> environment items)
+        sync_workspaces_fn = lambda_.Function(
+            self, "SyncWorkspacesFunction",
+            runtime=lambda_.Runtime.PYTHON_3_11,
+            handler="index.handler",
+            code=lambda_.Code.from_asset("lambda/sync_workspaces", exclude=TEST_FILES),
+            environment=lambda_env,
+            role=self.lambda_role,
+            layers=[common_layer],
+            timeout=Duration.seconds(300),
+            log_retention=logs.RetentionDays.ONE_WEEK
+        )
+
+        events.Rule(
+            self, "SyncWorkspacesSchedule",
+            schedule=events.Schedule.rate(Duration.minutes(15)),
+            targets=[targets.LambdaFunction(sync_workspaces_fn)]
+        )
+
+        # Capture triggers out-of-band refreshes when its cached map is stale.
+        # Granted by name pattern: referencing the function ARN from the shared
+        # role's policy would create a dependency cycle.
+        capture_snapshot_fn.add_environment("INSTANCE_MAP_FUNCTION", refresh_instance_map_fn.function_name)
+        capture_snapshot_fn.add_environment("CAPTURE_LEASES_TABLE", self.capture_leases_table.table_name)
+        capture_snapshot_fn.add_environment("RAW_OUTPUT_BUCKET", self.raw_output_bucket.bucket_name)
+        self.lambda_role.add_to_policy(iam.PolicyStatement(
+            actions=["lambda:InvokeFunction"],
+            resources=[self.format_arn(
+                service="lambda",
+                resource="function",
+                resource_name="*RefreshInstanceMap*",
+                arn_format=ArnFormat.COLON_RESOURCE_NAME
+            )]
+        ))
+
+        # Capture Worker: runs queued API captures from the capture_snapshot
+        # code. Reserved concurrency 1 makes it the only consumer, so
+        # CAPTURE_MAX_WORKERS bounds concurrent captures fleet-wide.
+        capture_queue_urls = json.dumps({
+            "priority": self.capture_priority_queue.queue_url,
+            "standard": self.capture_queue.queue_url
+        })
+        capture_worker_fn = lambda_.Function(
+            self, "CaptureWorkerFunction",
+            runtime=lambda_.Runtime.PYTHON_3_11,
+            handler="worker.handler",
+            code=lambda_.Code.from_asset("lambda/capture_snapshot", exclude=TEST_FILES),
+            environment={
+                **lambda_env,
+                "INSTANCE_MAP_FUNCTION": refresh_instance_map_fn.function_name,
+                "CAPTURE_LEASES_TABLE": self.capture_leases_table.table_name,
+                "RAW_OUTPUT_BUCKET": self.raw_output_bucket.bucket_name,
+                "WORK_QUEUE_URLS": capture_queue_urls,
+                "CAPTURE_MAX_WORKERS": str(self.node.try_get_context("captureMaxWorkers") or 8)
+            },
+            role=self.lambda_role,
+            layers=[common_layer],
+            timeout=Duration.minutes(15),
+            memory_size=1024,
+            reserved_concurrent_executions=1,
+            # Wake-ups that find the worker busy are dropped, not retried for hours
+            retry_attempts=0,
+            max_event_age=Duration.seconds(60),
+            log_retention=logs.RetentionDays.ONE_WEEK
+        )
+
+        # Picks up captures released for retry and wake-ups that were dropped
+        events.Rule(
+            self, "CaptureWorkerSchedule",
+            schedule=events.Schedule.rate(Duration.minutes(1)),
+            targets=[targets.LambdaFunction(capture_worker_fn)]
+        )
+
+        capture_snapshot_fn.add_environment("WORK_QUEUE_URLS", capture_queue_urls)
+        capture_snapshot_fn.add_environment("CAPTURE_WORKER_FUNCTION", capture_worker_fn.function_name)
+        self.lambda_role.add_to_policy(iam.PolicyStatement(
+            actions=["lambda:InvokeFunction"],
+            resources=[self.format_arn(
+                service="lambda",
+                resource="function",
+                resource_name="*CaptureWorker*",
+                arn_format=ArnFormat.COLON_RESOURCE_NAME
+            )]
+        ))
+
+        # Check Compliance
+        check_compliance_fn = lambda_.Function(
+            self, "CheckComplianceFunction",
+            runtime=lambda_.Runtime.PYTHON_3_11,
+            handler="index.handler",
+            code=lambda_.Code.from_asset("lambda/check_compliance", exclude=TEST_FILES),
+            environment=lambda_env,
+            role=self.lambda_role,
+            layers=[common_layer],
+            timeout=Duration.seconds(60),
+            memory_size=512,
+            log_retention=logs.RetentionDays.ONE_WEEK
+        )
+
+        # Diff Snapshots
+        diff_snapshots_fn = lambda_.Function(
+            self, "DiffSnapshotsFunction",
+            runtime=lambda_.Runtime.PYTHON_3_11,
+            handler="index.handler",
+            code=lambda_.Code.from_asset("lambda/diff_snapshots", exclude=TEST_FILES),
             environment=lambda_env,
             role=self.lambda_role,
+            layers=[common_layer],
             timeout=Duration.seconds(30),
+            memory_size=512,
+            log_retention=logs.RetentionDays.ONE_WEEK
+        )
+
+        # Get Snapshot Output (ranged reads of full capture output)
+        get_snapshot_output_fn = lambda_.Function(
+            self, "GetSnapshotOutputFunction",
+            runtime=lambda_.Runtime.PYTHON_3_11,
+            handler="index.handler",
+            code=lambda_.Code.from_asset("lambda/get_snapshot_output", exclude=TEST_FILES),
+            environment={**lambda_env, "RAW_OUTPUT_BUCKET": self.raw_output_bucket.bucket_name},
+            role=self.lambda_role,
+            layers=[common_layer],
+            timeout=Duration.seconds(30),
+            log_retention=logs.RetentionDays.ONE_WEEK
+        )
+
+        # Detect Stack Drift (CloudFormation drift for every environment stack)
+        detect_stack_drift_fn = lambda_.Function(
+            self, "DetectStackDriftFunction",
+            runtime=lambda_.Runtime.PYTHON_3_11,
+            handler="index.handler",
+            code=lambda_.Code.from_asset("lambda/detect_stack_drift", exclude=TEST_FILES),
+            environment=lambda_env,
+            role=self.lambda_role,
+            layers=[common_layer],
+            timeout=Duration.minutes(15),
             log_retention=logs.RetentionDays.ONE_WEEK
         )
 
+        events.Rule(
+            self, "DetectStackDriftSchedule",
+            schedule=events.Schedule.rate(Duration.hours(6)),
+            targets=[targets.LambdaFunction(detect_stack_drift_fn)]
+        )
+
+        # Export History (invoked directly; runs longer than API Gateway allows)
+        export_history_fn = lambda_.Function(
+            self, "ExportHistoryFunction",
+            runtime=lambda_.Runtime.PYTHON_3_11,
+            handler="index.handler",
+            code=lambda_.Code.from_asset("lambda/export_history", exclude=TEST_FILES),
+            environment={
+                **lambda_env,
+                "EXPORT_BUCKET": self.export_bucket.bucket_name,
+                "AUDIT_ARCHIVE_BUCKET": self.audit_archive_bucket.bucket_name
+            },
+            role=self.lambda_role,
+            layers=[common_layer],
+            timeout=Duration.minutes(15),
+            memory_size=1024,
+            ephemeral_storage_size=Size.gibibytes(2),
+            log_retention=logs.RetentionDays.ONE_WEEK
+        )
+
+        # Archive Audit Log (daily: events past the hot horizon move to the archive bucket)
+        archive_audit_log_fn = lambda_.Function(
+            self, "ArchiveAuditLogFunction",
+            runtime=lambda_.Runtime.PYTHON_3_11,
+            handler="index.handler",
+            code=lambda_.Code.from_asset("lambda/archive_audit_log", exclude=TEST_FILES),
+            environment={
+                **lambda_env,
+                "AUDIT_ARCHIVE_BUCKET": self.audit_archive_bucket.bucket_name,
+                "AUDIT_HOT_DAYS": str(self.node.try_get_context("auditHotDays") or 90)
+            },
+            role=self.lambda_role,
+            layers=[common_layer],
+            timeout=Duration.minutes(15),
+            memory_size=1024,
+            log_retention=logs.RetentionDays.ONE_WEEK
+        )
+
+        events.Rule(
+            self, "ArchiveAuditLogSchedule",
+            schedule=events.Schedule.rate(Duration.days(1)),
+            targets=[targets.LambdaFunction(archive_audit_log_fn)]
+        )
+
+        # Rollup Drift (table streams -> hourly/daily aggregates; {"mode": "backfill"} rebuilds)
+        rollup_env = {**lambda_env, "DRIFT_ROLLUPS_TABLE": self.drift_rollups_table.table_name}
+        rollup_drift_fn = lambda_.Function(
+            self, "RollupDriftFunction",
+            runtime=lambda_.Runtime.PYTHON_3_11,
+            handler="index.handler",
+            code=lambda_.Code.from_asset("lambda/rollup_drift", exclude=TEST_FILES),
+            environment=rollup_env,
+            role=self.lambda_role,
+            layers=[common_layer],
+            timeout=Duration.minutes(15),
+            memory_size=512,
+            log_retention=logs.RetentionDays.ONE_WEEK
+        )
+
+        for table in (self.drift_events_table, self.snapshots_table):
+            rollup_drift_fn.add_event_source(event_sources.DynamoEventSource(
+                table,
+                starting_position=lambda_.StartingPosition.TRIM_HORIZON,
+                batch_size=500,
+                max_batching_window=Duration.seconds(5),
+                bisect_batch_on_error=True,
+                retry_attempts=5
+            ))
+
+        # Get Drift Trend
+        get_drift_trend_fn = lambda_.Function(
+            self, "GetDriftTrendFunction",
+            runtime=lambda_.Runtime.PYTHON_3_11,
+            handler="index.handler",
+            code=lambda_.Code.from_asset("lambda/get_drift_trend", exclude=TEST_FILES),
+            environment=rollup_env,
+            role=self.lambda_role,
+            layers=[common_layer],
+            timeout=Duration.seconds(30),
+            log_retention=logs.RetentionDays.ONE_WEEK
+        )
+
+        # Remediate Drift (POST starts a job that continues asynchronously; GET reports progress)
+        remediate_drift_fn = lambda_.Function(
+            self, "RemediateDriftFunction",
+            runtime=lambda_.Runtime.PYTHON_3_11,
+            handler="index.handler",
+            code=lambda_.Code.from_asset("lambda/remediate_drift", exclude=TEST_FILES),
+            environment={
+                **lambda_env,
+                "REMEDIATION_JOBS_TABLE": self.remediation_jobs_table.table_name,
+                "CAPTURE_FUNCTION": capture_snapshot_fn.function_name
+            },
+            role=self.lambda_role,
+            layers=[common_layer],
+            timeout=Duration.minutes(15),
+            memory_size=512,
+            log_retention=logs.RetentionDays.ONE_WEEK
+        )
+
+        # Fails jobs whose run was cut off (e.g. by the function timeout) so they do not stay RUNNING
+        events.Rule(
+            self, "RemediationSweepSchedule",
+            schedule=events.Schedule.rate(Duration.minutes(15)),
+            targets=[targets.LambdaFunction(
+                remediate_drift_fn,
+                event=events.RuleTargetInput.from_object({"mode": "sweep"})
+            )]
+        )
+
+        # Runs hand off to themselves and capture verification snapshots
+        # (granted by name pattern, as above)
+        self.lambda_role.add_to_policy(iam.PolicyStatement(
+            actions=["lambda:InvokeFunction"],
+            resources=[
+                self.format_arn(
+                    service="lambda",
+                    resource="function",
+                    resource_name=name,
+                    arn_format=ArnFormat.COLON_RESOURCE_NAME
+                )
+                for name in ("*RemediateDrift*", "*CaptureSnapshot*")
+            ]
+        ))
+
         # ========================================
         # API Gateway
         # ========================================
@@ -271,7 +800,7 @@ class BackendStack(Stack):
             default_cors_preflight_options=apigateway.CorsOptions(
                 allow_origins=apigateway.Cors.ALL_ORIGINS,
                 allow_methods=apigateway.Cors.ALL_METHODS,
-                allow_headers=["Content-Type", "Authorization"]
+                allow_headers=["Content-Type", "Authorization", "If-None-Match", "Idempotency-Key"]
             ),
             deploy_options=apigateway.StageOptions(
                 stage_name="prod",
@@ -286,13 +815,29 @@ class BackendStack(Stack):
             cognito_user_pools=[user_pool]
         )
 
+        # Conditional GET: accept If-None-Match, return ETag on 200 and 304
+        conditional_get = dict(
+            request_parameters={"method.request.header.If-None-Match": False},
+            method_responses=[
+                apigateway.MethodResponse(
+                    status_code=status_code,
+                    response_parameters={
+                        "method.response.header.ETag": True,
+                        "method.response.header.Access-Control-Expose-Headers": True
+                    }
+                )
+                for status_code in ("200", "304")
+            ]
+        )
+
         # API Resources and Methods
         environments = api.root.add_resource("environments")
         environments.add_method(
             "GET",
             apigateway.LambdaIntegration(get_environments_fn),
             authorizer=authorizer,
-            authorization_type=apigateway.AuthorizationType.COGNITO
+            authorization_type=apigateway.AuthorizationType.COGNITO,
+            **conditional_get
         )
 
         # /environments/{id}/snapshot
@@ -311,7 +856,18 @@ class BackendStack(Stack):
             "GET",
             apigateway.LambdaIntegration(check_drift_fn),
             authorizer=authorizer,
-            authorization_type=apigateway.AuthorizationType.COGNITO
+            authorization_type=apigateway.AuthorizationType.COGNITO,
+            **conditional_get
+        )
+
+        # /environments/{id}/drift/trend
+        drift_trend = drift.add_resource("trend")
+        drift_trend.add_method(
+            "GET",
+            apigateway.LambdaIntegration(get_drift_trend_fn),
+            authorizer=authorizer,
+            authorization_type=apigateway.AuthorizationType.COGNITO,
+            **conditional_get
         )
 
         # /environments/{id}/freeze
@@ -329,6 +885,63 @@ class BackendStack(Stack):
             "GET",
             apigateway.LambdaIntegration(get_audit_log_fn),
             authorizer=authorizer,
+            authorization_type=apigateway.AuthorizationType.COGNITO,
+            **conditional_get
+        )
+
+        # /dashboard
+        dashboard = api.root.add_resource("dashboard")
+        dashboard.add_method(
+            "GET",
+            apigateway.LambdaIntegration(get_dashboard_fn),
+            authorizer=authorizer,
+            authorization_type=apigateway.AuthorizationType.COGNITO,
+            **conditional_get
+        )
+
+        # /compliance
+        compliance = api.root.add_resource("compliance")
+        compliance.add_method(
+            "GET",
+            apigateway.LambdaIntegration(check_compliance_fn),
+            authorizer=authorizer,
+            authorization_type=apigateway.AuthorizationType.COGNITO
+        )
+
+        # /remediation
+        remediation = api.root.add_resource("remediation")
+        remediation.add_method(
+            "POST",
+            apigateway.LambdaIntegration(remediate_drift_fn),
+            authorizer=authorizer,
+            authorization_type=apigateway.AuthorizationType.COGNITO
+        )
+
+        # /remediation/{jobId}
+        remediation_job = remediation.add_resource("{jobId}")
+        remediation_job.add_method(
+            "GET",
+            apigateway.LambdaIntegration(remediate_drift_fn),
+            authorizer=authorizer,
+            authorization_type=apigateway.AuthorizationType.COGNITO
+        )
+
+        # /snapshots/diff
+        snapshots = api.root.add_resource("snapshots")
+        snapshots_diff = snapshots.add_resource("diff")
+        snapshots_diff.add_method(
+            "GET",
+            apigateway.LambdaIntegration(diff_snapshots_fn),
+            authorizer=authorizer,
+            authorization_type=apigateway.AuthorizationType.COGNITO
+        )
+
+        # /snapshots/{snapshotId}/output
+        snapshot_output = snapshots.add_resource("{snapshotId}").add_resource("output")
+        snapshot_output.add_method(
+            "GET",
+            apigateway.LambdaIntegration(get_snapshot_output_fn),
+            authorizer=authorizer,
             authorization_type=apigateway.AuthorizationType.COGNITO
         )
 
@@ -340,4 +953,10 @@ class BackendStack(Stack):
         CfnOutput(self, "UserPoolId", value=user_pool.user_pool_id, description="Cognito User Pool ID")
         CfnOutput(self, "UserPoolClientId", value=user_pool_client.user_pool_client_id, description="Cognito User Pool Client ID")
         CfnOutput(self, "IdentityPoolId", value=identity_pool.ref, description="Cognito Identity Pool ID")
+        CfnOutput(self, "ExportBucketName", value=self.export_bucket.bucket_name, description="Bulk export bucket")
+        CfnOutput(self, "CaptureDeadLetterQueueUrl", value=self.capture_dead_letter_queue.queue_url, description="Captures that failed every attempt")
+        CfnOutput(self, "AuditArchiveBucketName", value=self.audit_archive_bucket.bucket_name, description="Archived audit log bucket")
+        CfnOutput(self, "RawOutputBucketName", value=self.raw_output_bucket.bucket_name, description="Full capture output bucket")
+        CfnOutput(self, "ExportHistoryFunctionName", value=export_history_fn.function_name, description="Bulk export function")
+        CfnOutput(self, "RollupDriftFunctionName", value=rollup_drift_fn.function_name, description="Drift rollup function (backfill)")
         CfnOutput(self, "Region", value=self.region, description="AWS Region")
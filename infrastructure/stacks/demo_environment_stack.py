@@ -1,14 +1,17 @@
 from aws_cdk import (
     Stack,
+    Tags,
     CfnOutput,
     aws_ec2 as ec2,
     aws_iam as iam,
+    aws_s3 as s3,
     aws_cloudformation as cfn,
 )
 from constructs import Construct
 
 class DemoEnvironmentStack(Stack):
-    def __init__(self, scope: Construct, construct_id: str, api_lambda_role: iam.Role, **kwargs) -> None:
+    def __init__(self, scope: Construct, construct_id: str, api_lambda_role: iam.Role,
+                 raw_output_bucket: s3.IBucket = None, **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
 
         # ========================================
@@ -74,6 +77,10 @@ class DemoEnvironmentStack(Stack):
             ]
         )
 
+        # SSM Run Command uploads full command output from the instance itself
+        if raw_output_bucket:
+            raw_output_bucket.grant_put(ec2_role, "ssm/*")
+
         # ========================================
         # User Data Script
         # ========================================
@@ -128,8 +135,8 @@ class DemoEnvironmentStack(Stack):
             instance_name="Lab-Mariposa-07"
         )
 
-        # Add tags for identification
-        lab_mariposa_07.node.add_metadata("EnvironmentId", "env-mariposa-07")
+        # Add tags for identification (EnvironmentId drives instance discovery)
+        Tags.of(lab_mariposa_07).add("EnvironmentId", "env-mariposa-07")
         lab_mariposa_07.node.add_metadata("LabName", "Lab Mariposa 07")
         lab_mariposa_07.node.add_metadata("ExperimentId", "FEV-2077-ALPHA")
         lab_mariposa_07.node.add_metadata("Status", "FROZEN")
@@ -149,7 +156,7 @@ class DemoEnvironmentStack(Stack):
             instance_name="Lab-WestTek-12"
         )
 
-        lab_westtek_12.node.add_metadata("EnvironmentId", "env-westtek-12")
+        Tags.of(lab_westtek_12).add("EnvironmentId", "env-westtek-12")
         lab_westtek_12.node.add_metadata("LabName", "Lab West Tek 12")
         lab_westtek_12.node.add_metadata("ExperimentId", "BIO-2078-SERIES9")
         lab_westtek_12.node.add_metadata("Status", "ACTIVE")
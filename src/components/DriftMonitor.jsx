@@ -1,10 +1,56 @@
-import { useState } from 'react';
+import { useEffect, useState } from 'react';
 import { AlertTriangle, CheckCircle, Info } from 'lucide-react';
 import { useVault } from '../context/VaultContext';
 
+const REMEDIATION_POLL_MS = 5000;
+
 export default function DriftMonitor() {
-  const { environments, driftEvents } = useVault();
+  const {
+    environments, driftEvents, simulationMode, getDriftTrend,
+    startRemediation, getRemediationJob, loadDashboard
+  } = useVault();
   const [selectedEnv, setSelectedEnv] = useState(null);
+  const [trendWindow, setTrendWindow] = useState('30d');
+  const [trend, setTrend] = useState([]);
+  const [remediationJob, setRemediationJob] = useState(null);
+  const [remediationError, setRemediationError] = useState(null);
+
+  // Poll the running remediation job until it finishes
+  useEffect(() => {
+    if (!remediationJob || ['COMPLETED', 'HALTED', 'FAILED'].includes(remediationJob.status)) return;
+    const timer = setTimeout(async () => {
+      try {
+        const { job } = await getRemediationJob(remediationJob.jobId);
+        setRemediationJob(job);
+        if (['COMPLETED', 'HALTED', 'FAILED'].includes(job.status)) loadDashboard();
+      } catch (error) {
+        setRemediationError(error.message);
+      }
+    }, REMEDIATION_POLL_MS);
+    return () => clearTimeout(timer);
+  }, [remediationJob]);
+
+  const handleRemediate = async (environmentIds) => {
+    setRemediationError(null);
+    try {
+      const started = await startRemediation(environmentIds ? { environmentIds } : {});
+      setRemediationJob({ jobId: started.jobId, status: started.status, environmentIds: [] });
+    } catch (error) {
+      setRemediationError(error.message);
+    }
+  };
+
+  useEffect(() => {
+    if (!selectedEnv || simulationMode) {
+      setTrend([]);
+      return;
+    }
+    let cancelled = false;
+    getDriftTrend(selectedEnv, trendWindow)
+      .then(points => { if (!cancelled) setTrend(points); })
+      .catch(() => { if (!cancelled) setTrend([]); });
+    return () => { cancelled = true; };
+  }, [selectedEnv, trendWindow, simulationMode]);
 
   const activeEnvironments = environments.filter(env => env.status !== 'ARCHIVED');
 
@@ -44,13 +90,58 @@ export default function DriftMonitor() {
         <div className="text-vt-green-dim">Real-time configuration drift detection across all environments</div>
       </div>
 
+      {/* Batched restore to baseline */}
+      {!simulationMode && (
+        <div className="card-glow bg-vt-bg-card p-4 mb-6">
+          <div className="flex items-center justify-between">
+            <div className="text-vt-green">═══ REMEDIATION ═══</div>
+            <button
+              onClick={() => handleRemediate(null)}
+              disabled={remediationJob && !['COMPLETED', 'HALTED', 'FAILED'].includes(remediationJob.status)}
+              className="px-4 py-1 border border-vt-amber text-vt-amber hover:bg-vt-amber hover:text-vt-bg-dark transition-colors text-sm disabled:opacity-50"
+            >
+              [RESTORE ALL DRIFTED]
+            </button>
+          </div>
+          {remediationError && <div className="mt-2 text-vt-red text-sm">{remediationError}</div>}
+          {remediationJob && (
+            <div className="mt-3 text-sm text-vt-green-dim space-y-1">
+              <div>
+                JOB {remediationJob.jobId}: <span className={
+                  remediationJob.status === 'COMPLETED' ? 'text-vt-green' :
+                  remediationJob.status === 'HALTED' || remediationJob.status === 'FAILED' ? 'text-vt-red' : 'text-vt-amber'
+                }>{remediationJob.status}</span>
+                {remediationJob.totalWaves > 0 && ` — WAVE ${Math.min(remediationJob.currentWave + 1, remediationJob.totalWaves)}/${remediationJob.totalWaves}`}
+              </div>
+              {remediationJob.planned !== undefined && (
+                <>
+                  <div className="h-2 bg-vt-bg-dark border border-vt-border">
+                    <div
+                      className="h-full bg-vt-green"
+                      style={{ width: `${remediationJob.planned ? ((remediationJob.succeeded + remediationJob.failed) / remediationJob.planned) * 100 : 100}%` }}
+                    ></div>
+                  </div>
+                  <div>
+                    {remediationJob.succeeded + remediationJob.failed}/{remediationJob.planned} RUN |
+                    {' '}{remediationJob.verified} VERIFIED | {remediationJob.failed + remediationJob.unverified} FAILED |
+                    {' '}{remediationJob.manual} MANUAL | {remediationJob.clean} CLEAN | {remediationJob.skipped} SKIPPED
+                  </div>
+                </>
+              )}
+              {remediationJob.haltReason && <div className="text-vt-red">HALTED: {remediationJob.haltReason}</div>}
+            </div>
+          )}
+        </div>
+      )}
+
       {/* Global Drift List */}
       <div className="space-y-4 mb-8">
         {activeEnvironments.map((env) => {
           const envDrift = getEnvDriftEvents(env.id);
-          const criticalCount = envDrift.filter(e => e.severity === 'CRITICAL').length;
-          const warningCount = envDrift.filter(e => e.severity === 'WARNING').length;
-          const infoCount = envDrift.filter(e => e.severity === 'INFO').length;
+          // The dashboard caps events per lab; its openDrift counts cover all of them
+          const criticalCount = env.openDrift?.critical ?? envDrift.filter(e => e.severity === 'CRITICAL').length;
+          const warningCount = env.openDrift?.warning ?? envDrift.filter(e => e.severity === 'WARNING').length;
+          const infoCount = env.openDrift?.info ?? envDrift.filter(e => e.severity === 'INFO').length;
 
           return (
             <div
@@ -113,6 +204,41 @@ export default function DriftMonitor() {
                 </div>
               </div>
 
+              {/* Drift Trend (hourly or daily rollups) */}
+              {selectedEnv === env.id && trend.length > 0 && (
+                <div className="mt-4 pt-4 border-t border-vt-border" onClick={(e) => e.stopPropagation()}>
+                  <div className="flex items-center justify-between mb-3">
+                    <div className="text-vt-green">═══ DRIFT TREND ═══</div>
+                    <div className="flex gap-2 text-sm">
+                      {['24h', '7d', '30d', '90d'].map(window => (
+                        <button
+                          key={window}
+                          onClick={() => setTrendWindow(window)}
+                          className={trendWindow === window ? 'text-vt-green' : 'text-vt-green-dim hover:text-vt-green'}
+                        >
+                          [{window.toUpperCase()}]
+                        </button>
+                      ))}
+                    </div>
+                  </div>
+                  <div className="flex items-end gap-px h-16 bg-vt-bg-dark border border-vt-border p-1">
+                    {trend.map(point => (
+                      <div
+                        key={point.bucket}
+                        className={`flex-1 ${getDriftBarColor(point.driftScore)}`}
+                        style={{ height: `${Math.max(point.driftScore, point.events ? 4 : 0)}%` }}
+                        title={`${point.bucket}: score ${point.driftScore}, ${point.critical} critical, ${point.warning} warning, ${point.info} info, ${point.snapshots} snapshots`}
+                      ></div>
+                    ))}
+                  </div>
+                  <div className="flex justify-between text-xs text-vt-green-dim mt-1">
+                    <span>{trend[0].bucket}</span>
+                    <span>{trend.reduce((sum, point) => sum + point.events, 0)} events / {trend.reduce((sum, point) => sum + point.snapshots, 0)} snapshots</span>
+                    <span>{trend[trend.length - 1].bucket}</span>
+                  </div>
+                </div>
+              )}
+
               {/* Expanded Drift Detail */}
               {selectedEnv === env.id && envDrift.length > 0 && (
                 <div className="mt-4 pt-4 border-t border-vt-border">
@@ -160,7 +286,11 @@ export default function DriftMonitor() {
                     <button className="px-4 py-1 border border-vt-green text-vt-green hover:bg-vt-green hover:text-vt-bg-dark transition-colors text-sm">
                       [RESOLVE ALL]
                     </button>
-                    <button className="px-4 py-1 border border-vt-amber text-vt-amber hover:bg-vt-amber hover:text-vt-bg-dark transition-colors text-sm">
+                    <button
+                      onClick={() => handleRemediate([env.id])}
+                      disabled={simulationMode}
+                      className="px-4 py-1 border border-vt-amber text-vt-amber hover:bg-vt-amber hover:text-vt-bg-dark transition-colors text-sm disabled:opacity-50"
+                    >
                       [REVERT CHANGES]
                     </button>
                   </div>
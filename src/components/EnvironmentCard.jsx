@@ -1,15 +1,26 @@
 import { Lock, Activity, Clock, Archive } from 'lucide-react';
-import { useState } from 'react';
+import { useState, useRef, useEffect } from 'react';
 import SnapshotTerminal from './SnapshotTerminal';
 import FreezeModal from './FreezeModal';
 import EnvironmentDetail from './EnvironmentDetail';
-import { useVault } from '../context/VaultContext';
+import { useVault, isCapturePending } from '../context/VaultContext';
 
 export default function EnvironmentCard({ environment }) {
   const { updateEnvironment, addLogEntry, captureSnapshot, freezeEnvironment } = useVault();
   const [showSnapshot, setShowSnapshot] = useState(false);
+  const [capturedSnapshot, setCapturedSnapshot] = useState(null);
   const [showFreeze, setShowFreeze] = useState(false);
   const [showDetail, setShowDetail] = useState(false);
+  // One Idempotency-Key per [SNAPSHOT] press, shared by every attempt it makes
+  const captureKey = useRef(null);
+  // Last 202 for a capture still waiting on a worker
+  const [queuedCapture, setQueuedCapture] = useState(null);
+
+  // A capture that landed after following gave up shows up on a later dashboard load
+  useEffect(() => {
+    setQueuedCapture(null);
+  }, [environment.lastSnapshotAt]);
+
   const statusConfig = {
     ACTIVE: { color: 'text-vt-green', icon: Activity, animation: 'status-pulse', label: 'ACTIVE' },
     FROZEN: { color: 'text-vt-blue-ice', icon: Lock, animation: '', label: 'FROZEN' },
@@ -30,11 +41,23 @@ export default function EnvironmentCard({ environment }) {
   const driftBarWidth = environment.driftScore !== null ? `${environment.driftScore}%` : '0%';
 
   const handleSnapshotComplete = async () => {
+    const key = captureKey.current;
     try {
-      await captureSnapshot(environment.id);
+      const result = await captureSnapshot(environment.id, key, setQueuedCapture);
+      // Still queued when following gave up: keep showing it until the dashboard catches up
+      setQueuedCapture(isCapturePending(result) ? result : null);
+      // The terminal may have been closed, or reopened for a new capture, while this one was queued
+      if (captureKey.current !== key) return;
+      if (result?.snapshot?.rawOutputs) {
+        // Keep the terminal open to page through the full captured output
+        setCapturedSnapshot(result.snapshot);
+        return;
+      }
       setShowSnapshot(false);
     } catch (error) {
       console.error('Snapshot capture failed:', error);
+      setQueuedCapture(null);
+      if (captureKey.current !== key) return;
       // Fallback to local update
       const now = new Date();
       const timestamp = `2077.${String(now.getMonth() + 1).padStart(2, '0')}.${String(now.getDate()).padStart(2, '0')} ${String(now.getHours()).padStart(2, '0')}:${String(now.getMinutes()).padStart(2, '0')}:${String(now.getSeconds()).padStart(2, '0')}`;
@@ -57,6 +80,18 @@ export default function EnvironmentCard({ environment }) {
     }
   };
 
+  const handleSnapshotStart = () => {
+    captureKey.current = crypto.randomUUID();
+    setShowSnapshot(true);
+  };
+
+  const handleSnapshotClose = () => {
+    // A queued capture keeps being followed; its result refreshes the dashboard
+    captureKey.current = null;
+    setShowSnapshot(false);
+    setCapturedSnapshot(null);
+  };
+
   const handleFreezeConfirm = async () => {
     try {
       await freezeEnvironment(environment.id, 'freeze');
@@ -103,6 +138,9 @@ export default function EnvironmentCard({ environment }) {
         {environment.lastSnapshotAt && (
           <div>Snapshot: <span className="text-vt-green">{environment.lastSnapshotAt}</span></div>
         )}
+        {queuedCapture && (
+          <div>Capture: <span className="text-vt-amber status-blink">QUEUED{queuedCapture.lane ? ` (${queuedCapture.lane.toUpperCase()})` : ''}</span></div>
+        )}
       </div>
 
       {environment.driftScore !== null && (
@@ -124,7 +162,7 @@ export default function EnvironmentCard({ environment }) {
 
       <div className="flex gap-2">
         <button 
-          onClick={() => setShowSnapshot(true)}
+          onClick={handleSnapshotStart}
           className="flex-1 px-3 py-1 border border-vt-green text-vt-green hover:bg-vt-green hover:text-vt-bg-dark transition-colors text-sm"
         >
           [SNAPSHOT]
@@ -148,8 +186,10 @@ export default function EnvironmentCard({ environment }) {
       {showSnapshot && (
         <SnapshotTerminal
           environment={environment}
+          snapshot={capturedSnapshot}
+          queued={queuedCapture}
           onComplete={handleSnapshotComplete}
-          onClose={() => setShowSnapshot(false)}
+          onClose={handleSnapshotClose}
         />
       )}
 
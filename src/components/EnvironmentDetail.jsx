@@ -113,10 +113,23 @@ export default function EnvironmentDetail({ environment, onClose }) {
                     <span className="text-vt-green">{environment.workspaceId}</span>
                     
                     <span className="text-vt-green-dim">Connection:</span>
-                    <span className="text-vt-green">AVAILABLE</span>
+                    <span className={!environment.workspace || environment.workspace.state === 'AVAILABLE' ? 'text-vt-green' : 'text-vt-amber'}>
+                      {environment.workspace?.state || 'AVAILABLE'}
+                    </span>
                     
                     <span className="text-vt-green-dim">Bundle:</span>
-                    <span className="text-vt-green">Standard (4 vCPU, 16GB)</span>
+                    <span className="text-vt-green">
+                      {environment.workspace?.bundle?.name
+                        ? `${environment.workspace.bundle.name} (${environment.workspace.bundle.computeType || environment.workspace.computeType})`
+                        : 'Standard (4 vCPU, 16GB)'}
+                    </span>
+
+                    {environment.workspace?.userName && (
+                      <>
+                        <span className="text-vt-green-dim">User:</span>
+                        <span className="text-vt-green">{environment.workspace.userName}</span>
+                      </>
+                    )}
                   </div>
                 </div>
               </div>
@@ -1,9 +1,22 @@
 import { useState, useEffect } from 'react';
 import { X } from 'lucide-react';
+import { useVault } from '../context/VaultContext';
 
-export default function SnapshotTerminal({ environment, onComplete, onClose }) {
+// Lines fetched per [MORE] page of captured output
+const OUTPUT_PAGE_LINES = 500;
+
+export default function SnapshotTerminal({ environment, snapshot, queued, onComplete, onClose }) {
+  const { getSnapshotOutput } = useVault();
   const [phase, setPhase] = useState(0);
   const [output, setOutput] = useState([]);
+  const [instanceId, setInstanceId] = useState(null);
+  const [rawLines, setRawLines] = useState([]);
+  const [nextOffset, setNextOffset] = useState(0);
+  const [totalLines, setTotalLines] = useState(0);
+  const [outputEof, setOutputEof] = useState(true);
+  const [loadingOutput, setLoadingOutput] = useState(false);
+
+  const instanceIds = snapshot?.rawOutputs ? Object.keys(snapshot.rawOutputs).sort() : [];
 
   const phases = [
     { message: '> INITIATING VAULT-TEC ENVIRONMENT SCAN...', delay: 500 },
@@ -47,6 +60,42 @@ export default function SnapshotTerminal({ environment, onComplete, onClose }) {
     }
   }, [phase]);
 
+  const loadOutput = async (targetInstance, offset) => {
+    setLoadingOutput(true);
+    try {
+      const page = await getSnapshotOutput(snapshot.id, {
+        instanceId: targetInstance,
+        offset,
+        maxLines: OUTPUT_PAGE_LINES
+      });
+      const lines = page.content.split('\n');
+      if (page.content.endsWith('\n')) lines.pop();
+      setRawLines(prev => (offset === 0 ? lines : [...prev, ...lines]));
+      setNextOffset(page.nextOffset);
+      setTotalLines(page.totalLines);
+      setOutputEof(page.eof);
+    } catch (error) {
+      console.error('Failed to load snapshot output:', error);
+      setOutputEof(true);
+    } finally {
+      setLoadingOutput(false);
+    }
+  };
+
+  // Start at the first instance's output once the capture returns
+  useEffect(() => {
+    if (instanceIds.length > 0) {
+      setInstanceId(instanceIds[0]);
+      loadOutput(instanceIds[0], 0);
+    }
+  }, [snapshot?.id]);
+
+  const selectInstance = (id) => {
+    setInstanceId(id);
+    setRawLines([]);
+    loadOutput(id, 0);
+  };
+
   return (
     <div className="fixed inset-0 bg-black bg-opacity-90 z-50 flex items-center justify-center p-4">
       <div className="card-glow bg-vt-bg-dark p-6 max-w-3xl w-full max-h-[80vh] overflow-y-auto">
@@ -76,13 +125,51 @@ export default function SnapshotTerminal({ environment, onComplete, onClose }) {
               {line || '\u00A0'}
             </div>
           ))}
-          {phase < phases.length && <span className="cursor"></span>}
+          {queued && !snapshot && (
+            <div className="text-vt-amber">
+              {'> CAPTURE QUEUED'}{queued.lane ? ` IN ${queued.lane.toUpperCase()} LANE` : ''} - AWAITING WORKER...
+            </div>
+          )}
+          {(phase < phases.length || (queued && !snapshot)) && <span className="cursor"></span>}
         </div>
 
+        {instanceId && (
+          <div className="mt-4">
+            <div className="flex items-center justify-between mb-2 text-sm text-vt-green-dim">
+              <span>RAW OUTPUT: {rawLines.length}/{totalLines} LINES</span>
+              {instanceIds.length > 1 && (
+                <select
+                  value={instanceId}
+                  onChange={(e) => selectInstance(e.target.value)}
+                  className="bg-vt-bg-dark border border-vt-border text-vt-green px-2 py-1"
+                >
+                  {instanceIds.map(id => (
+                    <option key={id} value={id}>{id}</option>
+                  ))}
+                </select>
+              )}
+            </div>
+            <pre className="border border-vt-border p-4 bg-vt-bg-card font-mono text-xs text-vt-green-dim max-h-80 overflow-auto whitespace-pre-wrap">
+              {rawLines.join('\n')}
+            </pre>
+            {!outputEof && (
+              <div className="mt-2 text-center">
+                <button
+                  onClick={() => loadOutput(instanceId, nextOffset)}
+                  disabled={loadingOutput}
+                  className="px-4 py-1 border border-vt-green text-vt-green hover:bg-vt-green hover:text-vt-bg-dark transition-colors text-sm disabled:opacity-50"
+                >
+                  {loadingOutput ? '[LOADING...]' : '[MORE]'}
+                </button>
+              </div>
+            )}
+          </div>
+        )}
+
         {phase >= phases.length && (
           <div className="mt-4 text-center">
             <button
-              onClick={onComplete}
+              onClick={snapshot || queued ? onClose : onComplete}
               className="px-6 py-2 border border-vt-green text-vt-green hover:bg-vt-green hover:text-vt-bg-dark transition-colors"
             >
               [CLOSE]
@@ -1,11 +1,64 @@
-import { useState } from 'react';
+import { useEffect, useState } from 'react';
 import { Filter, AlertTriangle, Info, CheckCircle } from 'lucide-react';
 import { useVault } from '../context/VaultContext';
 
+const ACTIONS = [
+  'SNAPSHOT_CAPTURED', 'ENV_FROZEN', 'ENV_UNFROZEN', 'DRIFT_DETECTED', 'DRIFT_RESOLVED',
+  'STATE_CHANGED', 'RESEARCHER_ASSIGNED', 'ACCESS_PROVISIONED', 'NOTE_ADDED', 'STACK_DRIFT_DETECTED',
+  'REMEDIATION_STARTED', 'ENV_REMEDIATED', 'REMEDIATION_FAILED', 'REMEDIATION_HALTED', 'REMEDIATION_COMPLETED'
+];
+
 export default function VaultLog() {
-  const { auditLog, environments } = useVault();
+  const { auditLog, environments, simulationMode, queryAuditLog } = useVault();
   const [filterEnv, setFilterEnv] = useState('all');
   const [filterSeverity, setFilterSeverity] = useState('all');
+  const [filterActor, setFilterActor] = useState('all');
+  const [filterAction, setFilterAction] = useState('all');
+  // Server-filtered entries and the cursor for the next page (null until the API answers)
+  const [serverLog, setServerLog] = useState(null);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+
+  const serverFilters = () => ({
+    environmentId: filterEnv !== 'all' ? filterEnv : null,
+    severity: filterSeverity !== 'all' ? filterSeverity : null,
+    actor: filterActor !== 'all' ? filterActor : null,
+    action: filterAction !== 'all' ? filterAction : null,
+    limit: 50
+  });
+
+  useEffect(() => {
+    if (simulationMode) {
+      setServerLog(null);
+      return;
+    }
+    let cancelled = false;
+    queryAuditLog(serverFilters())
+      .then(({ auditLog: entries, nextCursor: cursor }) => {
+        if (cancelled) return;
+        setServerLog(entries);
+        setNextCursor(cursor);
+      })
+      .catch(() => {
+        // Fall back to filtering the loaded feed locally
+        if (!cancelled) setServerLog(null);
+      });
+    return () => { cancelled = true; };
+  }, [filterEnv, filterSeverity, filterActor, filterAction, simulationMode, auditLog]);
+
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const page = await queryAuditLog({ ...serverFilters(), cursor: nextCursor });
+      setServerLog(entries => [...(entries || []), ...page.auditLog]);
+      setNextCursor(page.nextCursor);
+    } catch (error) {
+      console.error('Failed to load more audit entries:', error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
 
   const getSeverityIcon = (severity) => {
     switch (severity) {
@@ -35,18 +88,32 @@ export default function VaultLog() {
       'STATE_CHANGED': 'STATE',
       'RESEARCHER_ASSIGNED': 'ASSIGNED',
       'ACCESS_PROVISIONED': 'ACCESS',
-      'NOTE_ADDED': 'NOTE'
+      'NOTE_ADDED': 'NOTE',
+      'REMEDIATION_STARTED': 'RESTORE START',
+      'ENV_REMEDIATED': 'RESTORED',
+      'REMEDIATION_FAILED': 'RESTORE FAIL',
+      'REMEDIATION_HALTED': 'RESTORE HALT',
+      'REMEDIATION_COMPLETED': 'RESTORE DONE'
     };
     return labels[action] || action;
   };
 
-  const filteredLog = auditLog.filter(entry => {
+  const actors = [...new Set([
+    ...environments.map(env => env.researcher?.name),
+    ...auditLog.map(entry => entry.actor)
+  ].filter(Boolean))].sort();
+
+  const filteredLog = serverLog ?? auditLog.filter(entry => {
     if (filterEnv !== 'all' && entry.environmentId !== filterEnv) return false;
     if (filterSeverity !== 'all' && entry.severity !== filterSeverity) return false;
+    if (filterActor !== 'all' && entry.actor !== filterActor) return false;
+    if (filterAction !== 'all' && entry.action !== filterAction) return false;
     return true;
   });
 
-  const activeFilters = [filterEnv !== 'all', filterSeverity !== 'all'].filter(Boolean).length;
+  const activeFilters = [
+    filterEnv !== 'all', filterSeverity !== 'all', filterActor !== 'all', filterAction !== 'all'
+  ].filter(Boolean).length;
 
   return (
     <div>
@@ -91,6 +158,34 @@ export default function VaultLog() {
             </select>
           </div>
 
+          <div className="flex items-center gap-2">
+            <label className="text-vt-green-dim text-sm">Actor:</label>
+            <select
+              value={filterActor}
+              onChange={(e) => setFilterActor(e.target.value)}
+              className="bg-vt-bg-dark border border-vt-border text-vt-green px-3 py-1 focus:outline-none focus:border-vt-green"
+            >
+              <option value="all">All</option>
+              {actors.map(actor => (
+                <option key={actor} value={actor}>{actor}</option>
+              ))}
+            </select>
+          </div>
+
+          <div className="flex items-center gap-2">
+            <label className="text-vt-green-dim text-sm">Action:</label>
+            <select
+              value={filterAction}
+              onChange={(e) => setFilterAction(e.target.value)}
+              className="bg-vt-bg-dark border border-vt-border text-vt-green px-3 py-1 focus:outline-none focus:border-vt-green"
+            >
+              <option value="all">All</option>
+              {ACTIONS.map(action => (
+                <option key={action} value={action}>{getActionLabel(action)}</option>
+              ))}
+            </select>
+          </div>
+
           {activeFilters > 0 && (
             <>
               <span className="px-2 py-1 bg-vt-green text-vt-bg-dark text-sm">
@@ -100,6 +195,8 @@ export default function VaultLog() {
                 onClick={() => {
                   setFilterEnv('all');
                   setFilterSeverity('all');
+                  setFilterActor('all');
+                  setFilterAction('all');
                 }}
                 className="text-vt-green-dim hover:text-vt-green text-sm"
               >
@@ -165,11 +262,23 @@ export default function VaultLog() {
             NO ENTRIES MATCH CURRENT FILTERS
           </div>
         )}
+
+        {serverLog && nextCursor && (
+          <div className="text-center mt-4">
+            <button
+              onClick={loadMore}
+              disabled={loadingMore}
+              className="text-vt-green-dim hover:text-vt-green text-sm"
+            >
+              {loadingMore ? '[LOADING...]' : '[LOAD MORE]'}
+            </button>
+          </div>
+        )}
       </div>
 
       {/* Footer Stats */}
       <div className="mt-4 text-vt-green-dim text-sm">
-        &gt; Showing {filteredLog.length} of {auditLog.length} total entries
+        &gt; Showing {filteredLog.length} {serverLog ? 'matching entries' : `of ${auditLog.length} total entries`}
       </div>
     </div>
   );
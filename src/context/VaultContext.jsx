@@ -4,6 +4,13 @@ import apiClient from '../services/apiClient';
 
 const VaultContext = createContext();
 
+// How long a queued capture is followed before the caller is told to check back later
+const CAPTURE_FOLLOW_MS = 10 * 60 * 1000;
+const CAPTURE_POLL_MS = 5000;
+
+// A 202 from the capture endpoint: queued for a worker, or attached to another caller's run
+export const isCapturePending = (result) => Boolean(result && !result.snapshot && (result.queued || result.coalesced));
+
 const initialState = {
   environments: MOCK_ENVIRONMENTS,
   auditLog: MOCK_AUDIT_LOG,
@@ -69,12 +76,28 @@ function vaultReducer(state, action) {
 export function VaultProvider({ children }) {
   const [state, dispatch] = useReducer(vaultReducer, initialState);
 
-  // Load environments from API on mount
+  // Load environments, drift and audit log from API on mount
   useEffect(() => {
-    loadEnvironments();
-    loadAuditLog();
+    loadDashboard();
   }, []);
 
+  const loadDashboard = async () => {
+    try {
+      dispatch({ type: 'SET_LOADING', payload: true });
+      const dashboard = await apiClient.getDashboard();
+      dispatch({ type: 'SET_ENVIRONMENTS', payload: dashboard.environments });
+      dispatch({ type: 'SET_DRIFT_EVENTS', payload: dashboard.driftEvents });
+      dispatch({ type: 'SET_AUDIT_LOG', payload: dashboard.auditLog });
+      dispatch({ type: 'SET_ERROR', payload: null });
+    } catch (error) {
+      console.error('Failed to load dashboard, using mock data:', error);
+      dispatch({ type: 'SET_SIMULATION_MODE', payload: true });
+      dispatch({ type: 'SET_ERROR', payload: 'Using simulation mode' });
+    } finally {
+      dispatch({ type: 'SET_LOADING', payload: false });
+    }
+  };
+
   const loadEnvironments = async () => {
     try {
       dispatch({ type: 'SET_LOADING', payload: true });
@@ -99,14 +122,36 @@ export function VaultProvider({ children }) {
     }
   };
 
-  const captureSnapshot = async (environmentId) => {
+  const queryAuditLog = (filters) => apiClient.queryAuditLog(filters);
+
+  const searchEnvironments = (filters) => apiClient.searchEnvironments(filters);
+
+  const getDriftTrend = (environmentId, window) => apiClient.getDriftTrend(environmentId, window);
+
+  const getSnapshotOutput = (snapshotId, options) => apiClient.getSnapshotOutput(snapshotId, options);
+
+  const startRemediation = (options) => apiClient.startRemediation(options);
+
+  const getRemediationJob = (jobId) => apiClient.getRemediationJob(jobId);
+
+  // Callers pass the key of the user action so a repeated attempt is not a second capture.
+  // onQueued is called with each 202 while the capture waits for a worker.
+  const captureSnapshot = async (environmentId, idempotencyKey = crypto.randomUUID(), onQueued) => {
     try {
       dispatch({ type: 'SET_LOADING', payload: true });
-      const result = await apiClient.captureSnapshot(environmentId);
+      let result = await apiClient.captureSnapshot(environmentId, idempotencyKey);
+      dispatch({ type: 'SET_LOADING', payload: false });
+
+      // Re-sending the same key attaches to the queued capture and returns its result once it lands
+      const followUntil = Date.now() + CAPTURE_FOLLOW_MS;
+      while (isCapturePending(result) && Date.now() < followUntil) {
+        onQueued?.(result);
+        await new Promise(resolve => setTimeout(resolve, CAPTURE_POLL_MS));
+        result = await apiClient.captureSnapshot(environmentId, idempotencyKey);
+      }
       
-      // Reload environments to get updated snapshot time
-      await loadEnvironments();
-      await loadAuditLog();
+      // Reload to get updated snapshot time
+      await loadDashboard();
       
       return result;
     } catch (error) {
@@ -123,8 +168,7 @@ export function VaultProvider({ children }) {
       await apiClient.freezeEnvironment(environmentId, action);
       
       // Reload environments and audit log
-      await loadEnvironments();
-      await loadAuditLog();
+      await loadDashboard();
     } catch (error) {
       console.error('Failed to freeze environment:', error);
       throw error;
@@ -153,8 +197,15 @@ export function VaultProvider({ children }) {
     updateEnvironment: (id, updates) => dispatch({ type: 'UPDATE_ENVIRONMENT', payload: { id, updates } }),
     addDriftEvent: (event) => dispatch({ type: 'ADD_DRIFT_EVENT', payload: event }),
     // API methods
+    loadDashboard,
     loadEnvironments,
     loadAuditLog,
+    queryAuditLog,
+    searchEnvironments,
+    getDriftTrend,
+    getSnapshotOutput,
+    startRemediation,
+    getRemediationJob,
     captureSnapshot,
     freezeEnvironment,
     checkDrift
@@ -2,7 +2,18 @@ import { get, post } from 'aws-amplify/api';
 import { fetchAuthSession } from 'aws-amplify/auth';
 import { apiName } from '../config/aws-config';
 
+// Attempts per capture request before the error reaches the caller
+const CAPTURE_ATTEMPTS = 3;
+const CAPTURE_RETRY_MS = 1000;
+
+const sleep = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+
 class ApiClient {
+  constructor() {
+    // path -> { etag, data } from the last full response, for conditional GETs
+    this.validators = new Map();
+  }
+
   async getAuthHeaders() {
     try {
       const session = await fetchAuthSession();
@@ -17,17 +28,43 @@ class ApiClient {
     }
   }
 
-  async getEnvironments() {
+  async getWithValidators(path) {
+    const headers = await this.getAuthHeaders();
+    const cached = this.validators.get(path);
+    if (cached) headers['If-None-Match'] = cached.etag;
+
     try {
-      const headers = await this.getAuthHeaders();
       const restOperation = get({
         apiName,
-        path: '/environments',
+        path,
         options: { headers }
       });
-      
+
       const response = await restOperation.response;
+      if (response.statusCode === 304 && cached) return cached.data;
+
       const data = await response.body.json();
+      const etag = response.headers?.etag;
+      if (etag) {
+        this.validators.set(path, { etag, data });
+      } else {
+        this.validators.delete(path);
+      }
+      return data;
+    } catch (error) {
+      // Amplify surfaces non-2xx statuses, including 304, as errors
+      if (cached && error?.response?.statusCode === 304) return cached.data;
+      throw error;
+    }
+  }
+
+  async getEnvironments() {
+    try {
+      const data = await this.getWithValidators('/environments');
+      if (data.partial) {
+        // Some accounts/regions did not answer in time; their labs are missing or stale
+        console.warn('Partial fleet results, unavailable targets:', data.unavailableTargets);
+      }
       return data.environments;
     } catch (error) {
       console.error('Error fetching environments:', error);
@@ -35,12 +72,102 @@ class ApiClient {
     }
   }
 
-  async captureSnapshot(environmentId) {
+  // Server-side filtered list: { status, facility, researcher, experimentId, labNamePrefix }
+  async searchEnvironments(filters = {}) {
+    try {
+      const queryParams = new URLSearchParams();
+      Object.entries(filters).forEach(([name, value]) => {
+        if (value) queryParams.append(name, value);
+      });
+      const data = await this.getWithValidators(`/environments?${queryParams.toString()}`);
+      if (data.partial) {
+        console.warn('Partial fleet results, unavailable targets:', data.unavailableTargets);
+      }
+      return data.environments;
+    } catch (error) {
+      console.error('Error searching environments:', error);
+      throw error;
+    }
+  }
+
+  // Environments, open drift and recent audit entries in one request
+  async getDashboard(auditLimit = 50) {
+    try {
+      const queryParams = new URLSearchParams({ auditLimit: auditLimit.toString() });
+      const data = await this.getWithValidators(`/dashboard?${queryParams.toString()}`);
+      if (data.partial) {
+        console.warn('Partial fleet results, unavailable targets:', data.unavailableTargets);
+      }
+      if (data.truncated) {
+        // Per-lab counts in openDrift stay exact; only the event list was shortened
+        console.warn(`Dashboard truncated to ${data.eventsPerEnvironment} drift events per environment`);
+      }
+      return data;
+    } catch (error) {
+      console.error('Error fetching dashboard:', error);
+      throw error;
+    }
+  }
+
+  // idempotencyKey identifies one user action; every attempt for it sends the same key
+  async captureSnapshot(environmentId, idempotencyKey) {
+    for (let attempt = 1; ; attempt++) {
+      try {
+        const headers = await this.getAuthHeaders();
+        // Retries of the same capture reuse the key and get the first attempt's result
+        headers['Idempotency-Key'] = idempotencyKey;
+        const restOperation = post({
+          apiName,
+          path: `/environments/${environmentId}/snapshot`,
+          options: { headers }
+        });
+
+        const response = await restOperation.response;
+        const data = await response.body.json();
+        return data;
+      } catch (error) {
+        const statusCode = error?.response?.statusCode;
+        // Network failures and 5xx may have reached the server, so only a same-key retry is safe
+        if (attempt < CAPTURE_ATTEMPTS && (!statusCode || statusCode >= 500)) {
+          console.warn(`Snapshot capture attempt ${attempt} failed, retrying:`, error);
+          await sleep(CAPTURE_RETRY_MS * 2 ** (attempt - 1));
+          continue;
+        }
+        console.error('Error capturing snapshot:', error);
+        throw error;
+      }
+    }
+  }
+
+  async checkDrift(environmentId) {
+    try {
+      const data = await this.getWithValidators(`/environments/${environmentId}/drift`);
+      return data;
+    } catch (error) {
+      console.error('Error checking drift:', error);
+      throw error;
+    }
+  }
+
+  // window: e.g. '24h' (hourly points) or '90d' (daily points)
+  async getDriftTrend(environmentId, window = '30d') {
+    try {
+      const queryParams = new URLSearchParams({ window });
+      const data = await this.getWithValidators(`/environments/${environmentId}/drift/trend?${queryParams.toString()}`);
+      return data.trend;
+    } catch (error) {
+      console.error('Error fetching drift trend:', error);
+      throw error;
+    }
+  }
+
+  async diffSnapshots(snapshotA, snapshotB) {
     try {
       const headers = await this.getAuthHeaders();
-      const restOperation = post({
+      const queryParams = new URLSearchParams({ a: snapshotA, b: snapshotB });
+      const restOperation = get({
         apiName,
-        path: `/environments/${environmentId}/snapshot`,
+        path: `/snapshots/diff?${queryParams.toString()}`,
         options: { headers }
       });
       
@@ -48,25 +175,70 @@ class ApiClient {
       const data = await response.body.json();
       return data;
     } catch (error) {
-      console.error('Error capturing snapshot:', error);
+      console.error('Error diffing snapshots:', error);
       throw error;
     }
   }
 
-  async checkDrift(environmentId) {
+  // Page of a snapshot's full command output: { instanceId, offset, line, maxBytes, maxLines }
+  async getSnapshotOutput(snapshotId, options = {}) {
     try {
       const headers = await this.getAuthHeaders();
+      const queryParams = new URLSearchParams();
+      Object.entries(options).forEach(([key, value]) => {
+        if (value !== null && value !== undefined && value !== '') queryParams.append(key, value.toString());
+      });
       const restOperation = get({
         apiName,
-        path: `/environments/${environmentId}/drift`,
+        path: `/snapshots/${snapshotId}/output?${queryParams.toString()}`,
         options: { headers }
       });
-      
+
       const response = await restOperation.response;
       const data = await response.body.json();
       return data;
     } catch (error) {
-      console.error('Error checking drift:', error);
+      console.error('Error fetching snapshot output:', error);
+      throw error;
+    }
+  }
+
+  // Restore drifted labs to baseline: { environmentIds, canary, batchSize, concurrency, maxFailureRate, dryRun }
+  async startRemediation(options = {}, actor = 'User') {
+    try {
+      const headers = await this.getAuthHeaders();
+      const restOperation = post({
+        apiName,
+        path: '/remediation',
+        options: {
+          headers,
+          body: { ...options, actor }
+        }
+      });
+
+      const response = await restOperation.response;
+      const data = await response.body.json();
+      return data;
+    } catch (error) {
+      console.error('Error starting remediation:', error);
+      throw error;
+    }
+  }
+
+  async getRemediationJob(jobId) {
+    try {
+      const headers = await this.getAuthHeaders();
+      const restOperation = get({
+        apiName,
+        path: `/remediation/${jobId}`,
+        options: { headers }
+      });
+
+      const response = await restOperation.response;
+      const data = await response.body.json();
+      return data;
+    } catch (error) {
+      console.error('Error fetching remediation job:', error);
       throw error;
     }
   }
@@ -94,25 +266,33 @@ class ApiClient {
 
   async getAuditLog(environmentId = null, limit = 50) {
     try {
-      const headers = await this.getAuthHeaders();
       const queryParams = new URLSearchParams();
       if (environmentId) queryParams.append('environmentId', environmentId);
       queryParams.append('limit', limit.toString());
       
-      const restOperation = get({
-        apiName,
-        path: `/audit-log?${queryParams.toString()}`,
-        options: { headers }
-      });
-      
-      const response = await restOperation.response;
-      const data = await response.body.json();
+      const data = await this.getWithValidators(`/audit-log?${queryParams.toString()}`);
       return data.auditLog;
     } catch (error) {
       console.error('Error fetching audit log:', error);
       throw error;
     }
   }
+
+  // Server-side filtered page: { environmentId, actor, action, severity, since, until, limit, cursor }
+  async queryAuditLog(filters = {}) {
+    try {
+      const queryParams = new URLSearchParams();
+      Object.entries(filters).forEach(([key, value]) => {
+        if (value !== null && value !== undefined && value !== '') queryParams.append(key, value.toString());
+      });
+
+      const data = await this.getWithValidators(`/audit-log?${queryParams.toString()}`);
+      return { auditLog: data.auditLog, nextCursor: data.nextCursor };
+    } catch (error) {
+      console.error('Error querying audit log:', error);
+      throw error;
+    }
+  }
 }
 
 export default new ApiClient();